@@ -0,0 +1,162 @@
+# backend/async_db.py
+# Async data access for the API routes.
+#
+# Routes `await` Mongo calls instead of blocking a threadpool thread per
+# request. Two interchangeable drivers (MONGO_ASYNC_DRIVER):
+#   - "pymongo": PyMongo's native AsyncMongoClient (pymongo >= 4.13, no
+#     extra dependency), with its own pool sized like the sync client's;
+#   - "threadpool": the sync get_db() database, each call run through
+#     run_in_threadpool. Used with mongomock in tests and benchmarks.
+# Either way, collections come back with the per-collection read/write
+# concerns from MONGO_COLLECTION_CONCERNS.
+#
+# The sync client in db.py stays for seed.py, the caches, storage and CLIs.
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+from functools import partial
+from typing import Any, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+import db as dbmod
+from settings import DB_NAME, MONGO_ASYNC_DRIVER, MONGO_COLLECTION_CONCERNS, MONGO_MIN_POOL_SIZE, MONGO_URI
+
+_async_client: Any = None
+_async_db: Optional["AsyncDatabase"] = None
+
+
+def _concerns(name: str) -> Dict[str, Any]:
+    spec = dict(MONGO_COLLECTION_CONCERNS.get(name, {}))
+    options: Dict[str, Any] = {}
+    level = spec.pop("readConcern", None)
+    if level:
+        options["read_concern"] = ReadConcern(level)
+    if spec:
+        options["write_concern"] = WriteConcern(**spec)
+    return options
+
+
+# ---------------- threadpool driver ---------------- #
+class _ThreadpoolCursor:
+    """
+    Just enough of AsyncCursor: chain sort/skip/limit/hint/batch_size, then
+    await to_list() (repeatedly with a length, to read it batch by batch).
+    """
+
+    def __init__(self, cursor: Any) -> None:
+        self._cursor = cursor
+
+    def sort(self, *args: Any, **kwargs: Any) -> "_ThreadpoolCursor":
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, n: int) -> "_ThreadpoolCursor":
+        self._cursor = self._cursor.skip(n)
+        return self
+
+    def limit(self, n: int) -> "_ThreadpoolCursor":
+        self._cursor = self._cursor.limit(n)
+        return self
+
+    def hint(self, index: Any) -> "_ThreadpoolCursor":
+        self._cursor = self._cursor.hint(index)
+        return self
+
+    def batch_size(self, n: int) -> "_ThreadpoolCursor":
+        self._cursor = self._cursor.batch_size(n)
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> list:
+        cursor = self._cursor
+        return await run_in_threadpool(lambda: list(itertools.islice(cursor, length)))
+
+    async def close(self) -> None:
+        await run_in_threadpool(self._cursor.close)
+
+
+class _ThreadpoolCollection:
+    _AWAITABLE = {
+        "find_one", "insert_one", "insert_many", "update_one", "update_many",
+        "replace_one", "delete_one", "delete_many", "find_one_and_delete",
+        "find_one_and_update", "count_documents", "bulk_write",
+    }
+
+    def __init__(self, collection: Any) -> None:
+        self._collection = collection
+
+    def find(self, *args: Any, **kwargs: Any) -> _ThreadpoolCursor:
+        return _ThreadpoolCursor(self._collection.find(*args, **kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._collection, name)
+        if name in self._AWAITABLE:
+            return partial(run_in_threadpool, attr)
+        return attr
+
+
+class AsyncDatabase:
+    """`adb.scans.find_one(...)` etc. are awaitable, whichever driver is active."""
+
+    def __init__(self, database: Any, threadpool: bool) -> None:
+        self._database = database
+        self._threadpool = threadpool
+        self._collections: Dict[str, Any] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        coll = self._collections.get(name)
+        if coll is None:
+            coll = self._database.get_collection(name, **_concerns(name))
+            if self._threadpool:
+                coll = _ThreadpoolCollection(coll)
+            self._collections[name] = coll
+        return coll
+
+    __getitem__ = __getattr__
+
+    async def command(self, *args: Any, **kwargs: Any) -> Any:
+        if self._threadpool:
+            return await run_in_threadpool(self._database.command, *args, **kwargs)
+        return await self._database.command(*args, **kwargs)
+
+
+def get_async_client() -> Any:
+    """The AsyncMongoClient; created on first use, inside the running loop."""
+    global _async_client
+    if _async_client is None:
+        from pymongo import AsyncMongoClient
+
+        _async_client = AsyncMongoClient(MONGO_URI, **dbmod.client_options("async"))
+    return _async_client
+
+
+def get_async_db() -> AsyncDatabase:
+    global _async_db
+    if MONGO_ASYNC_DRIVER == "threadpool":
+        # Not cached: follows get_db(), which tests point at mongomock.
+        return AsyncDatabase(dbmod.get_db(), threadpool=True)
+    if _async_db is None:
+        _async_db = AsyncDatabase(get_async_client()[DB_NAME], threadpool=False)
+    return _async_db
+
+
+async def warm_pool() -> None:
+    """Open MONGO_MIN_POOL_SIZE connections before the first request needs one."""
+    adb = get_async_db()
+    try:
+        await asyncio.gather(*(adb.command("ping") for _ in range(max(1, MONGO_MIN_POOL_SIZE))))
+    except Exception as e:  # the app can still start; requests will retry selection
+        print(f"[db] pool warm-up failed: {e}")
+
+
+async def close_async_client() -> None:
+    global _async_client, _async_db
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = _async_db = None
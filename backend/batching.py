@@ -0,0 +1,116 @@
+# backend/batching.py
+# Dynamic micro-batching for model inference.
+#
+# Request threads submit one preprocessed tensor each; a single worker thread
+# drains the queue into batches (up to max_batch_size items, or whatever
+# arrived within max_wait_ms of the first item) and runs one batched predict.
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+PredictFn = Callable[["np.ndarray"], "np.ndarray"]
+
+
+class MicroBatcher:
+    """Collect single-image tensors into batches and fan the results back out."""
+
+    def __init__(
+        self,
+        predict_fn: PredictFn,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+        name: str = "ml-batcher",
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self._predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._name = name
+        self._queue: "queue.Queue[Optional[Tuple[np.ndarray, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    # ---------------- public API ---------------- #
+    def submit(self, tensor: "np.ndarray") -> Future:
+        """
+        Queue one tensor of shape (H, W, C) and return a Future that resolves
+        to that tensor's row of the model output.
+        """
+        fut: Future = Future()
+        # under the lock so nothing can be queued behind close()'s sentinel
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+            self._queue.put((tensor, fut))
+        return fut
+
+    def predict(self, tensor: "np.ndarray") -> "np.ndarray":
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(tensor).result()
+
+    def close(self) -> None:
+        """Stop the worker after it finishes the items already queued."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    # ---------------- worker ---------------- #
+    def _collect(self, first: Tuple["np.ndarray", Future]) -> Tuple[List[Tuple["np.ndarray", Future]], bool]:
+        """Gather a batch starting with `first`. Returns (batch, stop_requested)."""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, stop = self._collect(first)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch: List[Tuple["np.ndarray", Future]]) -> None:
+        live = [(t, f) for t, f in batch if f.set_running_or_notify_cancel()]
+        if not live:
+            return
+        try:
+            stacked = np.stack([t for t, _ in live], axis=0)
+            outputs = np.asarray(self._predict_fn(stacked))
+            if outputs.shape[0] != len(live):
+                raise RuntimeError(
+                    f"Batched predict returned {outputs.shape[0]} rows for {len(live)} inputs"
+                )
+        except Exception as e:
+            for _, fut in live:
+                fut.set_exception(e)
+            return
+        for i, (_, fut) in enumerate(live):
+            fut.set_result(outputs[i])
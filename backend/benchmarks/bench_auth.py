@@ -0,0 +1,51 @@
+# backend/benchmarks/bench_auth.py
+# Per-request auth cost: full jwt.decode + JWTClaims every time (the old
+# require_user) vs. the verified-token cache, which also keeps the parsed
+# JWTClaims.
+#
+#   cd backend && python -m benchmarks.bench_auth [-n 20000]
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from jose import jwt
+
+from routers import JWTClaims, claims_from_token
+from security import create_access_token, token_cache
+from settings import JWT_ALGORITHM, JWT_SECRET
+
+
+def _per_call_us(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=20000, help="iterations per case")
+    args = parser.parse_args()
+
+    token, _ = create_access_token("64b7f0c2a1b2c3d4e5f60718", {"email": "a@b.c", "name": "Bench"})
+
+    def uncached():
+        return JWTClaims(**jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM]))
+
+    def cached():
+        return claims_from_token(token)
+
+    token_cache.clear()
+    before = _per_call_us(uncached, args.n)
+    after = _per_call_us(cached, args.n)
+
+    print(f"[bench] auth, {args.n} calls each")
+    print(f"  jwt.decode + JWTClaims : {before:8.2f} us/request")
+    print(f"  verified-token cache   : {after:8.2f} us/request")
+    print(f"  speed-up               : {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
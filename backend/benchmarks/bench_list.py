@@ -0,0 +1,84 @@
+# backend/benchmarks/bench_list.py
+# Rendering a full GET /scans history: ScanItem models + jsonable_encoder +
+# JSONResponse (the old list_scans) vs. fast_json.scan_list_body, with
+# orjson and with the stdlib fallback.
+#
+#   cd backend && python -m benchmarks.bench_list [-n 10000] [-r 5]
+
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import fast_json
+from models import ScanItem, ScanListOut
+
+LABELS = ["healthy", "leaf_blast", "brown_spot", "blast", "bacterial_leaf_blight", "uncertain"]
+
+
+def _docs(n: int) -> list:
+    base = datetime(2026, 1, 1, 6, 0, 0)
+    return [
+        {
+            "_id": ObjectId(),
+            "label": LABELS[i % len(LABELS)],
+            "confidence": 0.5 + (i % 500) / 1000,
+            "modelVersion": "1.0",
+            "notes": "field note" if i % 3 == 0 else None,
+            "imageUrl": f"/uploads/{i:064x}.jpg",
+            "createdAt": base + timedelta(seconds=37 * i, milliseconds=i % 1000),
+        }
+        for i in range(n)
+    ]
+
+
+def _best_ms(fn, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=10000, help="scans in the history")
+    parser.add_argument("-r", type=int, default=5, help="rounds per case (best is reported)")
+    args = parser.parse_args()
+
+    docs = _docs(args.n)
+
+    def pydantic_path() -> bytes:
+        out = ScanListOut(items=[ScanItem.from_dict(d) for d in docs], nextCursor=None)
+        return JSONResponse(jsonable_encoder(out)).body
+
+    def fast_path() -> bytes:
+        return fast_json.scan_list_body(docs)
+
+    expected = pydantic_path()
+    assert fast_path() == expected, "fast path output differs from the pydantic rendering"
+
+    before = _best_ms(pydantic_path, args.r)
+    after = _best_ms(fast_path, args.r)
+    encoder = "(orjson)" if fast_json.orjson is not None else "(stdlib json)"
+    saved, fast_json.orjson = fast_json.orjson, None
+    try:
+        stdlib = _best_ms(fast_path, args.r)
+    finally:
+        fast_json.orjson = saved
+
+    print(f"[bench] list_scans body, {args.n} scans ({len(expected) / 1024:.0f} KiB), best of {args.r}")
+    print(f"  pydantic + jsonable_encoder : {before:8.1f} ms")
+    print(f"  fast_json {encoder:<17} : {after:8.1f} ms")
+    print(f"  fast_json (stdlib json)     : {stdlib:8.1f} ms")
+    print(f"  speed-up                    : {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# backend/benchmarks/bench_similar.py
+# Similar-scans query latency (similarity.SimilarityIndex) on a synthetic
+# snapshot: clustered unit vectors stored as float16, spread over a number
+# of users. Reports p50/p95 per query for an exact scan of every row, for
+# IVF probing and for one user's rows, plus IVF recall@10 against exact.
+#
+#   cd backend && python -m benchmarks.bench_similar [-n 1000000] [-d 256] [--users 2000]
+
+from __future__ import annotations
+
+import argparse
+import math
+import tempfile
+import time
+from typing import Iterator, List, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+import similarity
+from benchmarks.harness import percentile
+
+
+def _vectors(n: int, dim: int, seed: int = 0, chunk: int = 65536) -> Iterator["np.ndarray"]:
+    """Unit vectors around 500 random centres, as float16 chunks."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((500, dim)).astype("float32")
+    for start in range(0, n, chunk):
+        m = min(chunk, n - start)
+        v = centres[rng.integers(0, len(centres), m)] + 0.6 * rng.standard_normal((m, dim)).astype("float32")
+        v /= np.linalg.norm(v, axis=1, keepdims=True)
+        yield v.astype("<f2")
+
+
+def _rows(ids: List[ObjectId], dim: int, owners: List[ObjectId]) -> Iterator[Tuple[ObjectId, ObjectId, bytes]]:
+    i = 0
+    for block in _vectors(len(ids), dim):
+        for row in block:
+            yield ids[i], owners[i % len(owners)], row.tobytes()
+            i += 1
+
+
+def _time(index: similarity.SimilarityIndex, queries: List[bytes], **kw) -> Tuple[List[float], List[list]]:
+    latencies, results = [], []
+    for q in queries:
+        started = time.perf_counter()
+        results.append([h[0] for h in index.search(q, k=10, **kw)])
+        latencies.append((time.perf_counter() - started) * 1000)
+    return sorted(latencies), results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=200000, help="indexed scans")
+    parser.add_argument("-d", type=int, default=256, help="embedding dimensions")
+    parser.add_argument("--users", type=int, default=2000, help="owners the scans are spread over")
+    parser.add_argument("-q", type=int, default=50, help="queries per case")
+    parser.add_argument("--nprobe", type=int, default=similarity.SIMILARITY_NPROBE)
+    args = parser.parse_args()
+
+    owners = [ObjectId() for _ in range(args.users)]
+    ids = [ObjectId() for _ in range(args.n)]
+    lists = int(math.sqrt(args.n))
+    queries = [row.tobytes() for row in next(_vectors(args.q, args.d, seed=1))]
+    with tempfile.TemporaryDirectory(prefix="bench_similar_") as root:
+        started = time.perf_counter()
+        similarity.write_snapshot(f"{root}/flat", _rows(ids, args.d, owners), args.n, args.d)
+        built_flat = time.perf_counter() - started
+        started = time.perf_counter()
+        similarity.write_snapshot(f"{root}/ivf", _rows(ids, args.d, owners), args.n, args.d, lists=lists)
+        built_ivf = time.perf_counter() - started
+
+        flat = similarity.SimilarityIndex("flat", root=root, ivf_min_rows=args.n + 1)
+        ivf = similarity.SimilarityIndex("ivf", root=root, nprobe=args.nprobe, ivf_min_rows=0)
+        for index in (flat, ivf):
+            index._synced_at = float("inf")  # snapshot only, no Mongo
+            index.search(queries[0], k=10)  # page the maps in
+
+        exact_ms, exact = _time(flat, queries)
+        ivf_ms, approx = _time(ivf, queries)
+        user_ms, _ = _time(flat, queries, owner=owners[0])
+        recall = np.mean([len(set(a) & set(e)) / 10 for a, e in zip(approx, exact)])
+
+    print(f"[bench] similar scans, {args.n} x {args.d}-d float16 ({args.n * args.d * 2 / 1e6:.0f} MB), "
+          f"{args.users} users, {args.q} queries")
+    print(f"  build flat / IVF ({lists} lists) : {built_flat:6.1f} s / {built_ivf:6.1f} s")
+    for name, ms in (("exact, all rows", exact_ms), (f"IVF nprobe={args.nprobe}", ivf_ms), ("exact, one user", user_ms)):
+        print(f"  {name:<27} : p50 {percentile(ms, 50):7.2f} ms  p95 {percentile(ms, 95):7.2f} ms")
+    print(f"  IVF recall@10               : {recall:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
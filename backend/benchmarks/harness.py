@@ -0,0 +1,162 @@
+# backend/benchmarks/harness.py
+# Shared pieces for the offline benchmarks (and the test suite):
+#   - FakeModel / make_image_bytes: deterministic stand-ins for the model
+#     and for uploads, fitting the get_model()/get_labels() contract
+#   - offline_env / offline_client: the app wired to mongomock, a temp
+#     upload dir and the fake model, as tests/conftest.py does
+#   - summarize / compare_to_baseline: latency percentiles and regression
+#     checks against a stored JSON baseline
+#
+# Nothing here imports settings-dependent modules at import time, because
+# settings are read from the environment once, on first import.
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import statistics
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+
+class FakeModel:
+    """
+    Deterministic stand-in for the model backend: picks a class from mean
+    brightness; its "embedding" is the per-channel mean and spread.
+    """
+
+    embedding_dim = 8
+
+    def __init__(self, n_classes: int):
+        self.n_classes = n_classes
+        self.calls = 0
+
+    def predict(self, batch, verbose=0):
+        import numpy as np
+
+        self.calls += 1
+        means = batch.reshape(batch.shape[0], -1).mean(axis=1)
+        idx = (np.abs(means).astype("int64")) % self.n_classes
+        out = np.full((batch.shape[0], self.n_classes), 0.02, dtype="float32")
+        out[np.arange(batch.shape[0]), idx] = 1.0 - 0.02 * (self.n_classes - 1)
+        return out
+
+    def predict_with_embedding(self, batch):
+        import numpy as np
+
+        pixels = batch.reshape(batch.shape[0], -1, batch.shape[-1])
+        features = np.concatenate(
+            [pixels.mean(axis=1), pixels.std(axis=1), np.full((batch.shape[0], 2), 50.0)], axis=1
+        )
+        return self.predict(batch), features.astype("float32")
+
+
+def make_image_bytes(color=(40, 160, 40), size=(64, 64), fmt="JPEG") -> bytes:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+# ---------------- offline app ---------------- #
+def offline_env() -> str:
+    """Point settings at a throwaway upload dir and in-process inference. Call before importing main."""
+    upload_dir = tempfile.mkdtemp(prefix="bench_uploads_")
+    os.environ["UPLOAD_DIR"] = upload_dir
+    os.environ.setdefault("INFERENCE_EXECUTOR", "thread")
+    os.environ["MONGO_ASYNC_DRIVER"] = "threadpool"  # mongomock has no async client
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")  # measure the API, not bcrypt
+    return upload_dir
+
+
+@contextmanager
+def offline_client() -> Iterator[object]:
+    """
+    A TestClient (lifespan included, one event loop shared by all calling
+    threads) backed by mongomock and FakeModel.
+    """
+    import mongomock
+    from fastapi.testclient import TestClient
+
+    import db as dbmod
+    import ml_service
+    from main import app
+
+    client = mongomock.MongoClient()
+    dbmod._client = client
+    dbmod.get_db = lambda: client[dbmod.DB_NAME]
+    labels = ml_service.get_labels()
+    ml_service.get_registry().install(FakeModel(len(labels)), version="fake", labels=labels)
+
+    with TestClient(app) as tc:
+        yield tc
+    client.close()
+
+
+# ---------------- reporting ---------------- #
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies_ms: List[float], wall_seconds: float, errors: int = 0) -> Dict[str, float]:
+    values = sorted(latencies_ms)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / wall_seconds, 1) if wall_seconds > 0 else 0.0,
+        "mean_ms": round(statistics.fmean(values), 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+    }
+
+
+def print_table(title: str, results: Dict[str, Dict[str, float]]) -> None:
+    print(f"\n[bench] {title}")
+    print(f"{'case':<24} {'n':>7} {'err':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<24} {r['requests']:>7} {r['errors']:>5} {r['rps']:>9.1f} "
+              f"{r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f}")
+
+
+def save_baseline(path: Path, results: Dict[str, Dict[str, float]]) -> None:
+    path.write_text(json.dumps(results, indent=2, sort_keys=True), encoding="utf-8")
+    print(f"[bench] baseline written to {path}")
+
+
+def compare_to_baseline(
+    path: Path, results: Dict[str, Dict[str, float]], tolerance: float
+) -> List[Tuple[str, str]]:
+    """
+    Flag cases whose p95 grew, or whose throughput shrank, by more than
+    `tolerance` (0.2 = 20%) relative to the stored baseline.
+    """
+    baseline = json.loads(path.read_text(encoding="utf-8"))
+    regressions: List[Tuple[str, str]] = []
+    for name, now in results.items():
+        then = baseline.get(name)
+        if not then:
+            continue
+        if then.get("p95_ms") and now["p95_ms"] > then["p95_ms"] * (1 + tolerance):
+            regressions.append((name, f"p95 {then['p95_ms']:.3f} -> {now['p95_ms']:.3f} ms"))
+        if then.get("rps") and now["rps"] < then["rps"] * (1 - tolerance):
+            regressions.append((name, f"req/s {then['rps']:.1f} -> {now['rps']:.1f}"))
+    return regressions
+
+
+def report_regressions(regressions: List[Tuple[str, str]], tolerance: float) -> int:
+    if not regressions:
+        print(f"[bench] no regressions beyond {tolerance:.0%} of baseline")
+        return 0
+    print(f"[bench] REGRESSIONS beyond {tolerance:.0%} of baseline:")
+    for name, what in regressions:
+        print(f"  - {name}: {what}")
+    return 1
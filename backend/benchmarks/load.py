@@ -0,0 +1,114 @@
+# backend/benchmarks/load.py
+# Offline load test for the hot API endpoints (no Mongo, no TensorFlow).
+#
+#   cd backend
+#   python -m benchmarks.load --concurrency 16 --requests 400
+#   python -m benchmarks.load --save-baseline benchmarks/baseline.json
+#   python -m benchmarks.load --baseline benchmarks/baseline.json --tolerance 0.2
+#
+# Exits non-zero when a regression against the baseline is detected.
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks import harness
+
+SCENARIOS = ("login", "recommendation", "history", "scan", "scan_duplicate", "scan_batch")
+BATCH_FILES = 20  # photos per scan_batch request (a typical plot visit)
+
+
+def _run_scenario(fn: Callable[[int], int], requests: int, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+
+    def one(i: int):
+        started = time.perf_counter()
+        status = fn(i)
+        return (time.perf_counter() - started) * 1000.0, status
+
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, status in pool.map(one, range(requests)):
+            latencies.append(elapsed)
+            errors += status >= 400
+    return harness.summarize(latencies, time.perf_counter() - wall_started, errors)
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline load test for RiceGuard endpoints.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--history-size", type=int, default=500, help="scans pre-seeded for the history user")
+    parser.add_argument("--baseline", type=Path, help="compare against this JSON baseline")
+    parser.add_argument("--save-baseline", type=Path, help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    harness.offline_env()
+    with harness.offline_client() as client:
+        api = "/api/v1"
+        creds = {"name": "Bench", "email": "bench@test.com", "password": "secret12"}
+        client.post(f"{api}/auth/register", json=creds)
+        token = client.post(f"{api}/auth/login", json=creds).json()["accessToken"]
+        auth = {"Authorization": f"Bearer {token}"}
+
+        # Pre-seed history through the real endpoint (distinct images, so no cache hits).
+        for i in range(args.history_size):
+            color = (i % 256, (i // 256) % 256, 77)
+            client.post(f"{api}/scans", headers=auth,
+                        files={"file": ("leaf.jpg", harness.make_image_bytes(color), "image/jpeg")})
+        # "scan" sends distinct photos (full inference path); "scan_duplicate"
+        # re-sends one photo (prediction cache + dedupe path).
+        uploads = [harness.make_image_bytes((i % 256, (i // 256) % 256, 155), size=(640, 480))
+                   for i in range(args.requests + 1)]
+        duplicate = harness.make_image_bytes((10, 200, 30), size=(640, 480))
+        # "scan_batch" posts BATCH_FILES distinct photos per request; divide
+        # its latency by BATCH_FILES to compare per image with "scan".
+        batches = [[("files", (f"leaf{j}.jpg", harness.make_image_bytes(
+                        ((i * 7 + j) % 256, (i * 13) % 256, 211), size=(640, 480)), "image/jpeg"))
+                    for j in range(BATCH_FILES)]
+                   for i in range(args.requests + 1)] if "scan_batch" in args.scenarios else []
+
+        cases: Dict[str, Callable[[int], int]] = {
+            "login": lambda i: client.post(f"{api}/auth/login", json=creds).status_code,
+            "recommendation": lambda i: client.get(f"{api}/recommendations/brown_spot").status_code,
+            "history": lambda i: client.get(f"{api}/scans", headers=auth, params={"limit": 50}).status_code,
+            "scan": lambda i: client.post(
+                f"{api}/scans", headers=auth,
+                files={"file": ("leaf.jpg", uploads[i + 1], "image/jpeg")},
+            ).status_code,
+            "scan_duplicate": lambda i: client.post(
+                f"{api}/scans", headers=auth,
+                files={"file": ("leaf.jpg", duplicate, "image/jpeg")},
+            ).status_code,
+            "scan_batch": lambda i: client.post(
+                f"{api}/scans/batch", headers=auth, files=batches[i + 1],
+            ).status_code,
+        }
+
+        results = {}
+        for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+            if name not in cases:
+                parser.error(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+            cases[name](-1)  # warm-up (uses uploads[0], never reused)
+            results[name] = _run_scenario(cases[name], args.requests, args.concurrency)
+
+    harness.print_table(f"load, concurrency={args.concurrency}", results)
+    if args.save_baseline:
+        harness.save_baseline(args.save_baseline, results)
+    if args.baseline:
+        return harness.report_regressions(
+            harness.compare_to_baseline(args.baseline, results, args.tolerance), args.tolerance
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
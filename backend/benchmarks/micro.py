@@ -0,0 +1,82 @@
+# backend/benchmarks/micro.py
+# Microbenchmarks for the scan hot path, piece by piece.
+#
+#   cd backend
+#   python -m benchmarks.micro [-n 200] [--baseline benchmarks/micro_baseline.json]
+
+from __future__ import annotations
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks import harness
+
+
+def _time(fn: Callable[[], object], n: int) -> Dict[str, float]:
+    fn()  # warm-up
+    latencies: List[float] = []
+    wall_started = time.perf_counter()
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000.0)
+    return harness.summarize(latencies, time.perf_counter() - wall_started)
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Scan hot-path microbenchmarks.")
+    parser.add_argument("-n", type=int, default=200, help="iterations per case")
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    upload_dir = harness.offline_env()
+
+    import mongomock
+    from starlette.datastructures import UploadFile
+
+    import db as dbmod
+    import image_check
+    import ml_service
+    import storage
+    from models import DiseaseKey
+
+    dbmod._client = mongomock.MongoClient()
+
+    photo = harness.make_image_bytes((90, 140, 60), size=(3000, 4000))  # typical phone photo
+    photo_path = Path(upload_dir) / "bench_photo.jpg"
+    photo_path.write_bytes(photo)
+    buf = ml_service._tensor_buffer()
+    counter = iter(range(10**9))
+
+    def save_once():
+        # unique bytes each time so dedupe never short-circuits the write
+        data = photo + next(counter).to_bytes(8, "little")
+        storage.save_upload(UploadFile(file=io.BytesIO(data), filename="leaf.jpg"))
+
+    labels = [k.value for k in DiseaseKey] + ["blast", "blight"]
+    results = {
+        "_preprocess(path)": _time(lambda: ml_service._preprocess(str(photo_path)), args.n),
+        "_preprocess(bytes)": _time(lambda: ml_service._preprocess(photo, out=buf), args.n),
+        "save_upload": _time(save_once, args.n),
+        "inspect_image (header)": _time(lambda: image_check.inspect_image(photo, ".jpg"), args.n * 50),
+        "DiseaseKey.parse x8": _time(lambda: [DiseaseKey.parse(v) for v in labels], args.n * 50),
+    }
+
+    harness.print_table(f"micro, {len(photo) / 1e6:.1f} MB {ml_service.IMG_SIZE}px target", results)
+    if args.save_baseline:
+        harness.save_baseline(args.save_baseline, results)
+    if args.baseline:
+        return harness.report_regressions(
+            harness.compare_to_baseline(args.baseline, results, args.tolerance), args.tolerance
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,195 @@
+# backend/convert_model.py
+# Convert ml/model.h5 into lightweight inference formats and compare them.
+#
+#   python convert_model.py tflite [--int8 --calib-dir DIR] [--out PATH]
+#   python convert_model.py onnx   [--int8 --calib-dir DIR] [--out PATH]
+#   python convert_model.py report --images DIR [--models ml/model.tflite ml/model.int8.onnx ...]
+#
+# int8 variants use post-training static quantization calibrated on real
+# leaf photos (same preprocessing as the API). Converted models keep the
+# penultimate features as a second output for the similar-scans index. `report` runs every image
+# through the Keras baseline and each converted model on CPU and prints
+# top-1 agreement and per-image latency.
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+import ml_service
+from ml_backends import load_backend, with_embedding_output
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+
+def _image_paths(folder: Path, limit: int = 0) -> List[Path]:
+    paths = sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not paths:
+        raise SystemExit(f"No .jpg/.png images found under {folder}")
+    return paths[:limit] if limit else paths
+
+
+def _calibration_batches(folder: Path, limit: int) -> Iterator["np.ndarray"]:
+    for path in _image_paths(folder, limit):
+        yield ml_service._preprocess(str(path))
+
+
+def _keras_model(path: Path):
+    """The Keras model, with the penultimate features as a second output when it has a Dense head."""
+    from tensorflow.keras.models import load_model
+
+    model = load_model(str(path))
+    return with_embedding_output(model) or model
+
+
+def _kind_for(path: Path) -> str:
+    return {".h5": "keras", ".keras": "keras", ".tflite": "tflite", ".onnx": "onnx"}[path.suffix.lower()]
+
+
+# ---------------- conversions ---------------- #
+def _check_calibration(int8: bool, calib_dir: Path | None) -> None:
+    """Fail before any (slow) export rather than after it."""
+    if int8 and not calib_dir:
+        raise SystemExit("--int8 needs --calib-dir with representative images")
+
+
+def convert_tflite(src: Path, out: Path, int8: bool, calib_dir: Path | None, calib_count: int) -> None:
+    _check_calibration(int8, calib_dir)
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(_keras_model(src))
+    if int8:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([t] for t in _calibration_batches(calib_dir, calib_count))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        # Keep float32 I/O so the API's preprocessing is unchanged.
+        converter.inference_input_type = tf.float32
+        converter.inference_output_type = tf.float32
+    out.write_bytes(converter.convert())
+    print(f"[convert] wrote {out} ({out.stat().st_size / 1e6:.1f} MB)")
+
+
+class _CalibrationReader:
+    """onnxruntime.quantization CalibrationDataReader over preprocessed images."""
+
+    def __init__(self, input_name: str, folder: Path, count: int) -> None:
+        self._input_name = input_name
+        self._it = _calibration_batches(folder, count)
+
+    def get_next(self):
+        tensor = next(self._it, None)
+        return None if tensor is None else {self._input_name: tensor}
+
+
+def convert_onnx(src: Path, out: Path, int8: bool, calib_dir: Path | None, calib_count: int) -> None:
+    _check_calibration(int8, calib_dir)
+    import tensorflow as tf
+    import tf2onnx
+
+    model = _keras_model(src)
+    spec = (tf.TensorSpec((None, ml_service.IMG_SIZE, ml_service.IMG_SIZE, 3), tf.float32, name="input"),)
+    fp32_out = out.with_suffix(".fp32.onnx") if int8 else out
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=str(fp32_out))
+
+    if int8:
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+        try:
+            quantize_static(
+                str(fp32_out),
+                str(out),
+                _CalibrationReader("input", calib_dir, calib_count),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QInt8,
+                weight_type=QuantType.QInt8,
+            )
+        finally:
+            fp32_out.unlink(missing_ok=True)
+    print(f"[convert] wrote {out} ({out.stat().st_size / 1e6:.1f} MB)")
+
+
+# ---------------- parity / latency report ---------------- #
+def _run(backend, tensors: List["np.ndarray"]) -> Dict[str, object]:
+    backend.predict(tensors[0])  # warm-up (graph init, allocations)
+    top1, latencies = [], []
+    for tensor in tensors:
+        started = time.perf_counter()
+        out = backend.predict(tensor)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        top1.append(int(np.argmax(out[0])))
+    latencies.sort()
+    return {
+        "top1": top1,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "mean_ms": statistics.fmean(latencies),
+    }
+
+
+def report(baseline: Path, models: List[Path], images: Path, limit: int, threads: int | None) -> Dict[str, object]:
+    tensors = [ml_service._preprocess(str(p)) for p in _image_paths(images, limit)]
+    results: Dict[str, object] = {"images": len(tensors), "models": {}}
+
+    base = _run(load_backend("keras", baseline), tensors)
+    rows = [(baseline, base)]
+    for path in models:
+        rows.append((path, _run(load_backend(_kind_for(path), path, num_threads=threads), tensors)))
+
+    print(f"\n[report] {len(tensors)} images, CPU, batch size 1, baseline {baseline.name}")
+    print(f"{'model':<28} {'size MB':>8} {'top-1 agree':>12} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+    for path, r in rows:
+        agree = sum(a == b for a, b in zip(r["top1"], base["top1"])) / len(tensors)
+        size_mb = path.stat().st_size / 1e6
+        print(f"{path.name:<28} {size_mb:>8.1f} {agree:>11.1%} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['mean_ms']:>8.2f}")
+        results["models"][path.name] = {
+            "sizeMB": round(size_mb, 2),
+            "top1Agreement": round(agree, 4),
+            "p50Ms": round(r["p50_ms"], 3),
+            "p95Ms": round(r["p95_ms"], 3),
+            "meanMs": round(r["mean_ms"], 3),
+        }
+    return results
+
+
+def main(argv: List[str] | None = None) -> None:
+    ml_dir = ml_service._repo_root() / "ml"
+    parser = argparse.ArgumentParser(description="Convert and compare RiceGuard model formats.")
+    parser.add_argument("--src", type=Path, default=ml_dir / "model.h5", help="Keras model to convert / baseline")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    for fmt in ("tflite", "onnx"):
+        p = sub.add_parser(fmt, help=f"convert to {fmt}")
+        p.add_argument("--out", type=Path)
+        p.add_argument("--int8", action="store_true", help="post-training int8 quantization")
+        p.add_argument("--calib-dir", type=Path, help="representative images for int8 calibration")
+        p.add_argument("--calib-count", type=int, default=200)
+
+    p = sub.add_parser("report", help="top-1 agreement and latency vs the Keras baseline")
+    p.add_argument("--images", type=Path, required=True)
+    p.add_argument("--models", type=Path, nargs="+", required=True)
+    p.add_argument("--limit", type=int, default=500)
+    p.add_argument("--threads", type=int, default=None)
+    p.add_argument("--json", type=Path, help="also write the report as JSON")
+
+    args = parser.parse_args(argv)
+    if args.cmd in ("tflite", "onnx"):
+        suffix = (".int8" if args.int8 else "") + f".{args.cmd}"
+        out = args.out or ml_dir / f"model{suffix}"
+        convert = convert_tflite if args.cmd == "tflite" else convert_onnx
+        convert(args.src, out, args.int8, args.calib_dir, args.calib_count)
+    else:
+        result = report(args.src, args.models, args.images, args.limit, args.threads)
+        if args.json:
+            args.json.write_text(json.dumps(result, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
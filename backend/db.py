@@ -2,21 +2,32 @@
 from datetime import datetime
 from pymongo import MongoClient, ASCENDING, DESCENDING
 from bson import ObjectId
-from settings import MONGO_URI, DB_NAME
+from settings import (
+    MONGO_URI, DB_NAME,
+    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_WAIT_QUEUE_TIMEOUT_MS,
+)
+from metrics import MongoCommandTimer, MongoPoolMonitor
 import certifi
 
 _client: MongoClient | None = None
 
+def client_options(kind: str) -> dict:
+    """Options shared by the sync client and async_db's AsyncMongoClient."""
+    return dict(
+        uuidRepresentation="standard",
+        tls=True,                         
+        tlsCAFile=certifi.where(),        
+        serverSelectionTimeoutMS=8000,    
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[MongoCommandTimer(), MongoPoolMonitor(kind)],
+    )
+
 def get_client() -> MongoClient:
     global _client
     if _client is None:
-        _client = MongoClient(
-            MONGO_URI,
-            uuidRepresentation="standard",
-            tls=True,                         
-            tlsCAFile=certifi.where(),        
-            serverSelectionTimeoutMS=8000,    
-        )
+        _client = MongoClient(MONGO_URI, **client_options("sync"))
     return _client
 
 def get_db():
@@ -26,6 +37,15 @@ def ensure_indexes():
     db = get_db()
     db.users.create_index([("email", ASCENDING)], unique=True, name="uniq_email")
     db.scans.create_index([("userId", ASCENDING), ("createdAt", DESCENDING)], name="user_createdAt")
+    # Same prefix plus _id so keyset pages sort (createdAt, _id) without an in-memory sort.
+    db.scans.create_index(
+        [("userId", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+        name="user_createdAt_id",
+    )
+    # Upload GC checks batches of files with {imageUrl: {$in: [...]}}.
+    db.scans.create_index([("imageUrl", ASCENDING)], name="imageUrl")
+    # Idempotency-Key records of POST /scans expire on their own.
+    db.idempotency_keys.create_index([("expiresAt", ASCENDING)], expireAfterSeconds=0, name="ttl_expiresAt")
 
 def as_object_id(id_str: str) -> ObjectId:
     return ObjectId(id_str)
@@ -0,0 +1,140 @@
+# backend/file_serving.py
+# Cache-friendly serving for /uploads.
+#
+# Stored images are named after the SHA-256 of their bytes (storage.py),
+# and thumbnails/previews after their original's hash, so a URL never
+# changes content. Such files get a strong ETag and
+# `Cache-Control: public, max-age=..., immutable`, which lets browsers
+# and proxies skip revalidation entirely. Other files (legacy names) get a
+# stat-based ETag and must revalidate.
+#
+# Responses support single byte ranges (206 / 416, If-Range) and use the
+# ASGI zero-copy send extension when the server offers it, otherwise they
+# stream the file in CHUNK_SIZE pieces.
+
+from __future__ import annotations
+
+import os
+import re
+from email.utils import formatdate
+from typing import Optional, Tuple
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Receive, Scope, Send
+
+from settings import UPLOAD_CACHE_MAX_AGE
+
+CHUNK_SIZE = 64 * 1024
+ZEROCOPY = "http.response.zerocopysend"
+_CONTENT_ADDRESSED = re.compile(r"^(?P<sha>[0-9a-f]{64})(?P<rest>\.[A-Za-z0-9.]+)?$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_MEDIA_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
+
+
+def cache_headers(path: str, st: os.stat_result) -> dict:
+    """ETag + Cache-Control for a file under /uploads."""
+    m = _CONTENT_ADDRESSED.match(os.path.basename(path))
+    if m:
+        # Originals (<sha>.jpg): the hash is the ETag. Variants
+        # (<sha>.thumb.webp): hash + suffix; their bytes depend only on the
+        # original and the variant settings.
+        sha, rest = m.group("sha"), m.group("rest") or ""
+        etag = f'"{sha}"' if rest.count(".") <= 1 else f'"{sha}{rest}"'
+        return {"etag": etag, "cache-control": f"public, max-age={UPLOAD_CACHE_MAX_AGE}, immutable"}
+    return {"etag": f'"{st.st_mtime_ns:x}-{st.st_size:x}"', "cache-control": "no-cache"}
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single `bytes=` range, None to serve the
+    whole file (no/multi/malformed range). Raises ValueError if unsatisfiable.
+    """
+    if not header:
+        return None
+    m = _RANGE.match(header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    first, last = m.group(1), m.group(2)
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or (last and int(last) < start):
+            raise ValueError("unsatisfiable range")
+    else:  # suffix: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("unsatisfiable range")
+        start, end = max(0, size - length), size - 1
+    return start, end
+
+
+class CachedFileResponse(Response):
+    """File response with cache headers, byte ranges and zero-copy send."""
+
+    def __init__(self, path: str, st: os.stat_result, request_headers: Headers, method: str = "GET") -> None:
+        super().__init__(content=None, status_code=200)
+        self.path = path
+        self.send_body = method != "HEAD"
+        size = st.st_size
+        self.start, self.end = 0, size - 1
+
+        headers = {
+            **cache_headers(path, st),
+            "accept-ranges": "bytes",
+            "last-modified": formatdate(st.st_mtime, usegmt=True),
+            "content-type": _MEDIA_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream"),
+        }
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and if_range and if_range.strip() != headers["etag"]:
+            range_header = None  # the client's partial copy is stale: send it all
+        try:
+            span = parse_range(range_header, size) if size else None
+        except ValueError:
+            self.status_code = 416
+            self.start, self.end = 0, -1
+            headers["content-range"] = f"bytes */{size}"
+            span = None
+        if span:
+            self.status_code = 206
+            self.start, self.end = span
+            headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+        headers["content-length"] = str(self.end - self.start + 1)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start + 1
+        if not self.send_body or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if ZEROCOPY in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({"type": ZEROCOPY, "file": f, "offset": self.start, "count": count, "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            await f.seek(self.start)
+            remaining = count
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:  # file shrank underneath us; end the response cleanly
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles whose file responses are CachedFileResponse (304s still handled here)."""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        response = CachedFileResponse(full_path, stat_result, request_headers, scope["method"])
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
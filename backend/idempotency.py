@@ -0,0 +1,170 @@
+# backend/idempotency.py
+# Idempotency-Key support for POST /scans.
+#
+# Field connections often time out after the server has accepted a scan,
+# and the app retries. With an Idempotency-Key header, a scan is created
+# at most once per (user, key):
+#   - in-process fast path: a retry that arrives while the first request
+#     is still running on this worker awaits the same future;
+#   - `idempotency_keys` collection: the first request claims the key
+#     (insert of a "pending" doc, unique _id); once it succeeds the
+#     ScanItem is stored and later retries replay it without reading the
+#     model or writing a scan. A retry that finds the key pending on
+#     another worker polls until it completes.
+# Docs expire through a TTL index after IDEMPOTENCY_TTL_SECONDS. A failed
+# request releases its key so the retry runs again; a pending claim whose
+# worker died is taken over after IDEMPOTENCY_STALE_SECONDS.
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+
+from async_db import get_async_db
+from metrics import counter
+from settings import IDEMPOTENCY_STALE_SECONDS, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_WAIT_SECONDS
+
+IDEMPOTENT_REQUESTS = counter(
+    "riceguard_idempotent_requests_total",
+    "POST /scans requests carrying an Idempotency-Key, by outcome (new, replayed, joined, conflict).",
+    ["outcome"],
+)
+
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.25
+
+
+def check_key(key: str) -> str:
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} printable characters")
+    return key
+
+
+def fingerprint(*parts: Any) -> str:
+    """Digest of what makes a request distinct (upload hash, form fields)."""
+    return hashlib.sha256("\0".join("" if p is None else str(p) for p in parts).encode()).hexdigest()
+
+
+def _mismatch() -> HTTPException:
+    IDEMPOTENT_REQUESTS.inc(outcome="conflict")
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail="Idempotency-Key was already used for a different request",
+    )
+
+
+class IdempotencyStore:
+    def __init__(self) -> None:
+        # scoped key -> (request fingerprint, future of the response dict)
+        self._inflight: Dict[str, Tuple[str, "asyncio.Future[Dict[str, Any]]"]] = {}
+
+    async def run(
+        self,
+        user_id: str,
+        key: str,
+        request_hash: str,
+        create: Callable[[], Awaitable[Any]],
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        (response, replayed): the stored response for this key, or the
+        result of `create()` (a pydantic model) if the key is new. Only one
+        create() runs per key at a time; `request_hash` (see fingerprint())
+        must match the one the key was first used with.
+        """
+        scoped = f"{user_id}:{key}"
+        running = self._inflight.get(scoped)
+        if running is not None:
+            if running[0] != request_hash:
+                raise _mismatch()
+            IDEMPOTENT_REQUESTS.inc(outcome="joined")
+            return await asyncio.shield(running[1]), True
+
+        future: "asyncio.Future[Dict[str, Any]]" = asyncio.get_running_loop().create_future()
+        self._inflight[scoped] = (request_hash, future)
+        try:
+            result = await self._resolve(scoped, user_id, key, request_hash, create)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # retrieved: no warning when nobody joined
+            raise
+        else:
+            future.set_result(result[0])
+            return result
+        finally:
+            del self._inflight[scoped]
+
+    async def _resolve(self, scoped, user_id, key, request_hash, create) -> Tuple[Dict[str, Any], bool]:
+        coll = get_async_db().idempotency_keys
+        deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                await coll.insert_one({
+                    "_id": scoped,
+                    "userId": user_id,
+                    "key": key,
+                    "fingerprint": request_hash,
+                    "status": "pending",
+                    "startedAt": now,
+                    "expiresAt": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+                })
+                break  # claimed
+            except DuplicateKeyError:
+                pass
+
+            doc = await coll.find_one({"_id": scoped})
+            if doc is None:
+                continue  # released or expired meanwhile: claim again
+            if doc.get("fingerprint") != request_hash:
+                raise _mismatch()
+            if doc["status"] == "done":
+                IDEMPOTENT_REQUESTS.inc(outcome="replayed")
+                return doc["response"], True
+            stale = now - timedelta(seconds=IDEMPOTENCY_STALE_SECONDS)
+            started = doc["startedAt"]
+            if started.tzinfo is None:
+                started = started.replace(tzinfo=timezone.utc)
+            if started < stale:
+                taken = await coll.update_one(
+                    {"_id": scoped, "status": "pending", "startedAt": doc["startedAt"]},
+                    {"$set": {"startedAt": now}},
+                )
+                if taken.modified_count:
+                    break  # the worker that claimed it is gone
+                continue
+            if asyncio.get_running_loop().time() >= deadline:
+                IDEMPOTENT_REQUESTS.inc(outcome="conflict")
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still being processed",
+                    headers={"Retry-After": "2"},
+                )
+            await asyncio.sleep(POLL_SECONDS)  # running on another worker
+
+        IDEMPOTENT_REQUESTS.inc(outcome="new")
+        try:
+            response = jsonable_encoder(await create())
+        except BaseException:
+            await asyncio.shield(coll.delete_one({"_id": scoped, "status": "pending"}))
+            raise
+        await coll.update_one(
+            {"_id": scoped},
+            {"$set": {"status": "done", "response": response, "completedAt": datetime.now(timezone.utc)}},
+        )
+        return response, False
+
+
+@lru_cache(maxsize=1)
+def get_idempotency_store() -> IdempotencyStore:
+    return IdempotencyStore()
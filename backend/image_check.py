@@ -0,0 +1,202 @@
+# backend/image_check.py
+# Header-only validation of uploaded images, before anything decodes them.
+#
+# A tiny PNG can declare 100k x 100k pixels, and a truncated or corrupt
+# JPEG can make the decoder spin; either would cost seconds of CPU and
+# gigabytes of RAM inside an inference worker. storage._checked_chunks
+# feeds each upload through an ImageCheck while it is being read:
+#   - the JPEG SOFn / PNG IHDR header gives the dimensions, checked
+#     against MAX_IMAGE_SIDE and MAX_IMAGE_PIXELS as soon as it has
+#     arrived (the rest of the body is not read);
+#   - a JPEG must contain an EOI marker (FFD9) and a PNG an IEND chunk
+#     somewhere after that header, otherwise it was truncated. Data after
+#     them is allowed: motion photos, vendor trailers and MPF images append
+#     megabytes after the primary image.
+# Only marker/chunk headers are parsed; the rest of the file is searched
+# for the end marker until one turns up (about 1.5 ms per MB of JPEG data).
+# The pixel data is left to the decoder.
+
+from __future__ import annotations
+
+import struct
+import zlib
+from typing import NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from metrics import counter
+from settings import MAX_IMAGE_PIXELS, MAX_IMAGE_SIDE
+
+UPLOADS_REJECTED = counter(
+    "riceguard_uploads_rejected_total",
+    "Uploads refused before decoding, by reason (type, size, dimensions, pixels, malformed, truncated).",
+    ["reason"],
+)
+
+# The header must turn up within this many bytes (EXIF + ICC segments
+# come before SOFn in camera JPEGs and can be large).
+HEADER_LIMIT = 512 * 1024
+_PNG_IEND = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+_JPEG_EOI = b"\xff\xd9"
+# SOF0-SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# markers without a length field: TEM, RST0-7
+_JPEG_STANDALONE = {0x01, *range(0xD0, 0xD8)}
+
+_STATUS = {
+    "dimensions": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    "pixels": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    "malformed": status.HTTP_422_UNPROCESSABLE_ENTITY,
+    "truncated": status.HTTP_422_UNPROCESSABLE_ENTITY,
+}
+
+
+class ImageRejected(ValueError):
+    def __init__(self, reason: str, detail: str) -> None:
+        super().__init__(detail)
+        self.reason = reason
+        self.detail = detail
+
+
+def rejection(reason: str, status_code: int, detail: str) -> HTTPException:
+    """Count a refused upload and build the response for it."""
+    UPLOADS_REJECTED.inc(reason=reason)
+    return HTTPException(status_code=status_code, detail=detail)
+
+
+def as_http(e: ImageRejected) -> HTTPException:
+    return rejection(e.reason, _STATUS[e.reason], e.detail)
+
+
+# ---------------- headers ---------------- #
+def jpeg_size(head: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) from a JPEG's SOFn segment; None if `head` ends before it."""
+    frame = _jpeg_frame(head)
+    return frame[:2] if frame else None
+
+
+def _jpeg_frame(head: bytes) -> Optional[Tuple[int, int, int]]:
+    """jpeg_size plus the offset just past the SOFn segment."""
+    pos, n = 2, len(head)
+    while True:
+        if pos + 4 > n:
+            return None
+        if head[pos] != 0xFF:
+            raise ImageRejected("malformed", "Cannot decode image: corrupt JPEG header")
+        marker = head[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in _JPEG_STANDALONE:
+            pos += 2
+            continue
+        if marker in (0xD8, 0xD9, 0xDA, 0x00):  # SOI again, EOI or scan data before any frame header
+            raise ImageRejected("malformed", "Cannot decode image: JPEG has no frame header")
+        (length,) = struct.unpack_from(">H", head, pos + 2)
+        if length < 2:
+            raise ImageRejected("malformed", "Cannot decode image: corrupt JPEG header")
+        if marker in _JPEG_SOF:
+            if pos + 9 > n:
+                return None
+            height, width = struct.unpack_from(">HH", head, pos + 5)
+            if length < 8 or not width or not height:
+                raise ImageRejected("malformed", "Cannot decode image: corrupt JPEG frame header")
+            return width, height, pos + 2 + length
+        pos += 2 + length
+
+
+def png_size(head: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) from a PNG's IHDR chunk (CRC-checked); None if `head` is too short."""
+    if len(head) < 33:
+        return None
+    length, kind = struct.unpack_from(">I4s", head, 8)
+    if length != 13 or kind != b"IHDR":
+        raise ImageRejected("malformed", "Cannot decode image: PNG has no IHDR chunk")
+    (crc,) = struct.unpack_from(">I", head, 29)
+    if zlib.crc32(head[12:29]) != crc:
+        raise ImageRejected("malformed", "Cannot decode image: corrupt PNG header")
+    width, height = struct.unpack_from(">II", head, 16)
+    if not width or not height:
+        raise ImageRejected("malformed", "Cannot decode image: corrupt PNG header")
+    return width, height
+
+
+def check_dimensions(width: int, height: int) -> None:
+    if width > MAX_IMAGE_SIDE or height > MAX_IMAGE_SIDE:
+        raise ImageRejected(
+            "dimensions", f"Image is {width}x{height} px; at most {MAX_IMAGE_SIDE} px per side is allowed"
+        )
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageRejected(
+            "pixels", f"Image is {width}x{height} px; at most {MAX_IMAGE_PIXELS / 1e6:g} megapixels are allowed"
+        )
+
+
+# ---------------- streaming ---------------- #
+class ImageInfo(NamedTuple):
+    width: int
+    height: int
+
+
+class ImageCheck:
+    """
+    Incremental validator for one upload: feed() every chunk in order,
+    then finish(). Both raise ImageRejected.
+    """
+
+    def __init__(self, ext: str) -> None:
+        self.ext = ext
+        self.info: Optional[ImageInfo] = None
+        self._head = bytearray()
+        self._end_marker = _PNG_IEND if ext == ".png" else _JPEG_EOI
+        self._ended = False   # end marker seen after the header
+        self._carry = b""     # last bytes of the previous chunk, for a marker split across chunks
+
+    def feed(self, chunk: bytes) -> None:
+        if self.info is None:
+            if self._head:
+                self._head += chunk
+                head = self._head
+            else:  # usually the whole header is in the first chunk: parse it in place
+                head = chunk
+            if self.ext == ".png":
+                size, end = png_size(head), 33
+            else:
+                frame = _jpeg_frame(head)
+                size, end = (frame[:2], frame[2]) if frame else (None, 0)
+            if size is not None:
+                check_dimensions(*size)
+                self.info = ImageInfo(*size)
+                self._head = bytearray()
+                # `head` ends with `chunk`: only look for the end marker past the header
+                self._find_end(chunk, max(0, end - (len(head) - len(chunk))))
+            elif len(head) > HEADER_LIMIT:
+                raise ImageRejected("malformed", "Cannot decode image: no image header found")
+            elif head is chunk:
+                self._head += chunk
+        elif not self._ended:
+            self._find_end(chunk, 0)
+
+    def _find_end(self, chunk: bytes, start: int) -> None:
+        marker = self._end_marker
+        if self._carry and (self._carry + chunk[:len(marker) - 1]).find(marker) >= 0:
+            self._ended = True
+        elif chunk.find(marker, start) >= 0:
+            self._ended = True
+        else:
+            keep = len(marker) - 1
+            self._carry = (self._carry + chunk[max(start, len(chunk) - keep):])[-keep:]
+
+    def finish(self) -> ImageInfo:
+        if self.info is None:
+            raise ImageRejected("truncated", "Cannot decode image: file ends before the image header")
+        if not self._ended:
+            raise ImageRejected("truncated", "Cannot decode image: file is truncated")
+        return self.info
+
+
+def inspect_image(data: bytes, ext: str) -> ImageInfo:
+    """Validate a complete file held in memory (same checks as ImageCheck)."""
+    check = ImageCheck(ext)
+    check.feed(data)
+    return check.finish()
@@ -0,0 +1,142 @@
+# backend/image_variants.py
+# Downscaled copies of uploaded leaf photos for list/history views.
+#
+# Each original <dir>/<sha>.<ext> gets siblings named
+#   <dir>/<sha>.thumb.<fmt>    (THUMBNAIL_SIZE px on the long edge)
+#   <dir>/<sha>.preview.<fmt>  (PREVIEW_SIZE px on the long edge)
+# so their URLs follow from imageUrl alone. They are rendered on a small
+# background pool right after a scan is stored (never on the request
+# path), and UploadFiles renders any that are still missing on first
+# request, so older scans get them too.
+
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+from file_serving import CachedStaticFiles
+from models import variant_ext, variant_path
+from settings import PREVIEW_SIZE, THUMBNAIL_SIZE
+from storage import TEMP_PREFIX
+
+VARIANTS: Dict[str, int] = {"thumb": THUMBNAIL_SIZE, "preview": PREVIEW_SIZE}
+_FORMATS = {"webp": ("WEBP", {"quality": 75, "method": 4}), "jpg": ("JPEG", {"quality": 80, "optimize": True, "progressive": True})}
+_SOURCE_EXTS = (".jpg", ".png")
+_VARIANT_RE = re.compile(r"^(?P<stem>[^/\\]+)\.(?P<variant>thumb|preview)\.(?P<ext>webp|jpg)$")
+
+
+def is_variant(path: str) -> bool:
+    return _VARIANT_RE.match(os.path.basename(path)) is not None
+
+
+def source_for(path: str) -> Optional[str]:
+    """The original a variant file was made from, if it still exists."""
+    m = _VARIANT_RE.match(os.path.basename(path))
+    if not m:
+        return None
+    base = os.path.join(os.path.dirname(path), m.group("stem"))
+    for ext in _SOURCE_EXTS:
+        if os.path.exists(base + ext):
+            return base + ext
+    return None
+
+
+def existing_variants(image_path: str) -> List[str]:
+    """Variant files present on disk for an original (any format)."""
+    stem, _ = os.path.splitext(image_path)
+    found = []
+    for variant in VARIANTS:
+        for ext in _FORMATS:
+            candidate = f"{stem}.{variant}.{ext}"
+            if os.path.exists(candidate):
+                found.append(candidate)
+    return found
+
+
+# ---------------- rendering ---------------- #
+def render_variant(image_path: str, variant: str) -> str:
+    """Write one variant next to the original (atomically) and return its path."""
+    from PIL import Image, ImageOps
+
+    out_path = variant_path(image_path, variant)
+    size = VARIANTS[variant]
+    fmt, options = _FORMATS[variant_ext()]
+    with Image.open(image_path) as img:
+        if img.format == "JPEG":
+            img.draft("RGB", (size, size))  # decode at a reduced DCT scale
+        img = ImageOps.exif_transpose(img)  # phones store rotation in EXIF
+        img = img.convert("RGB")
+        img.thumbnail((size, size))
+        fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=".part", dir=os.path.dirname(out_path) or ".")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                img.save(out, format=fmt, **options)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, out_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return out_path
+
+
+def render_variants(image_path: str) -> None:
+    for variant in VARIANTS:
+        if not os.path.exists(variant_path(image_path, variant)):
+            try:
+                render_variant(image_path, variant)
+            except Exception as e:  # the original is still served; retried lazily
+                print(f"[variants] {variant} for {image_path} failed: {e}")
+
+
+@lru_cache(maxsize=1)
+def _executor() -> ThreadPoolExecutor:
+    # One thread: variants are a background nicety and must not compete
+    # with inference for CPU.
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="variants")
+
+
+def schedule_variants(*image_paths: str) -> None:
+    """Queue variant rendering for freshly stored uploads; returns immediately."""
+    for path in image_paths:
+        _executor().submit(render_variants, path)
+
+
+def shutdown_variants() -> None:
+    if _executor.cache_info().currsize:
+        _executor().shutdown(wait=False, cancel_futures=True)
+        _executor.cache_clear()
+
+
+# ---------------- serving ---------------- #
+class UploadFiles(CachedStaticFiles):
+    """The /uploads mount: cache-friendly responses, and a missing thumb/preview is rendered on first request."""
+
+    async def get_response(self, path, scope):
+        try:
+            return await super().get_response(path, scope)
+        except StarletteHTTPException as e:
+            if e.status_code != 404 or not await run_in_threadpool(self._render_missing, path):
+                raise
+        return await super().get_response(path, scope)
+
+    def _render_missing(self, path: str) -> bool:
+        m = _VARIANT_RE.match(os.path.basename(path))
+        if not m or m.group("ext") != variant_ext():
+            return False
+        full_path, _ = self.lookup_path(os.path.dirname(path))  # traversal-safe resolution
+        if not full_path:
+            return False
+        target = os.path.join(full_path, os.path.basename(path))
+        source = source_for(target)
+        if source is None:
+            return False
+        render_variant(source, m.group("variant"))
+        return True
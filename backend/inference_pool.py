@@ -0,0 +1,248 @@
+# backend/inference_pool.py
+# Dedicated executor for CPU-bound preprocessing + inference.
+#
+# Keeps Pillow decoding and model.predict off FastAPI's shared threadpool so
+# cheap endpoints (login, history) stay responsive while scans are running.
+#
+# With the "process" executor each worker runs one job at a time, so the
+# in-process micro-batcher would never see two images together. Instead
+# score_upload groups concurrent single uploads here in the API process
+# (INFER_MAX_BATCH / INFER_MAX_WAIT_MS, as the micro-batcher does) and sends
+# each group to a worker as one predict_batch_bytes job.
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import threading
+import weakref
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from settings import INFERENCE_EXECUTOR, INFERENCE_WORKERS
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+_workers_ready = False
+_probe: Optional[Future] = None  # latest _model_ready check sent to the process pool
+
+
+class InferenceUnavailable(Exception):
+    """Raised when the worker pool broke and its replacement failed too; map to 503."""
+
+
+def _init_worker() -> None:
+    """Load the model and labels once per worker process, then watch the file for new versions."""
+    import ml_service
+
+    try:
+        ml_service.get_labels()
+        ml_service.get_model()
+    except Exception as e:  # surface on first request instead of killing the pool
+        print(f"[pool] model warm-up failed: {e}")
+    ml_service.start_model_watcher()
+
+
+def get_executor() -> Executor:
+    """Create the inference executor on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = max(1, INFERENCE_WORKERS)
+            if INFERENCE_EXECUTOR == "process":
+                # spawn: forking a process that already imported TensorFlow is unsafe
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            else:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+            print(f"[pool] inference executor: {INFERENCE_EXECUTOR} x{workers}")
+        return _executor
+
+
+def _replace_broken(broken: Executor) -> Executor:
+    """
+    Swap out a process pool that lost a worker (OOM kill, segfault): a
+    BrokenProcessPool never recovers, so every later job would fail. Only
+    the first caller to notice replaces it; the new workers warm up in the
+    background.
+    """
+    global _executor, _workers_ready
+    with _executor_lock:
+        if _executor is broken:
+            print("[pool] ERROR: an inference worker died; restarting the pool")
+            _executor = None
+            _workers_ready = False
+            broken.shutdown(wait=False, cancel_futures=True)
+    executor = get_executor()
+    if isinstance(executor, ProcessPoolExecutor):
+        for _ in range(max(1, INFERENCE_WORKERS)):
+            _record_ready(executor, executor.submit(_model_ready))
+    return executor
+
+
+def start_pool() -> None:
+    """Spin up the executor (and, for processes, their models) at startup."""
+    global _workers_ready
+    executor = get_executor()
+    if isinstance(executor, ProcessPoolExecutor):
+        # Touch every worker so the model load happens now, not on first scan.
+        futures = [executor.submit(_model_ready) for _ in range(max(1, INFERENCE_WORKERS))]
+        _workers_ready = all(fut.result() for fut in futures)
+    else:
+        import ml_service
+
+        ml_service.start_model_watcher()  # the model lives in this process
+
+
+def shutdown_pool() -> None:
+    global _executor, _workers_ready
+    with _executor_lock:
+        executor, _executor = _executor, None
+        _workers_ready = False
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _model_ready() -> bool:
+    import ml_service
+
+    return ml_service.get_registry().current() is not None
+
+
+def _record_ready(executor: ProcessPoolExecutor, fut: Future) -> None:
+    """Set _workers_ready from a _model_ready job once it finishes (or dies with its worker)."""
+
+    def done(fut: Future) -> None:
+        global _workers_ready
+        if _executor is executor:
+            _workers_ready = not fut.cancelled() and fut.exception() is None and bool(fut.result())
+
+    fut.add_done_callback(done)
+
+
+def _probe_workers(executor: ProcessPoolExecutor) -> None:
+    """Ask a worker whether it has a model, unless the previous probe is still running."""
+    global _probe, _workers_ready
+    if _probe is not None and not _probe.done():
+        return
+    try:
+        _probe = executor.submit(_model_ready)
+    except (BrokenProcessPool, RuntimeError):  # broken, or shut down
+        _workers_ready = False
+        return
+    _record_ready(executor, _probe)
+
+
+def model_loaded() -> bool:
+    """
+    Whether the executor that serves scans has a model in memory. Process
+    pools are re-probed on every call, so the answer follows a lazy model
+    load or a dead worker one call (metrics scrape) later.
+    """
+    executor = _executor
+    if isinstance(executor, ProcessPoolExecutor):
+        _probe_workers(executor)
+        return _workers_ready
+    return _model_ready()
+
+
+async def run_inference(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run `fn(*args, **kwargs)` on the inference executor and await its
+    result. If the process pool broke, it is replaced and the job retried
+    once; a second failure raises InferenceUnavailable.
+    """
+    loop = asyncio.get_running_loop()
+    call = partial(fn, *args, **kwargs)
+    executor = get_executor()
+    try:
+        return await loop.run_in_executor(executor, call)
+    except BrokenProcessPool:
+        executor = _replace_broken(executor)
+    try:
+        return await loop.run_in_executor(executor, call)
+    except BrokenProcessPool as e:
+        _replace_broken(executor)
+        raise InferenceUnavailable(f"inference workers unavailable: {e}") from e
+
+
+# ---------------- upload batching ---------------- #
+class UploadBatcher:
+    """Collect concurrent uploads on one event loop into predict_batch_bytes jobs."""
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float) -> None:
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._pending: List[Tuple[bytes, "asyncio.Future"]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()  # strong references to running batches
+
+    async def score(self, data: bytes) -> Tuple[str, float, Dict[str, object]]:
+        """Same result as predict_bytes_timed(data)."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((data, fut))
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch)
+        return await fut
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[bytes, "asyncio.Future"]]) -> None:
+        from ml_service import predict_batch_bytes
+
+        try:
+            results, info = await run_inference(predict_batch_bytes, [data for data, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), result in zip(batch, results):
+            if fut.done():  # the request went away
+                continue
+            if "error" in result:
+                fut.set_exception(ValueError(result["error"]))
+                continue
+            fut.set_result((str(result["label"]), float(result["confidence"]), {
+                "decodeSeconds": info["decodeSeconds"],
+                "predictSeconds": info["predictSeconds"],
+                "uncertainReason": result["uncertainReason"],
+                "modelVersion": info["modelVersion"],
+                "embedding": result.get("embedding"),
+            }))
+
+
+_upload_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, UploadBatcher]" = weakref.WeakKeyDictionary()
+
+
+async def score_upload(data: bytes) -> Tuple[str, float, Dict[str, object]]:
+    """
+    Classify one upload: (label, confidence, info) as from
+    ml_service.predict_bytes_timed. Thread executors batch in
+    ml_service's micro-batcher; process executors batch here.
+    """
+    import ml_service
+
+    if INFERENCE_EXECUTOR != "process" or ml_service.INFER_MAX_BATCH <= 1:
+        return await run_inference(ml_service.predict_bytes_timed, data)
+    loop = asyncio.get_running_loop()
+    batcher = _upload_batchers.get(loop)
+    if batcher is None:
+        batcher = _upload_batchers[loop] = UploadBatcher(ml_service.INFER_MAX_BATCH, ml_service.INFER_MAX_WAIT_MS)
+    return await batcher.score(data)
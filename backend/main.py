@@ -1,10 +1,19 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from routers import router as api_router
 from db import ensure_indexes
+from async_db import close_async_client, warm_pool
+from ml_service import get_registry
+from inference_pool import model_loaded, start_pool, shutdown_pool
+import metrics
+from prediction_cache import get_prediction_cache
+from recommendations import get_recommendation_cache, start_recommendation_cache
+from security import calibrate_password_hashing, get_password_hasher
 from seed import seed_recommendations
+from image_variants import UploadFiles, shutdown_variants
+from upload_gc import get_upload_gc
 from settings import ALLOWED_ORIGINS, UPLOAD_DIR
 import os
 
@@ -13,8 +22,20 @@ import os
 async def lifespan(app: FastAPI):
     ensure_indexes()
     seed_recommendations()
+    start_recommendation_cache()
+    calibrate_password_hashing()
+    start_pool()
+    await warm_pool()
+    get_upload_gc().start()
     print("🚀 RiceGuard backend ready (Web + Mobile).")
     yield
+    get_upload_gc().stop()
+    shutdown_pool()
+    get_recommendation_cache().stop_watcher()
+    get_password_hasher().shutdown()
+    shutdown_variants()
+    await close_async_client()
+    get_registry().close()
     print("🛑 RiceGuard backend shutting down...")
 
 
@@ -37,12 +58,39 @@ app.add_middleware(
 # ---------------------- STATIC FILES -------------------
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+app.mount("/uploads", UploadFiles(directory=UPLOAD_DIR), name="uploads")  # renders missing thumbnails
 
 # ---------------------- HEALTH ------------------------
 @app.get("/health")
 def health():
-    return {"status": "ok", "message": "RiceGuard backend (Web + Mobile) is running."}
+    cache = get_prediction_cache()
+    return {
+        "status": "ok",
+        "message": "RiceGuard backend (Web + Mobile) is running.",
+        "predictionCache": cache.stats() if cache else None,
+    }
+
+# ---------------------- METRICS -----------------------
+def _cache_stat(key: str):
+    def read() -> float:
+        cache = get_prediction_cache()
+        return cache.stats()[key] if cache else 0
+    return read
+
+
+metrics.callback("riceguard_model_loaded", "1 when the inference model is loaded and ready.",
+                 lambda: float(model_loaded()))
+metrics.callback("riceguard_prediction_cache_memory_hits_total", "Prediction cache hits served from memory.",
+                 _cache_stat("memoryHits"), kind="counter")
+metrics.callback("riceguard_prediction_cache_mongo_hits_total", "Prediction cache hits served from Mongo.",
+                 _cache_stat("mongoHits"), kind="counter")
+metrics.callback("riceguard_prediction_cache_misses_total", "Prediction cache misses (model was run).",
+                 _cache_stat("misses"), kind="counter")
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 # ---------------------- ROUTERS -----------------------
 app.include_router(api_router, prefix="/api/v1")
@@ -0,0 +1,311 @@
+# backend/metrics.py
+# Minimal Prometheus-compatible metrics (text exposition format 0.0.4).
+#
+# Deliberately tiny instead of pulling in prometheus_client: each record is
+# a dict lookup, a bisect and an add under a per-metric lock (~1 us), which
+# is cheap enough to leave on in production.
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> _LabelKey:
+        try:
+            return tuple(str(labels[n]) for n in self.labelnames)
+        except KeyError as e:
+            raise ValueError(f"{self.name} requires labels {self.labelnames}") from e
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[_LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[_LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class CallbackMetric(_Metric):
+    """An unlabelled value read at scrape time, e.g. counts kept by another component."""
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], float], kind: str = "gauge") -> None:
+        super().__init__(name, documentation)
+        self.kind = kind
+        self._fn = fn
+
+    def samples(self) -> List[str]:
+        try:
+            value = float(self._fn())
+        except Exception:
+            return []  # a broken source must not break the scrape
+        return [f"{self.name} {_fmt_value(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (+Inf last)], sum
+        self._values: Dict[_LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[key] = entry
+            entry[0][idx] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._values.items()]
+        lines: List[str] = []
+        for key, counts, total in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                le = f'le="{_fmt_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {running}")
+            labels = _fmt_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{labels} {running}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette appends the charset
+
+
+def counter(name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, doc, labelnames))  # type: ignore[return-value]
+
+
+def gauge(name: str, doc: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, doc, labelnames))  # type: ignore[return-value]
+
+
+def callback(name: str, doc: str, fn: Callable[[], float], kind: str = "gauge") -> CallbackMetric:
+    return REGISTRY.register(CallbackMetric(name, doc, fn, kind))  # type: ignore[return-value]
+
+
+def histogram(name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, doc, labelnames, buckets=buckets))  # type: ignore[return-value]
+
+
+# ---------------- application metrics ---------------- #
+SCAN_STAGE_SECONDS = histogram(
+    "riceguard_scan_stage_seconds",
+    "Time spent in each stage of POST /scans (read, write, cache, decode, predict, insert).",
+    ["stage"],
+)
+SCAN_SECONDS = histogram("riceguard_scan_seconds", "End-to-end POST /scans handler time.")
+SCANS_IN_FLIGHT = gauge("riceguard_scans_in_flight", "POST /scans requests currently being handled.")
+PREDICTIONS_TOTAL = counter(
+    "riceguard_predictions_total",
+    "Scan results by DiseaseKey; source is 'model' or 'cache'.",
+    ["label", "source"],
+)
+UNCERTAIN_TOTAL = counter(
+    "riceguard_uncertain_total",
+    "Model outputs mapped to 'uncertain', by reason (low_confidence, small_margin).",
+    ["reason"],
+)
+SHADOW_PREDICTIONS_TOTAL = counter(
+    "riceguard_shadow_predictions_total",
+    "Scans also scored by the shadow model, by agreement with the served label (agree, disagree, error).",
+    ["agreement"],
+)
+MONGO_SECONDS = histogram(
+    "riceguard_mongo_seconds",
+    "MongoDB command round-trip time by collection and command.",
+    ["collection", "command"],
+)
+
+
+# ---------------- Mongo command timing ---------------- #
+class MongoCommandTimer(monitoring.CommandListener):
+    """pymongo listener feeding MONGO_SECONDS; register via MongoClient(event_listeners=...)."""
+
+    def __init__(self) -> None:
+        self._pending: Dict[Tuple[object, int], str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        collection = target if isinstance(target, str) else "-"
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event) -> None:
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), "-")
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event)
+
+
+# ---------------- Mongo connection pool ---------------- #
+MONGO_POOL_WAIT_SECONDS = histogram(
+    "riceguard_mongo_pool_wait_seconds",
+    "Time spent waiting to check a connection out of the Mongo pool.",
+    ["client"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0),
+)
+MONGO_POOL_IN_USE = gauge("riceguard_mongo_pool_in_use", "Mongo connections currently checked out.", ["client"])
+MONGO_POOL_OPEN = gauge("riceguard_mongo_pool_open", "Mongo connections currently open.", ["client"])
+MONGO_POOL_CHECKOUT_FAILURES = counter(
+    "riceguard_mongo_pool_checkout_failures_total",
+    "Failed pool checkouts by reason (timeout = waitQueueTimeoutMS exceeded).",
+    ["client", "reason"],
+)
+
+
+class MongoPoolMonitor(monitoring.ConnectionPoolListener):
+    """pymongo pool listener: checkout wait time, in-use and open connections."""
+
+    def __init__(self, client: str) -> None:
+        self.client = client
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        MONGO_POOL_IN_USE.inc(client=self.client)
+        MONGO_POOL_WAIT_SECONDS.observe(event.duration, client=self.client)
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        MONGO_POOL_IN_USE.dec(client=self.client)
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        MONGO_POOL_CHECKOUT_FAILURES.inc(client=self.client, reason=str(event.reason).lower())
+        MONGO_POOL_WAIT_SECONDS.observe(event.duration, client=self.client)
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        MONGO_POOL_OPEN.inc(client=self.client)
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        MONGO_POOL_OPEN.dec(client=self.client)
+
+    # Remaining pool events carry nothing we chart.
+    def pool_created(self, event) -> None: pass
+    def pool_ready(self, event) -> None: pass
+    def pool_cleared(self, event) -> None: pass
+    def pool_closed(self, event) -> None: pass
+    def connection_ready(self, event) -> None: pass
+    def connection_check_out_started(self, event) -> None: pass
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,187 @@
+# backend/ml_backends.py
+# Interchangeable inference runtimes behind one tiny interface:
+#
+#     backend.predict(batch)  # (N, H, W, 3) float32 -> (N, C) float32
+#
+# Backends whose model exposes its penultimate features also set
+# `embedding_dim` and provide
+#
+#     backend.predict_with_embedding(batch)  # -> ((N, C), (N, D)) float32
+#
+# (see similarity.py). Keras models get it from the input of their final
+# Dense layer; converted models need the second output that
+# convert_model.py adds, and it is told apart from the class output by
+# its wider last dimension.
+#
+# "keras"  - the original ml/model.h5 through tensorflow.keras (fp32)
+# "tflite" - a converted .tflite file (fp32 or int8-quantized) through
+#            tflite_runtime, falling back to tensorflow.lite
+# "onnx"   - a converted .onnx file (fp32 or QDQ int8) through onnxruntime
+#
+# Each runtime is imported lazily so a worker only needs the one it uses.
+
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+BACKENDS = ("keras", "tflite", "onnx")
+DEFAULT_FILENAMES = {"keras": "model.h5", "tflite": "model.tflite", "onnx": "model.onnx"}
+
+
+def with_embedding_output(model):
+    """A Keras model sharing `model`'s weights that also outputs the input of its final Dense layer."""
+    from tensorflow.keras.layers import Dense
+    from tensorflow.keras.models import Model
+
+    head = next((layer for layer in reversed(model.layers) if isinstance(layer, Dense)), None)
+    if head is None:
+        return None
+    return Model(model.inputs, [model.output, head.input], name=f"{model.name}_embedding")
+
+
+def _split_outputs(shapes: List[Sequence]) -> Tuple[int, Optional[int]]:
+    """Indices of the class output and (if any) the wider embedding output."""
+    if len(shapes) < 2:
+        return 0, None
+    widths = [s[-1] if isinstance(s[-1], int) else 0 for s in shapes]
+    order = sorted(range(len(shapes)), key=widths.__getitem__)
+    return order[0], order[-1]
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, path: Path) -> None:
+        from tensorflow.keras.models import load_model
+
+        self.path = path
+        self.model = load_model(str(path))
+        self.num_classes: Optional[int] = int(self.model.output_shape[-1])
+        self._embedding_model = with_embedding_output(self.model)
+        self.embedding_dim: Optional[int] = (
+            int(self._embedding_model.output_shape[1][-1]) if self._embedding_model is not None else None
+        )
+
+    def predict(self, batch: "np.ndarray") -> "np.ndarray":
+        return np.asarray(self.model.predict(batch, verbose=0), dtype="float32")
+
+    def predict_with_embedding(self, batch: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+        probs, features = self._embedding_model.predict(batch, verbose=0)
+        return np.asarray(probs, dtype="float32"), np.asarray(features, dtype="float32")
+
+
+class TFLiteBackend:
+    """
+    TFLite interpreter wrapper. The interpreter is not thread-safe and its
+    input shape is fixed per allocation, so calls are serialized and the
+    tensors are re-allocated only when the batch size changes. Quantized
+    (int8/uint8) inputs and outputs are (de)quantized with the model's own
+    scale and zero point.
+    """
+
+    name = "tflite"
+
+    def __init__(self, path: Path, num_threads: Optional[int] = None) -> None:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter  # type: ignore[no-redef]
+
+        self.path = path
+        self._interpreter = Interpreter(model_path=str(path), num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._outputs = self._interpreter.get_output_details()
+        self._class_out, self._embed_out = _split_outputs([o["shape"] for o in self._outputs])
+        self._batch = int(self._input["shape"][0])
+        self._lock = threading.Lock()
+        self.num_classes = int(self._outputs[self._class_out]["shape"][-1])
+        self.embedding_dim = int(self._outputs[self._embed_out]["shape"][-1]) if self._embed_out is not None else None
+
+    def _resize(self, n: int) -> None:
+        if n == self._batch:
+            return
+        shape = list(self._input["shape"])
+        shape[0] = n
+        self._interpreter.resize_tensor_input(self._input["index"], shape)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._outputs = self._interpreter.get_output_details()
+        self._batch = n
+
+    def _read(self, detail: Dict) -> "np.ndarray":
+        out = self._interpreter.get_tensor(detail["index"])
+        if detail["dtype"] in (np.int8, np.uint8):
+            scale, zero = detail["quantization"]
+            out = (out.astype("float32") - zero) * scale
+        return np.asarray(out, dtype="float32")
+
+    def _invoke(self, batch: "np.ndarray") -> None:
+        self._resize(batch.shape[0])
+        x = batch
+        dtype = self._input["dtype"]
+        if dtype in (np.int8, np.uint8):
+            scale, zero = self._input["quantization"]
+            info = np.iinfo(dtype)
+            x = np.clip(np.round(batch / scale + zero), info.min, info.max)
+        self._interpreter.set_tensor(self._input["index"], x.astype(dtype, copy=False))
+        self._interpreter.invoke()
+
+    def predict(self, batch: "np.ndarray") -> "np.ndarray":
+        with self._lock:
+            self._invoke(batch)
+            return self._read(self._outputs[self._class_out])
+
+    def predict_with_embedding(self, batch: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+        with self._lock:
+            self._invoke(batch)
+            return self._read(self._outputs[self._class_out]), self._read(self._outputs[self._embed_out])
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path: Path, num_threads: Optional[int] = None) -> None:
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        if num_threads:
+            opts.intra_op_num_threads = num_threads
+        self.path = path
+        self._session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+        self._input_name = self._session.get_inputs()[0].name
+        outputs = self._session.get_outputs()
+        self._class_out, self._embed_out = _split_outputs([o.shape for o in outputs])
+        self._output_names = [o.name for o in outputs]
+        last_dim = outputs[self._class_out].shape[-1]
+        self.num_classes = last_dim if isinstance(last_dim, int) else None
+        self.embedding_dim = outputs[self._embed_out].shape[-1] if self._embed_out is not None else None
+
+    def predict(self, batch: "np.ndarray") -> "np.ndarray":
+        # InferenceSession.run is thread-safe.
+        feed = {self._input_name: batch.astype("float32", copy=False)}
+        out = self._session.run([self._output_names[self._class_out]], feed)[0]
+        return np.asarray(out, dtype="float32")
+
+    def predict_with_embedding(self, batch: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+        feed = {self._input_name: batch.astype("float32", copy=False)}
+        names = [self._output_names[self._class_out], self._output_names[self._embed_out]]
+        probs, features = self._session.run(names, feed)
+        return np.asarray(probs, dtype="float32"), np.asarray(features, dtype="float32")
+
+
+_CLASSES: Dict[str, type] = {"keras": KerasBackend, "tflite": TFLiteBackend, "onnx": OnnxBackend}
+
+
+def load_backend(kind: str, path: Path, num_threads: Optional[int] = None):
+    """Instantiate the backend named `kind` for the model file at `path`."""
+    kind = kind.strip().lower()
+    if kind not in _CLASSES:
+        raise ValueError(f"Unknown MODEL_BACKEND {kind!r}; expected one of {', '.join(BACKENDS)}")
+    if kind == "keras":
+        return KerasBackend(path)
+    return _CLASSES[kind](path, num_threads=num_threads)
@@ -1,31 +1,61 @@
 from __future__ import annotations
 
+import hashlib
+import importlib.util
+import io
 import os
+import threading
+import time
 from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+from batching import MicroBatcher
+from ml_backends import BACKENDS, DEFAULT_FILENAMES, load_backend
+from model_registry import LoadedModel, ModelRegistry
 
 # Allow overrides from the environment so deployments can swap models/labels.
 MODEL_PATH = os.getenv("MODEL_PATH")
+MODEL_VERSION = os.getenv("MODEL_VERSION")
 LABELS_PATH = os.getenv("LABELS_PATH")
 CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", "0.50"))
 CONFIDENCE_MARGIN = float(os.getenv("CONFIDENCE_MARGIN", "0.15"))
 IMG_SIZE = int(os.getenv("IMG_SIZE", "224"))
+# Inference runtime: "keras" (ml/model.h5), "tflite" (ml/model.tflite) or
+# "onnx" (ml/model.onnx); see ml_backends.py and convert_model.py.
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "keras").strip().lower()
+MODEL_THREADS = int(os.getenv("MODEL_THREADS", "0")) or None
+# "caffe" = ResNet50 preprocess_input (BGR, ImageNet mean subtraction);
+# "scale" = RGB / 255.
+PREPROCESS_MODE = os.getenv("PREPROCESS_MODE", "caffe").strip().lower()
+# Micro-batching: concurrent predict_image calls are grouped into one
+# model.predict of up to INFER_MAX_BATCH images, waiting at most
+# INFER_MAX_WAIT_MS for stragglers. INFER_MAX_BATCH=1 disables batching.
+# With the "process" executor the API process groups uploads the same way
+# (inference_pool.score_upload) and workers receive whole batches.
+INFER_MAX_BATCH = int(os.getenv("INFER_MAX_BATCH", "16"))
+INFER_MAX_WAIT_MS = float(os.getenv("INFER_MAX_WAIT_MS", "10"))
+# Hot reload: every process serving predictions checks the model file this
+# often and swaps in a changed one after preloading and warming it up.
+# 0 disables; ignored when MODEL_VERSION is set.
+MODEL_RELOAD_SECONDS = float(os.getenv("MODEL_RELOAD_SECONDS", "30"))
+# Shadow scoring: MODEL_SHADOW_RATE of single scans (0..1) are also scored
+# by the candidate at MODEL_SHADOW_PATH, off the request path, and the
+# agreement is counted in riceguard_shadow_predictions_total.
+MODEL_SHADOW_PATH = os.getenv("MODEL_SHADOW_PATH")
+MODEL_SHADOW_RATE = float(os.getenv("MODEL_SHADOW_RATE", "0"))
 
 # TensorFlow/Pillow/Numpy are optional at import time; guard them for tests.
 try:
-    from tensorflow.keras.models import load_model
     import numpy as np
     from PIL import Image
-    try:
-        from tensorflow.keras.applications.resnet50 import preprocess_input as resnet50_preprocess
-    except Exception:  # pragma: no cover - optional depending on model family
-        resnet50_preprocess = None
-
-    TF_OK = True
 except Exception:  # pragma: no cover - runtime availability guard
-    TF_OK = False
-    resnet50_preprocess = None
+    np = None
+    Image = None
+
+# TensorFlow is only needed by the "keras" backend; check without importing it
+# so TFLite/ONNX workers skip the multi-second TF import entirely.
+TF_OK = importlib.util.find_spec("tensorflow") is not None
 
 
 # ---------------- Paths ---------------- #
@@ -34,7 +64,8 @@ def _repo_root() -> Path:
 
 
 def _default_model_path() -> Path:
-    return (_repo_root() / "ml" / "model.h5").resolve()
+    filename = DEFAULT_FILENAMES.get(MODEL_BACKEND, "model.h5")
+    return (_repo_root() / "ml" / filename).resolve()
 
 
 def _default_labels_path() -> Path:
@@ -65,34 +96,189 @@ def get_labels() -> List[str]:
 
 
 # ---------------- Model ---------------- #
-@lru_cache(maxsize=1)
-def get_model():
-    """Load and cache the Keras model, raising helpful errors if unavailable."""
-    if not TF_OK:
+def _load_model(path: Path) -> LoadedModel:
+    """
+    Load the inference backend selected by MODEL_BACKEND from `path`,
+    raising helpful errors if it is unavailable or disagrees with labels.txt.
+    """
+    if MODEL_BACKEND not in BACKENDS:
+        raise RuntimeError(f"MODEL_BACKEND must be one of {BACKENDS}, got {MODEL_BACKEND!r}")
+    if np is None or Image is None:
+        raise RuntimeError("NumPy/Pillow not available in this environment")
+    if MODEL_BACKEND == "keras" and not TF_OK:
         raise RuntimeError("TensorFlow/Pillow not available in this environment")
 
-    path = Path(MODEL_PATH).resolve() if MODEL_PATH else _default_model_path()
     if not path.exists():
         raise FileNotFoundError(f"Model file not found at: {path}")
+    fingerprint = _file_fingerprint(path)
+
+    print(f"[ml] Loading RiceGuard model ({MODEL_BACKEND}) from {path}")
+    backend = load_backend(MODEL_BACKEND, path, num_threads=MODEL_THREADS)
+
+    labels = get_labels()
+    if backend.num_classes is not None and backend.num_classes != len(labels):
+        raise RuntimeError(
+            f"Model output dimension ({backend.num_classes}) does not match labels ({len(labels)}). "
+            "Update ml/labels.txt or retrain/export the model with matching classes."
+        )
+    return LoadedModel(backend, MODEL_VERSION or fingerprint, labels, path=path, fingerprint=fingerprint)
+
+
+def _warm_up(model: LoadedModel) -> None:
+    """Run a zero batch of each size the model will see before it takes traffic."""
+    for size in sorted({1, max(1, INFER_MAX_BATCH)}):
+        out = model.backend.predict(np.zeros((size, IMG_SIZE, IMG_SIZE, 3), dtype="float32"))
+        if np.shape(out) != (size, len(model.labels)):
+            raise RuntimeError(
+                f"Warm-up output shape {np.shape(out)} does not match ({size}, {len(model.labels)} labels)"
+            )
+
+
+@lru_cache(maxsize=1)
+def get_registry() -> ModelRegistry:
+    """This process's models: the active one, a retiring one, and the optional shadow."""
+    return ModelRegistry(_load_model, _model_path, _file_fingerprint, warm_up=_warm_up)
 
-    print(f"[ml] Loading RiceGuard model from {path}")
-    return load_model(str(path))
+
+def get_model():
+    """The backend currently serving predictions, loading it on first use."""
+    return get_registry().active().backend
+
+
+def start_model_watcher() -> None:
+    """
+    Poll the model file every MODEL_RELOAD_SECONDS and hot-swap it when it
+    changes. Not started when MODEL_VERSION pins the version: a new file
+    under the same version would poison the prediction cache.
+    """
+    if not MODEL_VERSION:
+        get_registry().start_watcher(MODEL_RELOAD_SECONDS)
+
+
+def _model_path() -> Path:
+    return Path(MODEL_PATH).resolve() if MODEL_PATH else _default_model_path()
+
+
+def _file_fingerprint(path: Path) -> str:
+    """Short hash of the model file's name, size and mtime (raises OSError if missing)."""
+    st = path.stat()
+    raw = f"{path.name}:{st.st_size}:{st.st_mtime_ns}".encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()[:12]
+
+
+def get_model_version() -> str:
+    """
+    Identify the model for cache keys: the version of the model this
+    process is serving, else MODEL_VERSION, else the fingerprint of the
+    model file on disk (the API process in "process" executor mode never
+    loads one). Predictions report the version that actually scored them.
+    """
+    model = get_registry().current()
+    if model is not None:
+        return model.version
+    if MODEL_VERSION:
+        return MODEL_VERSION
+    try:
+        return _file_fingerprint(_model_path())
+    except OSError:
+        return "unknown"
 
 
 # ---------------- Preprocess ---------------- #
-def _preprocess(image_path: str) -> "np.ndarray":
+# ResNet50 "caffe" preprocessing (RGB->BGR, subtract ImageNet BGR means),
+# applied in place so the tensor buffer can be reused between calls.
+_CAFFE_BGR_MEAN = (103.939, 116.779, 123.68)
+_buffers = threading.local()
+
+ImageSource = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
+
+def _tensor_buffer() -> "np.ndarray":
+    """Per-thread preallocated (1, IMG_SIZE, IMG_SIZE, 3) float32 input buffer."""
+    buf = getattr(_buffers, "tensor", None)
+    if buf is None or buf.shape[1] != IMG_SIZE:
+        buf = np.empty((1, IMG_SIZE, IMG_SIZE, 3), dtype="float32")
+        _buffers.tensor = buf
+    return buf
+
+
+def _preprocess(source: ImageSource, out: "np.ndarray | None" = None) -> "np.ndarray":
     """
     Prepare an image for inference.
-    Resize to IMG_SIZE x IMG_SIZE, scale to 0-1, and add batch dimension.
+    `source` is a file path, the raw file bytes, or a binary file object.
+    JPEGs are decoded with draft() at the smallest DCT scale that is still
+    >= IMG_SIZE, then resized to IMG_SIZE x IMG_SIZE and normalized into
+    `out` (a new (1, H, W, 3) float32 array when not given).
     """
-    img = Image.open(image_path).convert("RGB").resize((IMG_SIZE, IMG_SIZE))
-    arr = np.asarray(img, dtype="float32")
-    if resnet50_preprocess:
-        arr = resnet50_preprocess(arr)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    img = Image.open(source)
+    if img.format == "JPEG":
+        img.draft("RGB", (IMG_SIZE, IMG_SIZE))
+    img = img.convert("RGB")
+    if img.size != (IMG_SIZE, IMG_SIZE):
+        img = img.resize((IMG_SIZE, IMG_SIZE))
+
+    if out is None:
+        out = np.empty((1, IMG_SIZE, IMG_SIZE, 3), dtype="float32")
+    pixels = np.asarray(img)  # uint8 (H, W, 3)
+    if PREPROCESS_MODE == "caffe":
+        out[0] = pixels[..., ::-1]
+        out -= np.asarray(_CAFFE_BGR_MEAN, dtype="float32")
     else:
-        arr /= 255.0
-    arr = np.expand_dims(arr, axis=0)  # (1, H, W, 3)
-    return arr
+        out[0] = pixels
+        out /= 255.0
+    return out
+
+
+# ---------------- Embeddings ---------------- #
+# Backends that expose their penultimate features (ml_backends.py) have
+# them appended to each output row, so one array per image still flows
+# through the micro-batcher; _split takes them apart again.
+def _forward(model: LoadedModel, batch: "np.ndarray") -> "np.ndarray":
+    """(N, C) class outputs, followed by the (N, D) embedding columns when the backend has them."""
+    if not getattr(model.backend, "embedding_dim", None):
+        return model.backend.predict(batch)
+    probs, features = model.backend.predict_with_embedding(batch)
+    return np.concatenate([probs, features.reshape(len(probs), -1)], axis=1)
+
+
+def _split(model: LoadedModel, row: "np.ndarray") -> Tuple["np.ndarray", Optional[bytes]]:
+    """One _forward row -> (class outputs, embedding bytes or None)."""
+    dim = getattr(model.backend, "embedding_dim", None) or 0
+    if not dim:
+        return row, None
+    return row[:-dim], embedding_bytes(row[-dim:])
+
+
+def embedding_bytes(features: "np.ndarray") -> bytes:
+    """L2-normalized little-endian float16 bytes: what scans store and similarity.py indexes."""
+    v = np.asarray(features, dtype="float32").ravel()
+    norm = float(np.linalg.norm(v))
+    if norm > 0:
+        v = v / norm
+    return v.astype("<f2").tobytes()
+
+
+# ---------------- Batching ---------------- #
+def _batcher(model: LoadedModel) -> MicroBatcher:
+    """The micro-batcher feeding `model`; each loaded model gets its own."""
+    if model.batcher is None:
+        with model.lock:
+            if model.batcher is None:
+                model.batcher = MicroBatcher(
+                    lambda batch: _forward(model, batch),
+                    max_batch_size=INFER_MAX_BATCH,
+                    max_wait_ms=INFER_MAX_WAIT_MS,
+                )
+    return model.batcher
+
+
+def _infer(model: LoadedModel, tensor: "np.ndarray") -> Tuple["np.ndarray", Optional[bytes]]:
+    """Return the class outputs and embedding for a (1, H, W, 3) tensor."""
+    if INFER_MAX_BATCH > 1:
+        return _split(model, _batcher(model).predict(tensor[0]))
+    return _split(model, _forward(model, tensor)[0])
 
 
 # ---------------- Inference ---------------- #
@@ -103,12 +289,127 @@ def predict_image(image_path: str) -> Tuple[str, float]:
     we return ("uncertain", confidence) so the client can handle low-confidence
     cases gracefully.
     """
-    model = get_model()
-    labels = get_labels()
-    tensor = _preprocess(image_path)
+    with get_registry().lease() as model:  # fails fast (before queueing) if the model cannot load
+        tensor = _preprocess(image_path)
+        raw, _ = _infer(model, tensor)
+        return _postprocess(raw, model.labels)
+
+
+def predict_bytes(data: bytes) -> Tuple[str, float]:
+    """
+    Same contract as predict_image, but decodes the upload straight from
+    memory into this thread's reusable tensor buffer, so callers can skip
+    the write-then-reopen round trip through disk.
+    """
+    label, confidence, _ = predict_bytes_timed(data)
+    return label, confidence
+
+
+def predict_bytes_timed(data: bytes) -> Tuple[str, float, Dict[str, object]]:
+    """
+    predict_bytes plus a small info dict: decodeSeconds, predictSeconds,
+    uncertainReason (None unless the result is "uncertain"), the
+    modelVersion that scored it and its embedding (float16 bytes, None
+    if the model has none). Returned rather than recorded here because
+    this usually runs in an inference worker process.
+    """
+    with get_registry().lease() as model:
+        started = time.perf_counter()
+        tensor = _preprocess(data, out=_tensor_buffer())
+        decoded = time.perf_counter()
+        raw, embedding = _infer(model, tensor)
+        predicted = time.perf_counter()
+        label, confidence, reason = _classify(raw, model.labels)
+    return label, confidence, {
+        "decodeSeconds": decoded - started,
+        "predictSeconds": predicted - decoded,
+        "uncertainReason": reason,
+        "modelVersion": model.version,
+        "embedding": embedding,
+    }
+
+
+def predict_batch_bytes(items: List[bytes]) -> Tuple[List[Dict[str, object]], Dict[str, object]]:
+    """
+    Score many uploads with a single model.predict call (no micro-batcher:
+    the batch is already formed). Returns one dict per input, in order,
+    with label/confidence/uncertainReason/embedding, or error when that
+    image could not be decoded; plus decodeSeconds/predictSeconds/modelVersion for the
+    whole batch.
+    """
+    with get_registry().lease() as model:
+        results: List[Dict[str, object]] = [{} for _ in items]
+        batch = np.empty((len(items), IMG_SIZE, IMG_SIZE, 3), dtype="float32")
+        decoded: List[int] = []
+        started = time.perf_counter()
+        for i, data in enumerate(items):
+            try:
+                _preprocess(data, out=batch[len(decoded):len(decoded) + 1])
+                decoded.append(i)
+            except Exception as e:
+                results[i] = {"error": f"Could not decode image: {e}"}
+        decode_done = time.perf_counter()
+        if decoded:
+            raw = _forward(model, batch[:len(decoded)])
+            for row, i in enumerate(decoded):
+                probs, embedding = _split(model, raw[row])
+                label, confidence, reason = _classify(probs, model.labels)
+                results[i] = {
+                    "label": label, "confidence": confidence, "uncertainReason": reason, "embedding": embedding,
+                }
+    return results, {
+        "decodeSeconds": decode_done - started,
+        "predictSeconds": time.perf_counter() - decode_done,
+        "modelVersion": model.version,
+    }
+
+
+def predict_tensors(batch: "np.ndarray") -> Tuple[List[Tuple[str, float, Optional[str], Optional[bytes]]], str]:
+    """
+    Classify an already preprocessed (N, H, W, 3) batch with one
+    model.predict call, for callers that decode on their own workers
+    (rescore.py). Returns (label, confidence, uncertainReason, embedding)
+    per row and the version of the model that scored them.
+    """
+    with get_registry().lease() as model:
+        out = []
+        for row in _forward(model, batch):
+            probs, embedding = _split(model, row)
+            out.append((*_classify(probs, model.labels), embedding))
+        return out, model.version
+
+
+_shadow_lock = threading.Lock()
+
+
+def predict_shadow_bytes(data: bytes) -> Optional[Dict[str, object]]:
+    """
+    Score an upload with the candidate model at MODEL_SHADOW_PATH (loaded
+    on first use). The result is only compared with the served one, never
+    returned to clients. None when no shadow model is configured.
+    """
+    if not MODEL_SHADOW_PATH:
+        return None
+    registry = get_registry()
+    if registry.shadow() is None:
+        with _shadow_lock:
+            if registry.shadow() is None:
+                registry.load_shadow(Path(MODEL_SHADOW_PATH).resolve())
+    with registry.lease(shadow=True) as model:
+        tensor = _preprocess(data)
+        label, confidence, _ = _classify(model.backend.predict(tensor)[0], model.labels)
+    return {"label": label, "confidence": confidence, "modelVersion": model.version}
+
+
+def _postprocess(raw: "np.ndarray", labels: List[str]) -> Tuple[str, float]:
+    """Apply the label check, softmax fallback and threshold/margin rules to one output row."""
+    label, confidence, _ = _classify(raw, labels)
+    return label, confidence
+
 
-    preds = model.predict(tensor, verbose=0)  # shape (1, C)
-    probs = np.asarray(preds[0], dtype="float32")
+def _classify(raw: "np.ndarray", labels: List[str]) -> Tuple[str, float, Optional[str]]:
+    """_postprocess, also naming why a result became "uncertain" (low_confidence / small_margin)."""
+    probs = np.asarray(raw, dtype="float32")
 
     # Ensure labels and model output dimensions match.
     if len(probs) != len(labels):
@@ -139,6 +440,8 @@ def predict_image(image_path: str) -> Tuple[str, float]:
     runner_up_conf = float(probs[top2]) if top2 is not None else 0.0
     confidence_gap = confidence - runner_up_conf
 
-    if confidence < CONFIDENCE_THRESHOLD or confidence_gap < CONFIDENCE_MARGIN:
-        return "uncertain", confidence
-    return labels[top1], confidence
+    if confidence < CONFIDENCE_THRESHOLD:
+        return "uncertain", confidence, "low_confidence"
+    if confidence_gap < CONFIDENCE_MARGIN:
+        return "uncertain", confidence, "small_margin"
+    return labels[top1], confidence, None
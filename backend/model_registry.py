@@ -0,0 +1,248 @@
+# backend/model_registry.py
+# Hot-swappable models for one process.
+#
+# Each process that runs inference (the API process with
+# INFERENCE_EXECUTOR=thread, or every inference worker process) owns one
+# ModelRegistry. Predictions take a lease on the active model for the
+# duration of one call, so they always see a single consistent model and
+# report its version. Rolling out a new model file:
+#   1. preload: the candidate is loaded next to the active one (requests
+#      keep flowing to the old model meanwhile);
+#   2. warm-up: one synthetic batch per batch shape goes through it, so
+#      the first real request does not pay for graph building/allocation;
+#   3. swap: the active pointer is replaced under a lock (new leases get
+#      the new model);
+#   4. release: the old model is closed once its last lease is returned.
+# A watcher thread polls the model file and does all of this when its
+# fingerprint changes. An optional shadow model can be loaded alongside
+# for comparison scoring; it never serves responses.
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional
+
+
+class LoadedModel:
+    """One model version: the backend, its labels, and who is still using it."""
+
+    def __init__(
+        self,
+        backend: Any,
+        version: str,
+        labels: List[str],
+        path: Optional[Path] = None,
+        fingerprint: Optional[str] = None,
+    ) -> None:
+        self.backend = backend
+        self.version = version
+        self.labels = labels
+        self.path = path
+        self.fingerprint = fingerprint  # of the file at load time; the watcher compares against it
+        self.loaded_at = time.time()
+        self.batcher: Any = None  # MicroBatcher, created on first use by ml_service
+        self.lock = threading.Lock()
+        self._leases = 0
+        self._retired = False
+        self._closed = False
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self.batcher is not None:
+            self.batcher.close()
+        close = getattr(self.backend, "close", None)
+        if callable(close):
+            close()
+        print(f"[models] released {self.version}")
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        load: Callable[[Path], LoadedModel],
+        model_path: Callable[[], Path],
+        fingerprint: Callable[[Path], str],
+        warm_up: Callable[[LoadedModel], None] = lambda model: None,
+    ) -> None:
+        self._load = load
+        self._model_path = model_path
+        self._fingerprint = fingerprint
+        self._warm_up = warm_up
+        self._lock = threading.Lock()       # guards the active/shadow pointers and lease counts
+        self._load_lock = threading.Lock()  # one load at a time
+        self._active: Optional[LoadedModel] = None
+        self._shadow: Optional[LoadedModel] = None
+        self._seen: Optional[str] = None    # fingerprint waiting to be stable for one poll
+        self._failed: Optional[str] = None  # fingerprint that failed to load; skipped until the file changes
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.swaps = 0
+
+    # ---------------- leases ---------------- #
+    def current(self) -> Optional[LoadedModel]:
+        """The active model, or None if this process has not loaded one (never loads)."""
+        return self._active
+
+    def active(self) -> LoadedModel:
+        """The active model, loading the configured file on first use."""
+        model = self._active
+        if model is None:
+            with self._load_lock:
+                if self._active is None:
+                    self._install(self.preload())
+                model = self._active
+        return model
+
+    @contextmanager
+    def lease(self, shadow: bool = False) -> Iterator[LoadedModel]:
+        """Hold the active (or shadow) model for one prediction; it is not released before exit."""
+        if not shadow:
+            self.active()
+        with self._lock:
+            model = self._shadow if shadow else self._active
+            if model is None:
+                raise RuntimeError("No shadow model is loaded")
+            model._leases += 1
+        try:
+            yield model
+        finally:
+            with self._lock:
+                model._leases -= 1
+                idle = model._retired and model._leases == 0
+            if idle:
+                model.close()
+
+    # ---------------- loading / swapping ---------------- #
+    def preload(self, path: Optional[Path] = None) -> LoadedModel:
+        """Load and warm up a model without making it active."""
+        started = time.perf_counter()
+        model = self._load(path or self._model_path())
+        self._warm_up(model)
+        print(f"[models] loaded {model.version} from {model.path} in {time.perf_counter() - started:.1f}s")
+        return model
+
+    def swap(self, model: LoadedModel) -> Optional[LoadedModel]:
+        """Make `model` active; the previous one is released when its last lease ends."""
+        with self._load_lock:
+            return self._install(model)
+
+    def _install(self, model: LoadedModel) -> Optional[LoadedModel]:
+        with self._lock:
+            old, self._active = self._active, model
+            idle = False
+            if old is not None:
+                old._retired = True
+                idle = old._leases == 0
+            self.swaps += 1
+        if old is not None:
+            print(f"[models] serving {model.version} (was {old.version})")
+            if idle:
+                old.close()
+        return old
+
+    def reload(self, path: Optional[Path] = None) -> LoadedModel:
+        """Preload + warm up + swap, all while the current model keeps serving."""
+        model = self.preload(path)
+        self.swap(model)
+        return model
+
+    def install(self, backend: Any, version: str, labels: List[str]) -> LoadedModel:
+        """Serve an already constructed backend (tests, benchmarks, embedding callers)."""
+        model = LoadedModel(backend, version, labels)
+        self.swap(model)
+        return model
+
+    def load_shadow(self, path: Path) -> LoadedModel:
+        """Load a candidate that is scored alongside the active model but never serves."""
+        model = self.preload(path)
+        with self._lock:
+            old, self._shadow = self._shadow, model
+            if old is not None:
+                old._retired = True
+                idle = old._leases == 0
+        if old is not None and idle:
+            old.close()
+        return model
+
+    def shadow(self) -> Optional[LoadedModel]:
+        return self._shadow
+
+    def reset(self) -> None:
+        """Drop all models; the next active() loads from disk again."""
+        with self._lock:
+            models = [m for m in (self._active, self._shadow) if m is not None]
+            self._active = self._shadow = None
+            for m in models:
+                m._retired = True
+            idle = [m for m in models if m._leases == 0]
+        for m in idle:
+            m.close()
+
+    # ---------------- file watcher ---------------- #
+    def reload_if_changed(self) -> bool:
+        """
+        Swap in the model file if it changed since the active model was
+        loaded and has stayed unchanged for one poll (so a file still being
+        copied is not loaded half-written). A file that failed to load is
+        not retried until it changes again. Returns True after a swap.
+        """
+        model = self._active
+        if model is None or model.fingerprint is None:
+            return False
+        path = self._model_path()
+        try:
+            fp = self._fingerprint(path)
+        except OSError:
+            return False
+        if fp == model.fingerprint or fp == self._failed:
+            self._seen = None
+            return False
+        if fp != self._seen:
+            self._seen = fp
+            return False
+        self._seen = None
+        try:
+            self.reload(path)
+        except Exception:
+            self._failed = fp
+            raise
+        self._failed = None
+        return True
+
+    def start_watcher(self, interval: float) -> None:
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._spawn_watcher(interval)
+
+    def _spawn_watcher(self, interval: float) -> None:
+        def run() -> None:
+            try:
+                while not self._stop.wait(interval):
+                    try:
+                        self.reload_if_changed()
+                    except Exception as e:  # keep serving the current model
+                        print(f"[models] reload of {self._model_path()} failed, "
+                              f"skipped until the file changes: {e}")
+            finally:
+                if not self._stop.is_set():  # only stop_watcher may end it
+                    print("[models] ERROR: model watcher exited unexpectedly; restarting it")
+                    self._spawn_watcher(interval)
+
+        self._watcher = threading.Thread(target=run, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def close(self) -> None:
+        self.stop_watcher()
+        self.reset()
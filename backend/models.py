@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import os
 from datetime import datetime
 from enum import Enum
 from typing import Dict, List, Optional
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, validator
+
+from settings import THUMBNAIL_FORMAT
 
 
 DISEASE_KEY_ALIASES: Dict[str, str] = {
@@ -13,6 +16,17 @@ DISEASE_KEY_ALIASES: Dict[str, str] = {
 }
 
 
+def variant_ext() -> str:
+    """Extension of thumbnail/preview files (THUMBNAIL_FORMAT); rendering lives in image_variants.py."""
+    return "jpg" if THUMBNAIL_FORMAT in ("jpg", "jpeg") else "webp"
+
+
+def variant_path(image_path: str, variant: str) -> str:
+    """Path (or URL path) of `variant` for an original image path."""
+    stem, _ = os.path.splitext(image_path)
+    return f"{stem}.{variant}.{variant_ext()}"
+
+
 class DiseaseKey(str, Enum):
     """Canonical disease keys shared between API, seed data, and ML output."""
 
@@ -39,6 +53,16 @@ class DiseaseKey(str, Enum):
                 return cls(alias)
             raise
 
+    @classmethod
+    def stored_values(cls, key: "DiseaseKey") -> List[str]:
+        """All raw `label` values in Mongo that parse to `key` (canonical + legacy aliases)."""
+        return [key.value] + [old for old, new in DISEASE_KEY_ALIASES.items() if new == key.value]
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
 
 class RegisterIn(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
@@ -77,6 +101,15 @@ class ScanItem(BaseModel):
     notes: Optional[str] = None
     imageUrl: str
     createdAt: datetime
+    # Downscaled copies of imageUrl for lists (see image_variants.py)
+    thumbnailUrl: Optional[str] = None
+    previewUrl: Optional[str] = None
+
+    @validator("thumbnailUrl", "previewUrl", always=True)
+    def _variant_url(cls, v: Optional[str], values: Dict[str, object], field) -> Optional[str]:
+        if v is None and values.get("imageUrl"):
+            return variant_path(str(values["imageUrl"]), "thumb" if field.name == "thumbnailUrl" else "preview")
+        return v
 
     @classmethod
     def from_dict(cls, data: Dict[str, object]) -> "ScanItem":
@@ -94,6 +127,41 @@ class ScanItem(BaseModel):
 
 class ScanListOut(BaseModel):
     items: List[ScanItem] = Field(default_factory=list)
+    nextCursor: Optional[str] = None  # pass back as ?cursor= for the next page
+
+
+class SimilarScan(ScanItem):
+    similarity: float  # cosine similarity of the model embeddings, 1.0 = same features
+
+
+class SimilarScansOut(BaseModel):
+    items: List[SimilarScan] = Field(default_factory=list)  # most similar first
+
+
+class ScanBatchResult(BaseModel):
+    filename: Optional[str] = None
+    status: int  # HTTP-style status for this file: 200, or the 4xx/5xx it failed with
+    item: Optional[ScanItem] = None
+    error: Optional[str] = None
+
+
+class ScanBatchOut(BaseModel):
+    items: List[ScanBatchResult] = Field(default_factory=list)  # same order as the uploaded files
+    succeeded: int = 0
+    failed: int = 0
+
+
+class ScanStatsBucket(BaseModel):
+    total: int = 0
+    byLabel: Dict[str, int] = Field(default_factory=dict)
+
+
+class ScanStatsOut(BaseModel):
+    total: int = 0
+    byLabel: Dict[str, int] = Field(default_factory=dict)
+    byMonth: Dict[str, ScanStatsBucket] = Field(default_factory=dict)  # "YYYY-MM" (UTC), newest first
+    byDay: Dict[str, ScanStatsBucket] = Field(default_factory=dict)    # "YYYY-MM-DD" (UTC), newest first
+    updatedAt: Optional[datetime] = None
 
 
 class RecommendationOut(BaseModel):
@@ -0,0 +1,51 @@
+# backend/pagination.py
+# Opaque keyset cursors for (createdAt, _id)-ordered listings.
+
+from __future__ import annotations
+
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def as_utc_naive(dt: datetime) -> datetime:
+    """Mongo stores UTC without tzinfo; normalize query bounds the same way."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def encode_cursor(created_at: datetime, oid: ObjectId) -> str:
+    """Pack the sort key of the last returned item into a URL-safe token."""
+    ms = (as_utc_naive(created_at) - _EPOCH) // timedelta(milliseconds=1)
+    raw = f"{ms}:{oid}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, ObjectId]:
+    """Inverse of encode_cursor. Raises ValueError for anything malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        ms, oid = base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii").split(":", 1)
+        return _EPOCH + timedelta(milliseconds=int(ms)), ObjectId(oid)
+    except (binascii.Error, UnicodeError, ValueError, InvalidId) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def after_cursor(token: Optional[str]) -> Dict[str, Any]:
+    """Mongo filter matching items strictly after `token` in (createdAt, _id) DESC order."""
+    if not token:
+        return {}
+    created_at, oid = decode_cursor(token)
+    return {
+        "$or": [
+            {"createdAt": {"$lt": created_at}},
+            {"createdAt": created_at, "_id": {"$lt": oid}},
+        ]
+    }
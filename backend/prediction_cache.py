@@ -0,0 +1,124 @@
+# backend/prediction_cache.py
+# Two-tier cache of model predictions keyed by upload content hash.
+#
+# Tier 1 is a bounded in-process LRU; tier 2 is the Mongo `prediction_cache`
+# collection so hits survive restarts and are shared across workers. Entries
+# are keyed by (sha256, model version) so a retrained model never serves a
+# stale label.
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from db import get_db
+from settings import PREDICTION_CACHE_ENABLED, PREDICTION_CACHE_SIZE
+
+# (label, confidence, inference_ms)
+_Entry = Tuple[str, float, float]
+
+
+def _cache_id(digest: str, model_version: str) -> str:
+    return f"{digest}:{model_version}"
+
+
+class PredictionCache:
+    def __init__(self, max_entries: int = PREDICTION_CACHE_SIZE, persistent: bool = True) -> None:
+        self.max_entries = max(0, max_entries)
+        self.persistent = persistent
+        self._lru: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.saved_inference_ms = 0.0
+
+    # ---------------- lookups ---------------- #
+    def get(self, digest: str, model_version: str) -> Optional[Tuple[str, float]]:
+        """Return (label, confidence) for a previously scored upload, or None."""
+        key = _cache_id(digest, model_version)
+        with self._lock:
+            self.lookups += 1
+            entry = self._lru.get(key)
+            if entry is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_inference_ms += entry[2]
+                return entry[0], entry[1]
+
+        if not self.persistent:
+            return None
+        doc = get_db().prediction_cache.find_one(
+            {"_id": key}, {"label": 1, "confidence": 1, "inferenceMs": 1}
+        )
+        if not doc:
+            return None
+
+        entry = (str(doc["label"]), float(doc["confidence"]), float(doc.get("inferenceMs") or 0.0))
+        with self._lock:
+            self.mongo_hits += 1
+            self.saved_inference_ms += entry[2]
+            self._remember(key, entry)
+        return entry[0], entry[1]
+
+    def put(
+        self,
+        digest: str,
+        model_version: str,
+        label: str,
+        confidence: float,
+        inference_ms: float,
+    ) -> None:
+        key = _cache_id(digest, model_version)
+        entry = (label, float(confidence), float(inference_ms))
+        with self._lock:
+            self._remember(key, entry)
+        if not self.persistent:
+            return
+        get_db().prediction_cache.update_one(
+            {"_id": key},
+            {
+                "$set": {
+                    "sha256": digest,
+                    "modelVersion": model_version,
+                    "label": label,
+                    "confidence": float(confidence),
+                    "inferenceMs": float(inference_ms),
+                    "updatedAt": datetime.now(timezone.utc),
+                }
+            },
+            upsert=True,
+        )
+
+    def _remember(self, key: str, entry: _Entry) -> None:
+        if self.max_entries == 0:
+            return
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    # ---------------- reporting ---------------- #
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.memory_hits + self.mongo_hits
+            return {
+                "lookups": self.lookups,
+                "memoryHits": self.memory_hits,
+                "mongoHits": self.mongo_hits,
+                "misses": self.lookups - hits,
+                "hitRate": round(hits / self.lookups, 4) if self.lookups else 0.0,
+                "savedInferenceMs": round(self.saved_inference_ms, 1),
+                "entries": len(self._lru),
+            }
+
+
+@lru_cache(maxsize=1)
+def get_prediction_cache() -> Optional[PredictionCache]:
+    """Process-wide cache, or None when PREDICTION_CACHE_ENABLED is off."""
+    if not PREDICTION_CACHE_ENABLED:
+        return None
+    return PredictionCache()
@@ -0,0 +1,140 @@
+# backend/recommendations.py
+# In-process cache of recommendation documents.
+#
+# The collection only changes when seed.py (or an admin) upserts a new
+# version, so every document is held in memory together with its
+# pre-rendered JSON body and ETag. Freshness is kept by:
+#   - a TTL, after which a cheap {diseaseKey, version, updatedAt} projection
+#     is compared against what we hold (full reload only if it changed), and
+#   - optionally, a Mongo change stream that invalidates immediately.
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from db import get_db
+from models import DiseaseKey, RecommendationOut
+from settings import RECO_CACHE_TTL_SECONDS, RECO_CHANGE_STREAM
+
+_FINGERPRINT_FIELDS = {"_id": 0, "diseaseKey": 1, "version": 1, "updatedAt": 1}
+
+
+class CachedRecommendation(NamedTuple):
+    item: RecommendationOut
+    body: bytes   # JSON response body
+    etag: str     # strong ETag (quoted)
+
+
+def _fingerprint(docs: Iterable[dict]) -> str:
+    parts = sorted(f"{d.get('diseaseKey')}|{d.get('version')}|{d.get('updatedAt')}" for d in docs)
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+class RecommendationCache:
+    def __init__(self, ttl_seconds: float = RECO_CACHE_TTL_SECONDS) -> None:
+        self.ttl = ttl_seconds
+        self._items: Dict[DiseaseKey, CachedRecommendation] = {}
+        self._fingerprint: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ---------------- loading ---------------- #
+    def load(self) -> None:
+        """(Re)load every recommendation document from Mongo."""
+        docs = list(get_db().recommendations.find({}))
+        items: Dict[DiseaseKey, CachedRecommendation] = {}
+        for doc in docs:
+            try:
+                key = DiseaseKey.parse(doc["diseaseKey"])
+                item = RecommendationOut(
+                    diseaseKey=key,
+                    title=doc["title"],
+                    steps=doc["steps"],
+                    version=doc["version"],
+                    updatedAt=doc["updatedAt"],
+                )
+            except Exception as e:  # skip malformed/legacy rows instead of failing startup
+                print(f"[reco] skipping {doc.get('diseaseKey')!r}: {e}")
+                continue
+            body = item.json().encode("utf-8")
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            items[key] = CachedRecommendation(item, body, etag)
+
+        with self._lock:
+            self._items = items
+            self._fingerprint = _fingerprint(docs)
+            self._checked_at = time.monotonic()
+        print(f"[reco] cached {len(items)} recommendations")
+
+    def invalidate(self) -> None:
+        """Force the next lookup to revalidate against Mongo."""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def _revalidate(self) -> None:
+        docs = get_db().recommendations.find({}, _FINGERPRINT_FIELDS)
+        if _fingerprint(docs) != self._fingerprint:
+            self.load()
+        else:
+            with self._lock:
+                self._checked_at = time.monotonic()
+
+    # ---------------- lookups ---------------- #
+    def get(self, key: DiseaseKey) -> Optional[CachedRecommendation]:
+        if self._fingerprint is None:
+            self.load()
+        elif time.monotonic() - self._checked_at > self.ttl:
+            self._revalidate()
+        return self._items.get(key)
+
+    # ---------------- change stream ---------------- #
+    def start_watcher(self) -> None:
+        """Invalidate on every change to the collection (replica sets only)."""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="reco-watch", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        self._watcher = None
+
+    def _watch(self) -> None:
+        try:
+            with get_db().recommendations.watch(max_await_time_ms=1000) as stream:
+                while not self._stop.is_set():
+                    if stream.try_next() is not None:
+                        self.invalidate()
+        except Exception as e:  # standalone servers / mongomock have no change streams
+            print(f"[reco] change stream unavailable, relying on TTL: {e}")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 7232 weak comparison of an If-None-Match header against our ETag."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+@lru_cache(maxsize=1)
+def get_recommendation_cache() -> RecommendationCache:
+    return RecommendationCache()
+
+
+def start_recommendation_cache() -> None:
+    """Warm the cache at startup and attach the change stream if enabled."""
+    cache = get_recommendation_cache()
+    cache.load()
+    if RECO_CHANGE_STREAM:
+        cache.start_watcher()
@@ -0,0 +1,296 @@
+# backend/rescore.py
+# Re-score stored scans with the current model.
+#
+# After a model rollout, history and statistics still carry the old
+# model's labels. This job walks the scans collection in _id order and
+# brings every scan not yet scored by the current version up to date:
+#   - a pool of decoder threads reads and preprocesses the images of the
+#     next batches while the current batch is in model.predict (Pillow
+#     and NumPy release the GIL for the heavy parts);
+#   - each batch of RESCORE_BATCH_SIZE images is one predict call;
+#   - results go back as unordered bulk_write chunks of UpdateOne, each
+#     guarded by the scan's previous modelVersion. Label changes are then
+#     applied to the scan_stats counters, only for updates that matched:
+#     a scan deleted or re-scored by someone else meanwhile is left alone;
+#   - after every chunk the last _id is saved in rescore_state, so an
+#     interrupted run resumes where it stopped (--restart ignores it);
+#   - RESCORE_MAX_RATE caps images/sec, and a slow bulk_write pauses the
+#     job for as long as the write took, to leave room on the primary.
+# Images that are missing or cannot be decoded keep their old result and
+# are counted as failed. Their ids are kept in rescore_state (up to
+# _MAX_FAILED) and tried again by the next run.
+#
+#   python rescore.py [--user ID] [--dry-run] [--restart] [--max-rate N]
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from db import get_db
+from ml_service import _preprocess, get_registry, predict_tensors
+from models import DiseaseKey
+from scan_stats import stats_updates
+from settings import (
+    RESCORE_BATCH_SIZE,
+    RESCORE_MAX_RATE,
+    RESCORE_SLOW_WRITE_MS,
+    RESCORE_WORKERS,
+    RESCORE_WRITE_CHUNK,
+)
+
+_PROJECTION = {"userId": 1, "label": 1, "modelVersion": 1, "imageUrl": 1, "createdAt": 1}
+_MAX_FAILED = 50000  # failed ids remembered for retry; --restart picks up the rest
+
+
+class RescoreReport(NamedTuple):
+    scanned: int     # scans read this run
+    updated: int     # scans written with the new model's result
+    changed: int     # of those, scans whose label changed
+    failed: int      # images missing or undecodable (left untouched, retried next run)
+    seconds: float
+
+    @property
+    def images_per_second(self) -> float:
+        return (self.scanned - self.failed) / self.seconds if self.seconds else 0.0
+
+
+def _chunks(docs: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch: List[Dict[str, Any]] = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _label(raw: Any) -> Optional[str]:
+    try:
+        return DiseaseKey.parse(str(raw)).value
+    except ValueError:
+        return None
+
+
+class _Written(NamedTuple):
+    scan_id: ObjectId
+    user_id: ObjectId
+    rescored_at: datetime
+    version: str
+    stats: Optional[Dict[str, int]]  # scan_stats delta when the label changed
+
+
+class Rescorer:
+    def __init__(
+        self,
+        batch_size: int = RESCORE_BATCH_SIZE,
+        workers: int = RESCORE_WORKERS,
+        write_chunk: int = RESCORE_WRITE_CHUNK,
+        max_rate: float = RESCORE_MAX_RATE,
+        slow_write_ms: float = RESCORE_SLOW_WRITE_MS,
+        prefetch: int = 2,
+        dry_run: bool = False,
+        log_every: float = 10.0,
+    ) -> None:
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.write_chunk = max(1, write_chunk)
+        self.max_rate = max_rate
+        self.slow_write = slow_write_ms / 1000.0
+        self.prefetch = max(1, prefetch)  # batches decoding ahead of the one being scored
+        self.dry_run = dry_run
+        self.log_every = log_every
+
+    def run(self, user_id: Optional[ObjectId] = None, restart: bool = False) -> RescoreReport:
+        db = get_db()
+        version = get_registry().active().version
+        state_id = f"{version}:{user_id}" if user_id else version
+        state = {} if restart else db.rescore_state.find_one({"_id": state_id}) or {}
+
+        self._failed: Set[ObjectId] = set(state.get("failedIds", []))
+        query: Dict[str, Any] = {"modelVersion": {"$ne": version}}
+        if user_id:
+            query["userId"] = user_id
+        if state.get("lastId") and self._failed:
+            query["$or"] = [{"_id": {"$gt": state["lastId"]}}, {"_id": {"$in": sorted(self._failed)}}]
+        elif state.get("lastId"):
+            query["_id"] = {"$gt": state["lastId"]}
+        cursor = db.scans.find(query, _PROJECTION).sort("_id", 1).batch_size(self.batch_size * (self.prefetch + 1))
+
+        self._ops: List[UpdateOne] = []
+        self._written: List[_Written] = []
+        self._counts = {"scanned": 0, "updated": 0, "changed": 0, "failed": 0}
+        self._last_id: Optional[ObjectId] = state.get("lastId")
+        self._started = self._logged = time.perf_counter()
+        print(f"[rescore] scoring with {version}" + (" (dry run)" if self.dry_run else ""))
+
+        pending: Deque[Tuple[List[Dict[str, Any]], List[Future]]] = deque()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rescore-decode") as pool:
+            for docs in _chunks(cursor, self.batch_size):
+                pending.append((docs, [pool.submit(_preprocess, d.get("imageUrl") or "") for d in docs]))
+                if len(pending) > self.prefetch:
+                    self._score(*pending.popleft())
+                    self._flush(db, state_id, full=False)
+            while pending:
+                self._score(*pending.popleft())
+            self._flush(db, state_id, full=True)
+
+        if not self.dry_run:
+            db.rescore_state.update_one(
+                {"_id": state_id}, {"$set": {"complete": True, "updatedAt": datetime.now(timezone.utc)}}, upsert=True
+            )
+        report = RescoreReport(**self._counts, seconds=time.perf_counter() - self._started)
+        print(f"[rescore] done: {report._asdict()} ({report.images_per_second:.1f} images/s)")
+        return report
+
+    # ---------------- scoring ---------------- #
+    def _score(self, docs: List[Dict[str, Any]], futures: List[Future]) -> None:
+        tensors, decoded = [], []
+        for doc, fut in zip(docs, futures):
+            try:
+                tensors.append(fut.result())
+                decoded.append(doc)
+                self._failed.discard(doc["_id"])
+            except Exception as e:
+                self._counts["failed"] += 1
+                self._failed.add(doc["_id"])
+                print(f"[rescore] skipping {doc['_id']} ({doc.get('imageUrl')}): {e}")
+        self._counts["scanned"] += len(docs)
+        # retried failures sort before the checkpoint; never move it back
+        self._last_id = max(self._last_id, docs[-1]["_id"]) if self._last_id else docs[-1]["_id"]
+        if not decoded:
+            return
+
+        results, version = predict_tensors(np.concatenate(tensors))
+        now = datetime.now(timezone.utc)
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)  # BSON dates are milliseconds
+        for doc, (raw_label, confidence, _, embedding) in zip(decoded, results):
+            label = DiseaseKey.parse(raw_label).value
+            fields = {"label": label, "confidence": float(confidence), "modelVersion": version, "rescoredAt": now}
+            update: Dict[str, Any] = {"$set": fields}
+            if embedding is not None:
+                fields["embedding"] = embedding
+            else:  # an old embedding lives in the old model's feature space
+                update["$unset"] = {"embedding": ""}
+            self._ops.append(UpdateOne({"_id": doc["_id"], "modelVersion": doc.get("modelVersion")}, update))
+            stats: Optional[Dict[str, int]] = None
+            if _label(doc.get("label")) != label and "createdAt" in doc:
+                stats = defaultdict(int)
+                for sign, scan in ((-1, doc), (1, {**doc, "label": label})):
+                    for path, n in stats_updates([scan], sign)[doc["userId"]].items():
+                        stats[path] += n
+            self._written.append(_Written(doc["_id"], doc["userId"], now, version, stats))
+        self._throttle()
+
+    def _throttle(self) -> None:
+        now = time.perf_counter()
+        elapsed = now - self._started
+        if self.max_rate > 0:
+            ahead = self._counts["scanned"] / self.max_rate - elapsed
+            if ahead > 0:
+                time.sleep(ahead)
+        if self.log_every and now - self._logged >= self.log_every:
+            self._logged = now
+            done = self._counts["scanned"] - self._counts["failed"]
+            print(f"[rescore] {self._counts} {done / elapsed:.1f} images/s")
+
+    # ---------------- writing ---------------- #
+    def _flush(self, db: Any, state_id: str, full: bool) -> None:
+        """Write pending updates once a chunk is full (or at the end) and save the checkpoint."""
+        if not full and len(self._ops) < self.write_chunk:
+            return
+        written, self._ops, ops = self._written, [], self._ops
+        self._written = []
+        if self.dry_run:
+            self._counts["updated"] += len(written)
+            self._counts["changed"] += sum(1 for w in written if w.stats)
+            return
+        started = time.perf_counter()
+        matched: Set[ObjectId] = set()
+        if ops:
+            result = db.scans.bulk_write(ops, ordered=False)
+            matched = self._matched(db, written, result.matched_count)
+        stats: Dict[ObjectId, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for w in written:
+            if w.scan_id not in matched:
+                continue
+            self._counts["updated"] += 1
+            if w.stats:
+                self._counts["changed"] += 1
+                for path, n in w.stats.items():
+                    stats[w.user_id][path] += n
+        now = datetime.now(timezone.utc)
+        stats_ops = []
+        for user, inc in stats.items():
+            inc = {path: n for path, n in inc.items() if n}  # e.g. a -> b and b -> a in the same day
+            if inc:
+                stats_ops.append(UpdateOne({"_id": user}, {"$inc": inc, "$set": {"updatedAt": now}}, upsert=True))
+        if stats_ops:
+            db.scan_stats.bulk_write(stats_ops, ordered=False)
+        if self._last_id is not None:
+            if len(self._failed) > _MAX_FAILED:
+                print(f"[rescore] {len(self._failed)} failed scans, remembering {_MAX_FAILED} for retry")
+            db.rescore_state.update_one(
+                {"_id": state_id},
+                {"$set": {
+                    "lastId": self._last_id,
+                    "failedIds": sorted(self._failed)[:_MAX_FAILED],
+                    "complete": False,
+                    "updatedAt": now,
+                }},
+                upsert=True,
+            )
+        took = time.perf_counter() - started
+        if took > self.slow_write:
+            time.sleep(took)  # back off while the primary is busy
+
+
+    def _matched(self, db: Any, written: List[_Written], matched_count: int) -> Set[ObjectId]:
+        """Ids whose guarded update applied: all of them, unless some scans changed under us."""
+        if matched_count == len(written):
+            return {w.scan_id for w in written}
+        by_batch: Dict[Tuple[datetime, str], List[ObjectId]] = defaultdict(list)
+        for w in written:
+            by_batch[(w.rescored_at, w.version)].append(w.scan_id)
+        matched: Set[ObjectId] = set()
+        for (rescored_at, version), ids in by_batch.items():
+            query = {"_id": {"$in": ids}, "modelVersion": version, "rescoredAt": rescored_at}
+            matched.update(d["_id"] for d in db.scans.find(query, {"_id": 1}))
+        print(f"[rescore] {len(written) - len(matched)} scans changed during the run, left as they are")
+        return matched
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Re-score stored scans with the current model.")
+    parser.add_argument("--user", help="only this userId")
+    parser.add_argument("--batch-size", type=int, default=RESCORE_BATCH_SIZE, help="images per model call")
+    parser.add_argument("--workers", type=int, default=RESCORE_WORKERS, help="decoder threads")
+    parser.add_argument("--write-chunk", type=int, default=RESCORE_WRITE_CHUNK, help="updates per bulk_write")
+    parser.add_argument("--max-rate", type=float, default=RESCORE_MAX_RATE, help="images/sec ceiling (0 = none)")
+    parser.add_argument("--dry-run", action="store_true", help="score but write nothing")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint")
+    args = parser.parse_args(argv)
+
+    rescorer = Rescorer(
+        batch_size=args.batch_size,
+        workers=args.workers,
+        write_chunk=args.write_chunk,
+        max_rate=args.max_rate,
+        dry_run=args.dry_run,
+    )
+    rescorer.run(ObjectId(args.user) if args.user else None, restart=args.restart)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
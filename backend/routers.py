@@ -1,23 +1,51 @@
 # backend/routers.py
 from __future__ import annotations
 
+import asyncio
+import random
+import time
 from datetime import datetime, timezone
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Query, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel
 from pymongo import DESCENDING
 
-from db import as_object_id, get_db
-from ml_service import predict_image                   # ← keep if your ML service is present
-from security import create_access_token, decode_token, hash_password, verify_password
-from storage import ensure_upload_dir, save_upload
+from async_db import AsyncDatabase, get_async_db
+from db import as_object_id
+from ml_service import (  # ← keep if your ML service is present
+    MODEL_SHADOW_PATH, MODEL_SHADOW_RATE,
+    get_model_version, predict_batch_bytes, predict_shadow_bytes,
+)
+from inference_pool import InferenceUnavailable, run_inference, score_upload
+from metrics import (
+    PREDICTIONS_TOTAL, SCAN_SECONDS, SCAN_STAGE_SECONDS, SCANS_IN_FLIGHT, SHADOW_PREDICTIONS_TOTAL, UNCERTAIN_TOTAL,
+)
+from prediction_cache import get_prediction_cache
+from pagination import after_cursor, as_utc_naive, encode_cursor
+from recommendations import etag_matches, get_recommendation_cache
+from settings import (
+    EXPORT_BATCH_SIZE, PASSWORD_HASH_RETRY_AFTER, RECO_CLIENT_MAX_AGE,
+    SCAN_BATCH_MAX_FILES, SCAN_BATCH_READ_CONCURRENCY,
+)
+from security import HashingBusy, create_access_token, decode_token, get_password_hasher, token_cache
+from storage import UploadBytes, ensure_upload_dir, read_upload, save_upload_bytes
+from upload_gc import queue_removal
+from image_variants import schedule_variants
+from fast_json import scan_list_body
+from scan_export import MEDIA_TYPES as EXPORT_MEDIA_TYPES, export_chunks
+from idempotency import check_key, fingerprint, get_idempotency_store
+from similarity import forget as forget_embeddings, get_similarity_index
+import scan_stats
 from models import (
     RegisterIn, RegisterOut,
     LoginIn, LoginOut, LoginUser,
-    ScanItem, ScanListOut,
-    RecommendationOut, DiseaseKey,
+    ScanItem, ScanListOut, ScanBatchOut, ScanBatchResult, ScanStatsOut,
+    RecommendationOut, DiseaseKey, ExportFormat, SimilarScan, SimilarScansOut,
 )
 
 router = APIRouter()
@@ -29,6 +57,9 @@ class JWTClaims(BaseModel):
     email: Optional[str] = None
     name: Optional[str] = None
 
+    class Config:
+        allow_mutation = False  # one instance is shared by every request with the same token
+
 class BulkDeleteIn(BaseModel):
     ids: List[str]
 
@@ -40,37 +71,71 @@ class BulkDeleteOut(BaseModel):
     deletedCount: int
 
 # ----------------------- auth helper ----------------------- #
-def require_user(creds: Optional[HTTPAuthorizationCredentials]) -> JWTClaims:
-    if not creds:
-        raise HTTPException(status_code=401, detail="Missing Authorization header")
+def claims_from_token(token: str) -> JWTClaims:
+    """Verify a bearer token and return its claims (both cached per token until exp)."""
+    claims = token_cache.get_claims(token)
+    if claims is not None:
+        return claims
     try:
-        payload = decode_token(creds.credentials)
-        return JWTClaims(**payload)
+        claims = JWTClaims(**decode_token(token))
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+    token_cache.put_claims(token, claims)
+    return claims
+
+
+async def require_user(creds: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> JWTClaims:
+    """
+    Shared auth dependency. Declared async so FastAPI runs it inline instead
+    of hopping to the threadpool; a cache hit is a dict lookup.
+    """
+    if not creds:
+        raise HTTPException(status_code=401, detail="Missing Authorization header")
+    return claims_from_token(creds.credentials)
 
 # ============================ AUTH ========================= #
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry shortly",
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+    )
+
 @router.post("/auth/register", response_model=RegisterOut, tags=["auth"])
-def register(body: RegisterIn) -> RegisterOut:
-    db: Any = get_db()
-    if db.users.find_one({"email": body.email}):
+async def register(body: RegisterIn) -> RegisterOut:
+    # bcrypt runs on the bounded hashing pool; Mongo calls are awaited.
+    adb = get_async_db()
+    if await adb.users.find_one({"email": body.email}):
         raise HTTPException(status_code=409, detail="Email already registered")
 
+    try:
+        password_hash = await get_password_hasher().hash(body.password)
+    except HashingBusy:
+        raise _hashing_busy()
+
     doc = {
         "name": body.name,
         "email": body.email,
-        "passwordHash": hash_password(body.password),
+        "passwordHash": password_hash,
         "createdAt": datetime.now(timezone.utc),
     }
-    res = db.users.insert_one(doc)
+    res = await adb.users.insert_one(doc)
     return RegisterOut(id=str(res.inserted_id), name=body.name, email=body.email)
 
 @router.post("/auth/login", response_model=LoginOut, tags=["auth"])
-def login(body: LoginIn) -> LoginOut:
-    db: Any = get_db()
-    user = db.users.find_one({"email": body.email})
-    if not user or not verify_password(body.password, user["passwordHash"]):
+async def login(body: LoginIn) -> LoginOut:
+    adb = get_async_db()
+    user = await adb.users.find_one({"email": body.email})
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    try:
+        ok, new_hash = await get_password_hasher().verify_and_update(body.password, user["passwordHash"])
+    except HashingBusy:
+        raise _hashing_busy()
+    if not ok:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:  # stored cost is off the calibrated target
+        await adb.users.update_one({"_id": user["_id"]}, {"$set": {"passwordHash": new_hash}})
 
     token, expires_at = create_access_token(
         subject=str(user["_id"]),
@@ -84,111 +149,513 @@ def login(body: LoginIn) -> LoginOut:
 
 # ============================ SCANS ======================== #
 @router.post("/scans", response_model=ScanItem, tags=["scans"])
-def create_scan(
+async def create_scan(
+    response: Response,
     file: UploadFile = File(...),
     notes: Optional[str] = Form(None),
     modelVersion: str = Form("1.0"),
-    creds: HTTPAuthorizationCredentials = Depends(bearer),
+    idempotency_key: Optional[str] = Header(None),
+    claims: JWTClaims = Depends(require_user),
 ) -> ScanItem:
-    claims = require_user(creds)
+    """
+    Classify one photo and save it to the user's history. Send an
+    `Idempotency-Key` header to make retries safe: repeating the request
+    with the same key returns the first result (`Idempotent-Replayed: true`)
+    instead of creating another scan. The `modelVersion` form field is
+    deprecated and ignored: scans record the model that scored them.
+    """
+    # async route: blocking I/O goes to the threadpool, decode + predict go to
+    # the dedicated inference executor, so this handler only awaits.
     user_id = claims.sub
+    key = check_key(idempotency_key) if idempotency_key is not None else None
 
-    db: Any = get_db()
+    adb = get_async_db()
     ensure_upload_dir()
 
-    # Save image
-    image_path = save_upload(file)
+    SCANS_IN_FLIGHT.inc()
+    try:
+        with SCAN_SECONDS.time():
+            with SCAN_STAGE_SECONDS.time(stage="read"):
+                upload = await run_in_threadpool(read_upload, file)
+            if key is None:
+                return await _create_scan(adb, user_id, upload, notes)
+            item, replayed = await get_idempotency_store().run(
+                user_id, key, fingerprint(upload.sha256, notes),
+                lambda: _create_scan(adb, user_id, upload, notes),
+            )
+            if replayed:
+                response.headers["Idempotent-Replayed"] = "true"
+            return ScanItem(**item)
+    finally:
+        SCANS_IN_FLIGHT.dec()
+
 
-    # ML inference
+async def _save_timed(upload):
+    with SCAN_STAGE_SECONDS.time(stage="write"):
+        return await run_in_threadpool(save_upload_bytes, upload)
+
+
+# Strong references to fire-and-forget shadow scoring tasks until they finish.
+_shadow_tasks: set = set()
+
+
+async def _shadow_score(data: bytes, label: str) -> None:
+    """Score `data` on the candidate model and count whether it agrees with the served label."""
     try:
-        label_str, confidence = predict_image(image_path)
+        shadow = await run_inference(predict_shadow_bytes, data)
+    except Exception as e:
+        print(f"[shadow] scoring failed: {e}")
+        SHADOW_PREDICTIONS_TOTAL.inc(agreement="error")
+        return
+    if shadow is not None:
+        agrees = DiseaseKey.parse(str(shadow["label"])).value == label
+        SHADOW_PREDICTIONS_TOTAL.inc(agreement="agree" if agrees else "disagree")
+
+
+def _maybe_shadow(data: bytes, label: str) -> None:
+    if MODEL_SHADOW_PATH and random.random() < MODEL_SHADOW_RATE:
+        task = asyncio.ensure_future(_shadow_score(data, label))
+        _shadow_tasks.add(task)
+        task.add_done_callback(_shadow_tasks.discard)
+
+
+async def _known_embedding(adb: AsyncDatabase, image_path: str, model_version: str) -> Optional[bytes]:
+    """For a cache hit: the embedding of an earlier scan of the same (deduplicated) file."""
+    doc = await adb.scans.find_one(
+        {"imageUrl": image_path, "modelVersion": model_version, "embedding": {"$exists": True}},
+        {"embedding": 1},
+    )
+    return doc["embedding"] if doc else None
+
+
+def _index_embeddings(docs: List[Dict[str, Any]]) -> None:
+    """Make freshly inserted scans findable by GET /scans/{id}/similar in this process right away."""
+    for d in docs:
+        if d.get("embedding"):
+            get_similarity_index(d["modelVersion"]).add(d["_id"], d["userId"], d["embedding"])
+
+
+async def _create_scan(adb: AsyncDatabase, user_id: str, upload: UploadBytes, notes: Optional[str]) -> ScanItem:
+    # Inference decodes the upload in memory while the disk write
+    # (deduplicated by content hash) runs alongside it.
+    save_task = asyncio.ensure_future(_save_timed(upload))
+
+    # ML inference, skipped when these exact bytes were scored by this model
+    try:
+        cache = get_prediction_cache()
+        model_key = get_model_version()
+        with SCAN_STAGE_SECONDS.time(stage="cache"):
+            cached = await run_in_threadpool(cache.get, upload.sha256, model_key) if cache else None
+        embedding = None
+        if cached:
+            label_str, confidence = cached
+            model_version = model_key
+            source = "cache"
+        else:
+            started = time.perf_counter()
+            label_str, confidence, info = await score_upload(upload.data)
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            # may differ from model_key if a new model was swapped in meanwhile
+            model_version = str(info["modelVersion"])
+            embedding = info.get("embedding")
+            source = "model"
+            SCAN_STAGE_SECONDS.observe(info["decodeSeconds"], stage="decode")
+            SCAN_STAGE_SECONDS.observe(info["predictSeconds"], stage="predict")
+            if info["uncertainReason"]:
+                UNCERTAIN_TOTAL.inc(reason=info["uncertainReason"])
+            if cache:
+                await run_in_threadpool(
+                    cache.put, upload.sha256, model_version, label_str, confidence, elapsed_ms
+                )
         label = DiseaseKey.parse(label_str)
     except Exception as e:
         import traceback; traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Model inference error: {e}")
+        stored, = await asyncio.gather(save_task, return_exceptions=True)
+        if not isinstance(stored, BaseException):
+            await run_in_threadpool(queue_removal, stored.path)
+        code = 503 if isinstance(e, InferenceUnavailable) else 500
+        raise HTTPException(status_code=code, detail=f"Model inference error: {e}")
+    PREDICTIONS_TOTAL.inc(label=label.value, source=source)
+    _maybe_shadow(upload.data, label.value)
+
+    stored = await save_task
+    image_path = stored.path
+    schedule_variants(image_path)  # thumbnail + preview, off the request path
+    if source == "cache":
+        embedding = await _known_embedding(adb, image_path, model_version)
 
     # Persist
     doc = {
         "userId": as_object_id(user_id),
         "label": label.value,
         "confidence": float(confidence),
-        "modelVersion": modelVersion,
+        "modelVersion": model_version,
         "notes": notes,
         "imageUrl": image_path,
         "createdAt": datetime.now(timezone.utc),
     }
-    res = db.scans.insert_one(doc)
+    if embedding is not None:
+        doc["embedding"] = embedding  # float16 penultimate features, see similarity.py
+    with SCAN_STAGE_SECONDS.time(stage="insert"):
+        res = await adb.scans.insert_one(doc)
+    doc["_id"] = res.inserted_id
+    await scan_stats.record(adb, [doc])
+    _index_embeddings([doc])
 
     return ScanItem(
         id=str(res.inserted_id),
         label=label,
         confidence=float(confidence),
-        modelVersion=modelVersion,
+        modelVersion=model_version,
         notes=notes,
         imageUrl=image_path,
         createdAt=doc["createdAt"],
     )
 
+# ====================== CREATE SCAN BATCH ================== #
+def _file_error(e: BaseException) -> Tuple[int, str]:
+    if isinstance(e, HTTPException):
+        return e.status_code, str(e.detail)
+    return 500, str(e)
+
+
+@router.post("/scans/batch", response_model=ScanBatchOut, tags=["scans"])
+async def create_scan_batch(
+    files: List[UploadFile] = File(...),
+    notes: Optional[str] = Form(None),
+    modelVersion: str = Form("1.0"),
+    claims: JWTClaims = Depends(require_user),
+) -> ScanBatchOut:
+    """
+    Scan many photos in one request: uploads are read a few at a time
+    (SCAN_BATCH_READ_CONCURRENCY) and stored in parallel, cache misses
+    go through model.predict as one batch and the
+    scans are written with a single insert_many. A bad file fails on its
+    own; the others are still saved. As for POST /scans, `modelVersion`
+    is ignored.
+    """
+    if len(files) > SCAN_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {SCAN_BATCH_MAX_FILES} files per batch")
+    adb = get_async_db()
+    ensure_upload_dir()
+
+    SCANS_IN_FLIGHT.inc(len(files))
+    try:
+        return await _create_scan_batch(adb, claims.sub, files, notes)
+    finally:
+        SCANS_IN_FLIGHT.dec(len(files))
+
+
+async def _create_scan_batch(
+    adb: AsyncDatabase, user_id: str, files: List[UploadFile], notes: Optional[str]
+) -> ScanBatchOut:
+    errors: Dict[int, Tuple[int, str]] = {}
+    # a few files at a time, so one batch cannot take over the threadpool
+    reads_allowed = asyncio.Semaphore(max(1, SCAN_BATCH_READ_CONCURRENCY))
+
+    async def read(f: UploadFile) -> UploadBytes:
+        async with reads_allowed:
+            return await run_in_threadpool(read_upload, f)
+
+    with SCAN_STAGE_SECONDS.time(stage="batch_read"):
+        reads = await asyncio.gather(*(read(f) for f in files), return_exceptions=True)
+    uploads: Dict[int, UploadBytes] = {}
+    for i, r in enumerate(reads):
+        if isinstance(r, BaseException):
+            errors[i] = _file_error(r)
+        else:
+            uploads[i] = r
+    save_tasks = {i: asyncio.ensure_future(run_in_threadpool(save_upload_bytes, u)) for i, u in uploads.items()}
+
+    # Predictions: cache first, then one batched model call for the misses.
+    cache = get_prediction_cache()
+    model_key = get_model_version()
+    predictions: Dict[int, Tuple[str, float]] = {}
+    embeddings: Dict[int, bytes] = {}
+    if cache:
+        hits = await run_in_threadpool(lambda: {i: cache.get(u.sha256, model_key) for i, u in uploads.items()})
+        predictions.update({i: hit for i, hit in hits.items() if hit})
+    misses = [i for i in uploads if i not in predictions]
+    batch_version = model_key
+    if misses:
+        try:
+            started = time.perf_counter()
+            results, info = await run_inference(predict_batch_bytes, [uploads[i].data for i in misses])
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+        except Exception as e:
+            import traceback; traceback.print_exc()
+            code = 503 if isinstance(e, InferenceUnavailable) else 500
+            results = [{"error": f"Model inference error: {e}", "status": code}] * len(misses)
+            info = None
+        if info:
+            batch_version = str(info["modelVersion"])
+            SCAN_STAGE_SECONDS.observe(info["decodeSeconds"], stage="batch_decode")
+            SCAN_STAGE_SECONDS.observe(info["predictSeconds"], stage="batch_predict")
+        fresh = []
+        for i, result in zip(misses, results):
+            if "error" in result:
+                errors[i] = (int(result.get("status", 422)), str(result["error"]))
+                continue
+            predictions[i] = (str(result["label"]), float(result["confidence"]))
+            if result.get("embedding") is not None:
+                embeddings[i] = result["embedding"]
+            fresh.append(i)
+            if result["uncertainReason"]:
+                UNCERTAIN_TOTAL.inc(reason=result["uncertainReason"])
+        if cache and fresh:
+            per_image_ms = elapsed_ms / len(misses)
+            await run_in_threadpool(lambda: [
+                cache.put(uploads[i].sha256, batch_version, *predictions[i], per_image_ms) for i in fresh
+            ])
+
+    saved = dict(zip(save_tasks, await asyncio.gather(*save_tasks.values(), return_exceptions=True)))
+    cached_ok = [i for i in predictions if i not in misses and not isinstance(saved[i], BaseException)]
+    known = await asyncio.gather(*(_known_embedding(adb, saved[i].path, model_key) for i in cached_ok))
+    embeddings.update({i: e for i, e in zip(cached_ok, known) if e is not None})
+    created_at = datetime.now(timezone.utc)
+    docs: Dict[int, Dict[str, Any]] = {}
+    for i in sorted(predictions):
+        if isinstance(saved[i], BaseException):
+            errors[i] = _file_error(saved[i])
+            continue
+        label = DiseaseKey.parse(predictions[i][0])
+        PREDICTIONS_TOTAL.inc(label=label.value, source="model" if i in misses else "cache")
+        docs[i] = {
+            "userId": as_object_id(user_id),
+            "label": label.value,
+            "confidence": predictions[i][1],
+            "modelVersion": batch_version if i in misses else model_key,
+            "notes": notes,
+            "imageUrl": saved[i].path,
+            "createdAt": created_at,
+        }
+        if i in embeddings:
+            docs[i]["embedding"] = embeddings[i]
+    if docs:
+        with SCAN_STAGE_SECONDS.time(stage="batch_insert"):
+            # insert_many fills in each doc's _id
+            await adb.scans.insert_many(list(docs.values()))
+        await scan_stats.record(adb, docs.values())
+        schedule_variants(*{d["imageUrl"] for d in docs.values()})
+        _index_embeddings(list(docs.values()))
+    unused = [s.path for i, s in saved.items() if i not in docs and not isinstance(s, BaseException)]
+    if unused:
+        await run_in_threadpool(queue_removal, *unused)
+
+    out = ScanBatchOut(succeeded=len(docs), failed=len(files) - len(docs))
+    for i, f in enumerate(files):
+        if i in docs:
+            out.items.append(ScanBatchResult(filename=f.filename, status=200, item=ScanItem.from_dict(docs[i])))
+        else:
+            code, message = errors.get(i, (500, "Scan failed"))
+            out.items.append(ScanBatchResult(filename=f.filename, status=code, error=message))
+    return out
+
+SCAN_LIST_PROJECTION = {
+    "label": 1, "confidence": 1, "modelVersion": 1,
+    "notes": 1, "imageUrl": 1, "createdAt": 1,
+}
+SCAN_LIST_MAX_LIMIT = 200
+
+
+def _scan_filter(
+    user_id: str,
+    label: Optional[DiseaseKey],
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+) -> dict:
+    """The user's scans, optionally one label (legacy aliases included) and a createdAt range."""
+    query: dict = {"userId": as_object_id(user_id)}
+    if label is not None:
+        query["label"] = {"$in": DiseaseKey.stored_values(label)}
+    if date_from or date_to:
+        created: dict = {}
+        if date_from:
+            created["$gte"] = as_utc_naive(date_from)
+        if date_to:
+            created["$lt"] = as_utc_naive(date_to)
+        query["createdAt"] = created
+    return query
+
+
 @router.get("/scans", response_model=ScanListOut, tags=["scans"])
-def list_scans(creds: HTTPAuthorizationCredentials = Depends(bearer)) -> ScanListOut:
-    claims = require_user(creds)
-    user_id = claims.sub
+async def list_scans(
+    limit: Optional[int] = Query(None, ge=1, le=SCAN_LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None),
+    label: Optional[DiseaseKey] = Query(None),
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    claims: JWTClaims = Depends(require_user),
+) -> Response:
+    """
+    Newest-first scan history. With `limit`, returns one keyset page plus a
+    `nextCursor` to pass back as `cursor`; without it, the full history.
+    `from` (inclusive) / `to` (exclusive) filter on createdAt.
+    """
+    query = _scan_filter(claims.sub, label, date_from, date_to)
+    try:
+        page_filter = after_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if page_filter:
+        query = {"$and": [query, page_filter]}
 
-    db: Any = get_db()
-    cursor = db.scans.find({"userId": as_object_id(user_id)}).sort("createdAt", DESCENDING)
-
-    items: List[ScanItem] = []
-    for d in cursor:
-        items.append(
-            ScanItem(
-                id=str(d["_id"]),
-                label=DiseaseKey.parse(d["label"]),
-                confidence=d.get("confidence"),
-                modelVersion=d["modelVersion"],
-                notes=d.get("notes"),
-                imageUrl=d.get("imageUrl"),
-                createdAt=d["createdAt"],
-            )
-        )
-    return ScanListOut(items=items)
+    rows = get_async_db().scans.find(query, SCAN_LIST_PROJECTION).sort(
+        [("createdAt", DESCENDING), ("_id", DESCENDING)]
+    )
+    if limit is not None:
+        rows = rows.limit(limit + 1)  # one extra row tells us if there is a next page
+    docs = await rows.to_list(None)
+
+    next_cursor: Optional[str] = None
+    if limit is not None and len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1]["createdAt"], docs[-1]["_id"])
+
+    # Encoded straight from the documents (fast_json.py); response_model
+    # still documents the shape, which the bytes match exactly.
+    return Response(content=scan_list_body(docs, next_cursor), media_type="application/json")
+
+@router.get(
+    "/scans/export",
+    tags=["scans"],
+    response_class=StreamingResponse,
+    responses={200: {"content": {t: {} for t in EXPORT_MEDIA_TYPES.values()}}},
+)
+async def export_scans(
+    fmt: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+    label: Optional[DiseaseKey] = Query(None),
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    claims: JWTClaims = Depends(require_user),
+) -> StreamingResponse:
+    """
+    The user's whole scan history (newest first, same filters as GET /scans)
+    as NDJSON (one ScanItem per line) or CSV, streamed from the Mongo cursor
+    in batches with chunked transfer encoding.
+    """
+    rows = (
+        get_async_db().scans.find(_scan_filter(claims.sub, label, date_from, date_to), SCAN_LIST_PROJECTION)
+        .sort("createdAt", DESCENDING)
+        .hint("user_createdAt")  # index order = output order: no in-memory sort before the first row
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+    filename = f"riceguard-scans-{datetime.now(timezone.utc):%Y%m%d}.{fmt.value}"
+    return StreamingResponse(
+        export_chunks(rows, fmt.value),
+        media_type=EXPORT_MEDIA_TYPES[fmt.value],
+        headers={
+            "content-disposition": f'attachment; filename="{filename}"',
+            "cache-control": "no-store",
+            "x-accel-buffering": "no",  # let nginx pass chunks through as they come
+        },
+    )
+
+@router.get("/scans/stats", response_model=ScanStatsOut, tags=["scans"])
+async def scan_stats_summary(
+    months: int = Query(12, ge=0, le=scan_stats.MAX_MONTHS),
+    days: int = Query(31, ge=0, le=scan_stats.MAX_DAYS),
+    claims: JWTClaims = Depends(require_user),
+) -> ScanStatsOut:
+    """
+    Scan counts for the current user: overall, per label, and per UTC month
+    and day (the latest `months` / `days` buckets that have scans). Read
+    from a counters document, so the cost does not grow with history.
+    """
+    doc = await get_async_db().scan_stats.find_one({"_id": as_object_id(claims.sub)})
+    return ScanStatsOut(**scan_stats.summarize(doc, months, days))
+
+# ======================= SIMILAR SCANS ===================== #
+SIMILAR_MAX_LIMIT = 50
+
+
+@router.get("/scans/{scan_id}/similar", response_model=SimilarScansOut, tags=["scans"])
+async def similar_scans(
+    scan_id: str,
+    limit: int = Query(10, ge=1, le=SIMILAR_MAX_LIMIT),
+    claims: JWTClaims = Depends(require_user),
+) -> SimilarScansOut:
+    """
+    The user's past scans that look most like this one, most similar
+    first, by cosine similarity of the model's embeddings (see
+    similarity.py). Uncertain results are left out. 409 if the scan has
+    no embedding (its model did not expose one).
+    """
+    user_id = as_object_id(claims.sub)
+    try:
+        oid = as_object_id(scan_id)
+    except InvalidId:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    adb = get_async_db()
+    doc = await adb.scans.find_one({"_id": oid, "userId": user_id}, {"embedding": 1, "modelVersion": 1})
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    if not doc.get("embedding"):
+        raise HTTPException(status_code=409, detail="This scan has no embedding to compare")
+
+    index = get_similarity_index(str(doc["modelVersion"]))
+    # ask for extra: hits deleted by another process or uncertain drop out below
+    hits = await run_in_threadpool(index.search, doc["embedding"], 2 * limit, user_id, doc["_id"])
+    found = await adb.scans.find(
+        {"_id": {"$in": [h[0] for h in hits]}, "userId": user_id, "label": {"$ne": DiseaseKey.UNCERTAIN.value}},
+        SCAN_LIST_PROJECTION,
+    ).to_list(None)
+    by_id = {d["_id"]: d for d in found}
+    items = [
+        SimilarScan(**ScanItem.from_dict(by_id[i]).dict(), similarity=round(score, 4))
+        for i, score in hits if i in by_id
+    ]
+    return SimilarScansOut(items=items[:limit])
 
 # ========================= DELETE SCANS ==================== #
 @router.delete("/scans/{scan_id}", response_model=DeleteOneOut, tags=["scans"])
-def delete_scan(scan_id: str, creds: HTTPAuthorizationCredentials = Depends(bearer)) -> DeleteOneOut:
-    claims = require_user(creds)
+async def delete_scan(scan_id: str, claims: JWTClaims = Depends(require_user)) -> DeleteOneOut:
     user_id = claims.sub
 
-    db: Any = get_db()
-    res = db.scans.delete_one({"_id": as_object_id(scan_id), "userId": as_object_id(user_id)})
-    if res.deleted_count == 0:
+    adb = get_async_db()
+    doc = await adb.scans.find_one_and_delete(
+        {"_id": as_object_id(scan_id), "userId": as_object_id(user_id)},
+        projection={"imageUrl": 1, "userId": 1, "label": 1, "createdAt": 1},
+    )
+    if doc is None:
         raise HTTPException(status_code=404, detail="Scan not found")
+    await scan_stats.record(adb, [doc], sign=-1)
+    forget_embeddings(doc["_id"])
+    await run_in_threadpool(queue_removal, doc.get("imageUrl"))  # the file goes once no other scan shares it
     return DeleteOneOut(deleted=True, id=scan_id)
 
 @router.post("/scans/bulk-delete", response_model=BulkDeleteOut, tags=["scans"])
-def bulk_delete_scans(payload: BulkDeleteIn, creds: HTTPAuthorizationCredentials = Depends(bearer)) -> BulkDeleteOut:
-    claims = require_user(creds)
+async def bulk_delete_scans(payload: BulkDeleteIn, claims: JWTClaims = Depends(require_user)) -> BulkDeleteOut:
     user_id = claims.sub
 
     if not payload.ids:
         return BulkDeleteOut(deletedCount=0)
 
-    db: Any = get_db()
+    adb = get_async_db()
     ids = [as_object_id(i) for i in payload.ids]
-    res = db.scans.delete_many({"_id": {"$in": ids}, "userId": as_object_id(user_id)})
+    query = {"_id": {"$in": ids}, "userId": as_object_id(user_id)}
+    found = await adb.scans.find(query, {"imageUrl": 1, "userId": 1, "label": 1, "createdAt": 1}).to_list(None)
+    # Delete exactly what was read, so the counters move by the same scans.
+    res = await adb.scans.delete_many({"_id": {"$in": [d["_id"] for d in found]}, "userId": as_object_id(user_id)})
+    if res.deleted_count == len(found):
+        await scan_stats.record(adb, found, sign=-1)
+    else:  # raced with another delete; recount this user instead of guessing
+        await run_in_threadpool(scan_stats.rebuild, as_object_id(user_id))
+    forget_embeddings(*[d["_id"] for d in found])
+    await run_in_threadpool(queue_removal, *[d.get("imageUrl") for d in found])
     return BulkDeleteOut(deletedCount=res.deleted_count)
 
 # ======================= RECOMMENDATIONS =================== #
 @router.get("/recommendations/{diseaseKey}", response_model=RecommendationOut, tags=["recommendations"])
-def get_recommendation(diseaseKey: DiseaseKey) -> RecommendationOut:
-    db: Any = get_db()
-    doc = db.recommendations.find_one({"diseaseKey": diseaseKey.value})
-    if not doc:
+def get_recommendation(
+    diseaseKey: DiseaseKey,
+    if_none_match: Optional[str] = Header(None),
+) -> Response:
+    cached = get_recommendation_cache().get(diseaseKey)
+    if not cached:
         raise HTTPException(status_code=404, detail="Recommendation not found")
 
-    return RecommendationOut(
-        diseaseKey=diseaseKey,
-        title=doc["title"],
-        steps=doc["steps"],
-        version=doc["version"],
-        updatedAt=doc["updatedAt"],
-    )
+    headers = {"ETag": cached.etag, "Cache-Control": f"public, max-age={RECO_CLIENT_MAX_AGE}"}
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
@@ -0,0 +1,63 @@
+# backend/scan_export.py
+# Streaming export of a user's scan history (GET /scans/export).
+#
+# Rows go from the Mongo cursor to the socket one batch at a time: the
+# route hands export_chunks() a projected cursor, each to_list(batch) is
+# encoded and yielded as one chunk of a chunked-transfer response, and
+# nothing else is kept. Memory stays at one batch however long the
+# history is, and a CSV export sends its header row before the first query
+# round-trip.
+
+from __future__ import annotations
+
+import csv
+import io
+from typing import Any, AsyncIterator, Dict, List
+
+from fast_json import dumps, scan_item_dict
+from settings import EXPORT_BATCH_SIZE
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+CSV_COLUMNS = ("id", "label", "confidence", "modelVersion", "notes", "imageUrl", "createdAt")
+# Spreadsheet apps evaluate cells starting with these; notes are user text.
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def ndjson_rows(docs: List[Dict[str, Any]]) -> bytes:
+    """One ScanItem JSON object per line."""
+    return b"".join(dumps(scan_item_dict(d)) + b"\n" for d in docs)
+
+
+def csv_rows(docs: List[Dict[str, Any]], header: bool = False) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\r\n")
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    for d in docs:
+        item = scan_item_dict(d)
+        writer.writerow([_csv_cell(item[c]) for c in CSV_COLUMNS])
+    return buf.getvalue().encode("utf-8")
+
+
+async def export_chunks(cursor: Any, fmt: str, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """Encoded chunks for `cursor` (projected with the scan list fields), closing it when done."""
+    try:
+        if fmt == "csv":
+            yield csv_rows([], header=True)
+        while True:
+            docs = await cursor.to_list(batch_size)
+            if not docs:
+                return
+            yield csv_rows(docs) if fmt == "csv" else ndjson_rows(docs)
+    finally:
+        await cursor.close()
@@ -0,0 +1,192 @@
+# backend/scan_stats.py
+# Per-user scan counters behind GET /scans/stats.
+#
+# One scan_stats document per user (_id = userId) holds
+#   total, labels.<key>,
+#   months.<YYYY-MM>.total, months.<YYYY-MM>.labels.<key>,
+#   days.<YYYY-MM-DD>.total, days.<YYYY-MM-DD>.labels.<key>
+# (UTC buckets). Creating and deleting scans apply a single atomic $inc
+# per user, so reading the dashboard is one _id lookup however long the
+# history is. The first scan of a new day also prunes the buckets beyond
+# the longest windows GET /scans/stats serves (MAX_MONTHS / MAX_DAYS
+# non-empty buckets), so the document stays bounded. The counters are not
+# updated in the same transaction as the scans themselves;
+# `python scan_stats.py rebuild` recomputes them from the scans
+# collection to repair any drift.
+
+from __future__ import annotations
+
+import argparse
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+from db import get_db
+from models import DiseaseKey
+
+MAX_MONTHS = 120  # longest byMonth / byDay windows the API serves
+MAX_DAYS = 366
+
+
+def _label(raw: Any) -> str:
+    try:
+        return DiseaseKey.parse(str(raw)).value
+    except ValueError:
+        return str(raw)
+
+
+def _increments(scan: Dict[str, Any], sign: int) -> Dict[str, int]:
+    created: datetime = scan["createdAt"]
+    month, day = created.strftime("%Y-%m"), created.strftime("%Y-%m-%d")
+    label = _label(scan["label"])
+    return {
+        "total": sign,
+        f"labels.{label}": sign,
+        f"months.{month}.total": sign,
+        f"months.{month}.labels.{label}": sign,
+        f"days.{day}.total": sign,
+        f"days.{day}.labels.{label}": sign,
+    }
+
+
+def stats_updates(scans: Iterable[Dict[str, Any]], sign: int = 1) -> Dict[ObjectId, Dict[str, int]]:
+    """Merged $inc documents per userId for scans being added (+1) or removed (-1)."""
+    per_user: Dict[ObjectId, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for scan in scans:
+        for path, n in _increments(scan, sign).items():
+            per_user[scan["userId"]][path] += n
+    return {user: dict(inc) for user, inc in per_user.items()}
+
+
+async def record(adb: Any, scans: Iterable[Dict[str, Any]], sign: int = 1) -> None:
+    """Apply created (+1) or deleted (-1) scans to their owners' counters."""
+    now = datetime.now(timezone.utc)
+    for user_id, inc in stats_updates(scans, sign).items():
+        update = {"$inc": inc, "$set": {"updatedAt": now}}
+        days = [path.split(".")[1] for path in inc if path.startswith("days.") and path.endswith(".total")]
+        if sign > 0:
+            # the common case: today's bucket already exists
+            existing = {"_id": user_id, **{f"days.{d}": {"$exists": True} for d in days}}
+            if (await adb.scan_stats.update_one(existing, update)).matched_count:
+                continue
+        await adb.scan_stats.update_one({"_id": user_id}, update, upsert=True)
+        if sign > 0:
+            doc = await adb.scan_stats.find_one({"_id": user_id}, {"months": 1, "days": 1})
+            stale = _stale_buckets(doc or {}, keep={f"days.{d}" for d in days} | {f"months.{d[:7]}" for d in days})
+            if stale:
+                await adb.scan_stats.update_one({"_id": user_id}, {"$unset": stale})
+
+
+def _stale_buckets(doc: Dict[str, Any], keep: Iterable[str] = ()) -> Dict[str, str]:
+    """$unset paths for month/day buckets that are empty or beyond MAX_MONTHS / MAX_DAYS non-empty ones."""
+    kept = set(keep)  # buckets being written right now stay, even at zero
+    unset: Dict[str, str] = {}
+    for field, limit in (("months", MAX_MONTHS), ("days", MAX_DAYS)):
+        data = doc.get(field) or {}
+        live = [k for k in sorted(data, reverse=True) if data[k].get("total", 0) > 0][:limit]
+        kept.update(f"{field}.{k}" for k in live)
+        unset.update({f"{field}.{k}": "" for k in data if f"{field}.{k}" not in kept})
+    return unset
+
+
+def _positive(counts: Dict[str, int]) -> Dict[str, int]:
+    return {k: v for k, v in counts.items() if v > 0}
+
+
+def summarize(doc: Optional[Dict[str, Any]], months: int, days: int) -> Dict[str, Any]:
+    """Shape a counters document for the API, keeping the latest `months` / `days` buckets."""
+    doc = doc or {}
+
+    def buckets(field: str, keep: int) -> Dict[str, Dict[str, Any]]:
+        data = doc.get(field, {})
+        live = [key for key in sorted(data, reverse=True) if data[key].get("total", 0) > 0]
+        return {
+            key: {"total": data[key]["total"], "byLabel": _positive(data[key].get("labels", {}))}
+            for key in live[:keep]
+        }
+
+    return {
+        "total": max(0, doc.get("total", 0)),
+        "byLabel": _positive(doc.get("labels", {})),
+        "byMonth": buckets("months", months),
+        "byDay": buckets("days", days),
+        "updatedAt": doc.get("updatedAt"),
+    }
+
+
+# ---------------- rebuild ---------------- #
+def rebuild(user_id: Optional[ObjectId] = None) -> int:
+    """
+    Recompute counters from the scans collection, one user at a time
+    (streamed in userId order), replacing each user's document and
+    deleting the documents of users in between, who have no scans left.
+    Returns the number of users rebuilt. Scans created or deleted while a
+    user is being recomputed can still skew that user; re-run if in doubt.
+    """
+    db = get_db()
+    query = {"userId": user_id} if user_id else {}
+    cursor = db.scans.find(query, {"userId": 1, "label": 1, "createdAt": 1}).sort("userId", 1)
+    rebuilt = 0
+    current: Optional[ObjectId] = None
+    batch: List[Dict[str, Any]] = []
+
+    def flush() -> None:
+        nonlocal rebuilt
+        if current is None:
+            return
+        doc: Dict[str, Any] = {"total": 0, "labels": {}, "months": {}, "days": {}}
+        for path, n in stats_updates(batch).get(current, {}).items():
+            node = doc
+            *parents, leaf = path.split(".")
+            for part in parents:
+                node = node.setdefault(part, {})
+            node[leaf] = node.get(leaf, 0) + n
+        for path in _stale_buckets(doc):
+            field, key = path.split(".", 1)
+            del doc[field][key]
+        doc["updatedAt"] = datetime.now(timezone.utc)
+        db.scan_stats.replace_one({"_id": current}, doc, upsert=True)
+        rebuilt += 1
+
+    def drop_between(low: Optional[ObjectId], high: Optional[ObjectId]) -> None:
+        """Users whose scans are all gone keep no stale counters."""
+        if user_id:
+            return
+        bounds: Dict[str, ObjectId] = {}
+        if low is not None:
+            bounds["$gt"] = low
+        if high is not None:
+            bounds["$lt"] = high
+        db.scan_stats.delete_many({"_id": bounds} if bounds else {})
+
+    for scan in cursor:
+        if scan["userId"] != current:
+            flush()
+            drop_between(current, scan["userId"])
+            current, batch = scan["userId"], []
+        batch.append(scan)
+    flush()
+    drop_between(current, None)
+
+    if user_id and not rebuilt:
+        db.scan_stats.delete_one({"_id": user_id})
+    return rebuilt
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain per-user scan statistics.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("rebuild", help="recompute counters from the scans collection")
+    p.add_argument("--user", help="only this userId")
+    args = parser.parse_args(argv)
+
+    count = rebuild(ObjectId(args.user) if args.user else None)
+    print(f"[stats] rebuilt counters for {count} user(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
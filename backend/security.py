@@ -1,9 +1,19 @@
 # backend/security.py
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, List, Tuple
 from jose import jwt, JWTError
 from passlib.context import CryptContext
-from settings import JWT_SECRET, JWT_ALGORITHM, TOKEN_EXPIRE_HOURS
+from settings import (
+    JWT_SECRET, JWT_ALGORITHM, TOKEN_EXPIRE_HOURS, TOKEN_CACHE_SIZE,
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE,
+    BCRYPT_ROUNDS, BCRYPT_TARGET_MS, BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS, BCRYPT_PROBE_ROUNDS,
+)
 
 # Use bcrypt_sha256 to avoid 72-byte password issues
 pwd_context = CryptContext(schemes=["bcrypt_sha256"], deprecated="auto")
@@ -17,6 +27,98 @@ def verify_password(plain: str, hashed: str) -> bool:
     """Verify a plaintext password against its hash."""
     return pwd_context.verify(plain, hashed)
 
+def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Verify, and return a replacement hash if the stored cost is off target."""
+    return pwd_context.verify_and_update(plain, hashed)
+
+
+# -------------------- HASHING EXECUTOR --------------------
+class HashingBusy(Exception):
+    """Raised when the password-hashing queue is full; map to 503 + Retry-After."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool (bcrypt releases the GIL)
+    so login storms cannot occupy FastAPI's shared threadpool. At most
+    `workers + max_queue` jobs are admitted; the rest fail fast with
+    HashingBusy instead of piling up.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_QUEUE) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="pwhash")
+        self._slots = threading.BoundedSemaphore(max(1, workers) + max(0, max_queue))
+
+    async def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            fut = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        fut.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(fut)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify_and_update(self, plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(verify_and_update_password, plain, hashed)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_hasher: Optional[PasswordHasher] = None
+
+def get_password_hasher() -> PasswordHasher:
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher()
+    return _hasher
+
+
+def _bcrypt_seconds(rounds: int) -> float:
+    ctx = CryptContext(schemes=["bcrypt_sha256"], bcrypt_sha256__default_rounds=rounds)
+    ctx.hash("calibration-warmup")
+    best = float("inf")
+    for _ in range(2):
+        started = time.perf_counter()
+        ctx.hash("calibration-probe")
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def calibrate_password_hashing() -> int:
+    """
+    Pick the bcrypt cost for this host and install it on pwd_context.
+
+    BCRYPT_ROUNDS pins the cost. Otherwise a cheap probe at BCRYPT_PROBE_ROUNDS
+    is timed and extrapolated (each extra round doubles the work) to the
+    highest cost whose hash stays within BCRYPT_TARGET_MS, clamped to
+    [BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS]. Stored hashes more than one
+    round away from that cost are rehashed on the next successful login.
+    """
+    if BCRYPT_ROUNDS:
+        rounds = BCRYPT_ROUNDS
+    else:
+        probe = _bcrypt_seconds(BCRYPT_PROBE_ROUNDS)
+        budget = BCRYPT_TARGET_MS / 1000.0
+        rounds = BCRYPT_PROBE_ROUNDS
+        while rounds < BCRYPT_MAX_ROUNDS and probe * 2 ** (rounds + 1 - BCRYPT_PROBE_ROUNDS) <= budget:
+            rounds += 1
+        rounds = max(BCRYPT_MIN_ROUNDS, min(BCRYPT_MAX_ROUNDS, rounds))
+        print(f"[auth] bcrypt probe {probe * 1000:.1f} ms @ {BCRYPT_PROBE_ROUNDS} rounds")
+
+    pwd_context.update(
+        bcrypt_sha256__default_rounds=rounds,
+        bcrypt_sha256__min_rounds=max(4, rounds - 1),
+        bcrypt_sha256__max_rounds=min(31, rounds + 1),
+    )
+    print(f"[auth] bcrypt cost set to {rounds} rounds (target {BCRYPT_TARGET_MS:.0f} ms)")
+    return rounds
+
 # -------------------- TOKEN UTILS --------------------
 def create_access_token(
     subject: str,
@@ -42,10 +144,82 @@ def create_access_token(
     return token, expire
 
 
+class VerifiedTokenCache:
+    """
+    Bounded LRU of already-verified token payloads, keyed by a SHA-256
+    digest of the token (raw tokens are never kept). Entries are only
+    served until the token's own `exp`, so a cached token expires exactly
+    when jwt.decode would start rejecting it. Each entry can also carry the
+    parsed claims object built from its payload (see routers.claims_from_token),
+    so a hit skips the model construction as well as the signature check.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE) -> None:
+        self.max_entries = max(0, max_entries)
+        # digest -> [payload, exp, claims or None]
+        self._entries: "OrderedDict[bytes, List[Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def _live(self, key: bytes) -> Optional[List[Any]]:
+        """Entry for `key` if it has not expired (caller holds the lock)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._live(self._key(token))
+            return None if entry is None else entry[0]
+
+    def put(self, token: str, payload: Dict[str, Any]) -> None:
+        exp = payload.get("exp")
+        if self.max_entries == 0 or not isinstance(exp, (int, float)):
+            return  # never cache tokens without an expiry
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = [payload, float(exp), None]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_claims(self, token: str) -> Optional[Any]:
+        """Parsed claims attached with put_claims, or None."""
+        with self._lock:
+            entry = self._live(self._key(token))
+            return None if entry is None else entry[2]
+
+    def put_claims(self, token: str, claims: Any) -> None:
+        """Attach parsed claims to a cached token; a no-op if it was not cached."""
+        with self._lock:
+            entry = self._entries.get(self._key(token))
+            if entry is not None:
+                entry[2] = claims
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = VerifiedTokenCache()
+
+
 def decode_token(token: str) -> Dict[str, Any]:
-    """Decode and validate a JWT token."""
+    """Decode and validate a JWT token (repeat tokens are served from token_cache)."""
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except JWTError as e:
-        raise ValueError(f"Invalid token: {e}")
\ No newline at end of file
+        raise ValueError(f"Invalid token: {e}")
+    token_cache.put(token, payload)
+    return payload
\ No newline at end of file
@@ -1,5 +1,6 @@
+import json
 import os
-from typing import List
+from typing import Dict, List
 
 # NEW: load .env from the backend folder
 from pathlib import Path                 # NEW
@@ -8,11 +9,101 @@ load_dotenv(dotenv_path=Path(__file__).with_name(".env"))  # NEW
 
 MONGO_URI: str = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME: str = os.getenv("DB_NAME", "riceguard_db")
+# Connection pool, shared by the sync client and the async one routes use.
+MONGO_MAX_POOL_SIZE: int = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE: int = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS: int = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+# "pymongo" = PyMongo's native AsyncMongoClient; "threadpool" = the sync
+# client behind run_in_threadpool (used with mongomock in tests).
+MONGO_ASYNC_DRIVER: str = os.getenv("MONGO_ASYNC_DRIVER", "pymongo").strip().lower()
+# Per-collection concerns as JSON, e.g.
+#   {"scans": {"w": "majority", "readConcern": "majority"}}
+# keys: w, j, wtimeout, readConcern. Unlisted collections use the URI's.
+# Caches default to w=1: losing a write there only costs a recompute.
+MONGO_COLLECTION_CONCERNS: Dict[str, Dict[str, object]] = json.loads(os.getenv(
+    "MONGO_COLLECTION_CONCERNS",
+    '{"prediction_cache": {"w": 1}, "gc_queue": {"w": 1}}',
+))
 JWT_SECRET: str = os.getenv("JWT_SECRET", "CHANGE_ME_SUPER_SECRET")
 JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
 TOKEN_EXPIRE_HOURS: int = int(os.getenv("TOKEN_EXPIRE_HOURS", "6"))
+# Verified JWTs are remembered (until their exp) so repeat requests skip decode.
+TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+# Password hashing runs on its own bounded pool; beyond workers + queue
+# callers get 503 with Retry-After instead of waiting.
+PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE: int = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
+PASSWORD_HASH_RETRY_AFTER: int = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "2"))
+# bcrypt cost: pinned by BCRYPT_ROUNDS, else calibrated at startup to BCRYPT_TARGET_MS.
+BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "0"))
+BCRYPT_TARGET_MS: float = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+BCRYPT_MIN_ROUNDS: int = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS: int = int(os.getenv("BCRYPT_MAX_ROUNDS", "14"))
+BCRYPT_PROBE_ROUNDS: int = int(os.getenv("BCRYPT_PROBE_ROUNDS", "8"))
 UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
 MAX_UPLOAD_MB: int = int(os.getenv("MAX_UPLOAD_MB", "8"))
+# Uploads declaring larger images are refused from their header, before
+# decoding (image_check.py). 50 MP covers current phone cameras.
+MAX_IMAGE_SIDE: int = int(os.getenv("MAX_IMAGE_SIDE", "12000"))
+MAX_IMAGE_PIXELS: int = int(os.getenv("MAX_IMAGE_PIXELS", "50000000"))
+# Files accepted by one POST /scans/batch (each still limited to MAX_UPLOAD_MB).
+SCAN_BATCH_MAX_FILES: int = int(os.getenv("SCAN_BATCH_MAX_FILES", "50"))
+# How many of a batch's files are read (and image-checked) at the same time.
+SCAN_BATCH_READ_CONCURRENCY: int = int(os.getenv("SCAN_BATCH_READ_CONCURRENCY", "4"))
+# POST /scans with an Idempotency-Key (idempotency.py): completed keys are
+# replayed for IDEMPOTENCY_TTL_SECONDS; a retry waits up to
+# IDEMPOTENCY_WAIT_SECONDS for a first attempt running on another worker,
+# and a claim older than IDEMPOTENCY_STALE_SECONDS is considered abandoned.
+IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+IDEMPOTENCY_STALE_SECONDS: float = float(os.getenv("IDEMPOTENCY_STALE_SECONDS", "120"))
+# GET /scans/export reads and sends this many scans per chunk.
+EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+# History views load these instead of the original (image_variants.py).
+THUMBNAIL_SIZE: int = int(os.getenv("THUMBNAIL_SIZE", "256"))
+PREVIEW_SIZE: int = int(os.getenv("PREVIEW_SIZE", "1024"))
+THUMBNAIL_FORMAT: str = os.getenv("THUMBNAIL_FORMAT", "webp").strip().lower()  # webp or jpeg
+# Content-addressed uploads are served as immutable for this long (1 year).
+# Thumbnails keep their URL if THUMBNAIL_SIZE changes, so clients holding
+# a cached copy keep the old size until it expires.
+UPLOAD_CACHE_MAX_AGE: int = int(os.getenv("UPLOAD_CACHE_MAX_AGE", "31536000"))
+# Upload garbage collection (upload_gc.py): files of deleted/failed scans
+# and orphans are removed once unreferenced and untouched for the grace
+# period. GC_INTERVAL_SECONDS=0 disables the background sweeper.
+GC_INTERVAL_SECONDS: float = float(os.getenv("GC_INTERVAL_SECONDS", "600"))
+GC_GRACE_SECONDS: float = float(os.getenv("GC_GRACE_SECONDS", "3600"))
+GC_BATCH_SIZE: int = int(os.getenv("GC_BATCH_SIZE", "500"))
+GC_MAX_FILES_PER_RUN: int = int(os.getenv("GC_MAX_FILES_PER_RUN", "20000"))
+# Bulk re-scoring (rescore.py): images per model call, decoder threads,
+# updates per bulk_write, and an images/sec ceiling (0 = unthrottled).
+# A bulk_write slower than RESCORE_SLOW_WRITE_MS pauses the job for as
+# long as the write took, so a busy primary gets room to catch up.
+RESCORE_BATCH_SIZE: int = int(os.getenv("RESCORE_BATCH_SIZE", "32"))
+RESCORE_WORKERS: int = int(os.getenv("RESCORE_WORKERS", "4"))
+RESCORE_WRITE_CHUNK: int = int(os.getenv("RESCORE_WRITE_CHUNK", "500"))
+RESCORE_MAX_RATE: float = float(os.getenv("RESCORE_MAX_RATE", "0"))
+RESCORE_SLOW_WRITE_MS: float = float(os.getenv("RESCORE_SLOW_WRITE_MS", "200"))
+# Similar-scans index (similarity.py): snapshot directory, row count above
+# which a built snapshot is searched through IVF lists (probing the
+# SIMILARITY_NPROBE closest), how often queries pull new scans, and how
+# many scans newer than the snapshot each process keeps in memory.
+SIMILARITY_DIR: str = os.getenv("SIMILARITY_DIR", "similarity_index")
+SIMILARITY_IVF_MIN_ROWS: int = int(os.getenv("SIMILARITY_IVF_MIN_ROWS", "10000"))
+SIMILARITY_NPROBE: int = int(os.getenv("SIMILARITY_NPROBE", "16"))
+SIMILARITY_SYNC_SECONDS: float = float(os.getenv("SIMILARITY_SYNC_SECONDS", "2"))
+SIMILARITY_MAX_DELTA: int = int(os.getenv("SIMILARITY_MAX_DELTA", "50000"))
+# Scan inference runs on its own executor: "process" (one model per worker
+# process) or "thread" (shares this process's model and micro-batcher).
+INFERENCE_EXECUTOR: str = os.getenv("INFERENCE_EXECUTOR", "process").strip().lower()
+INFERENCE_WORKERS: int = int(os.getenv("INFERENCE_WORKERS", "2"))
+# Duplicate uploads (same bytes, same model) reuse the stored prediction.
+PREDICTION_CACHE_ENABLED: bool = os.getenv("PREDICTION_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+PREDICTION_CACHE_SIZE: int = int(os.getenv("PREDICTION_CACHE_SIZE", "2048"))
+# Recommendations are served from memory; revalidated against Mongo after
+# the TTL, or immediately via a change stream when enabled (replica sets).
+RECO_CACHE_TTL_SECONDS: float = float(os.getenv("RECO_CACHE_TTL_SECONDS", "300"))
+RECO_CHANGE_STREAM: bool = os.getenv("RECO_CHANGE_STREAM", "0").lower() in ("1", "true", "yes")
+RECO_CLIENT_MAX_AGE: int = int(os.getenv("RECO_CLIENT_MAX_AGE", "300"))
 
 _default_origins = [
     "http://localhost:8081",
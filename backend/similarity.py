@@ -0,0 +1,461 @@
+# backend/similarity.py
+# "Similar past scans" index over the model's penultimate-layer embeddings.
+#
+# Every scan scored by a model that exposes its features stores them as
+# `embedding`: L2-normalized float16 bytes (ml_service.embedding_bytes),
+# so cosine similarity is a plain dot product. Embeddings of different
+# model versions live in different spaces, so there is one index per
+# modelVersion.
+#
+# An index is two parts:
+#   - a snapshot on disk under SIMILARITY_DIR/<version>/, written by
+#     `python similarity.py build` and memory-mapped read-only by every API
+#     process (vectors.npy float16, ids.npy, owners.npy, meta.json). Past
+#     SIMILARITY_IVF_MIN_ROWS rows the build also clusters the vectors
+#     (spherical k-means, ~sqrt(N) lists) and stores them grouped by list,
+#     so a query scores only the SIMILARITY_NPROBE closest lists instead of
+#     every row (IVF);
+#   - an in-memory delta of scans added since the snapshot: this process
+#     adds the scans it creates right away, and every
+#     SIMILARITY_SYNC_SECONDS a query pulls newer scans from Mongo by _id,
+#     so processes pick up each other's scans. Each pull is bounded in
+#     time, and the delta stops at SIMILARITY_MAX_DELTA scans until the
+#     next build. Deletions are tombstoned locally until a build drops
+#     them; callers load the hits from Mongo anyway, which drops scans
+#     deleted by other processes.
+#
+#   python similarity.py build [--version V] [--lists N]
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from db import get_db
+from settings import (
+    SIMILARITY_DIR,
+    SIMILARITY_IVF_MIN_ROWS,
+    SIMILARITY_MAX_DELTA,
+    SIMILARITY_NPROBE,
+    SIMILARITY_SYNC_SECONDS,
+)
+
+_CHUNK = 4096            # rows converted to float32 at a time (float16 -> float32 is the cost)
+_SYNC_OVERLAP = timedelta(seconds=60)  # ObjectIds from several processes arrive slightly out of order
+_SYNC_BATCH = 5000       # ids per query when pulling new scans
+_SYNC_BUDGET = 0.25      # seconds one sync may spend pulling before it leaves the rest for the next
+
+Hit = Tuple[ObjectId, float]
+
+
+def _vector(embedding: Any) -> "np.ndarray":
+    return np.frombuffer(bytes(embedding), dtype="<f2")
+
+
+def _top(scores: "np.ndarray", k: int) -> "np.ndarray":
+    """Indices of the k largest scores, best first."""
+    if len(scores) > k:
+        idx = np.argpartition(-scores, k)[:k]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def _version_dir(root: str, version: str) -> str:
+    return os.path.join(root, "".join(c if c.isalnum() or c in "-_." else "_" for c in version))
+
+
+class _Snapshot:
+    """The memory-mapped arrays of one build; replaced as a whole when a new build lands."""
+
+    def __init__(self, path: str, meta: Dict[str, Any]) -> None:
+        self.count = int(meta.get("count", 0))
+        self.last_id = ObjectId(meta["lastId"]) if meta.get("lastId") else None
+        self.vectors = self.ids = self.owners = self.centroids = self.offsets = None
+        if self.count:
+            load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+            self.vectors, self.ids, self.owners = load("vectors.npy"), load("ids.npy"), load("owners.npy")
+            if meta.get("lists"):
+                self.centroids = np.asarray(load("centroids.npy"), dtype="float32")
+                self.offsets = np.asarray(load("offsets.npy"))
+
+
+class SimilarityIndex:
+    def __init__(
+        self,
+        version: str,
+        root: str = SIMILARITY_DIR,
+        nprobe: int = SIMILARITY_NPROBE,
+        ivf_min_rows: int = SIMILARITY_IVF_MIN_ROWS,
+        sync_seconds: float = SIMILARITY_SYNC_SECONDS,
+        max_delta: int = SIMILARITY_MAX_DELTA,
+    ) -> None:
+        self.version = version
+        self.path = _version_dir(root, version)
+        self.nprobe = max(1, nprobe)
+        self.ivf_min_rows = ivf_min_rows
+        self.sync_seconds = sync_seconds
+        self.max_delta = max_delta
+        self._lock = threading.Lock()
+        self._snapshot_stamp: Optional[int] = None
+        self._load_snapshot()
+        self._reset_delta()
+        self._synced_at = float("-inf")
+
+    # ---------------- snapshot ---------------- #
+    def _load_snapshot(self) -> None:
+        meta_path = os.path.join(self.path, "meta.json")
+        try:
+            stamp = os.stat(meta_path).st_mtime_ns
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except OSError:
+            stamp, meta = None, {}
+        self._snapshot_stamp = stamp
+        self.dim: Optional[int] = meta.get("dim")
+        self._owner_codes: Dict[ObjectId, int] = {ObjectId(o): i for i, o in enumerate(meta.get("owners", []))}
+        self._snap = _Snapshot(self.path, meta)
+        if self._snap.count:
+            ivf = " (IVF)" if self._snap.centroids is not None else ""
+            print(f"[similar] {self.version}: snapshot of {self._snap.count} scans{ivf}")
+
+    def _reset_delta(self) -> None:
+        self._d_vectors = np.empty((0, self.dim or 0), dtype="<f2")
+        self._d_owners = np.empty(0, dtype="int32")
+        self._d_ids: List[ObjectId] = []
+        self._d_seen: Set[ObjectId] = set()
+        self._removed: Set[ObjectId] = set()
+        self._pulled_to: Optional[ObjectId] = None  # newest _id read from Mongo (local adds don't count)
+        self._full_logged = False
+
+    def __len__(self) -> int:
+        return self._snap.count + len(self._d_ids) - len(self._removed)
+
+    # ---------------- incremental updates ---------------- #
+    def add(self, scan_id: ObjectId, owner: ObjectId, embedding: Any) -> None:
+        """Index a newly scored scan (no-op if it is already in the snapshot or delta)."""
+        vec = _vector(embedding)
+        with self._lock:
+            last_id = self._snap.last_id
+            if scan_id in self._d_seen or (last_id is not None and scan_id <= last_id):
+                return
+            if self.dim is None:
+                self.dim = len(vec)
+                self._d_vectors = np.empty((0, self.dim), dtype="<f2")
+            if len(vec) != self.dim:
+                return
+            n = len(self._d_ids)
+            if n == len(self._d_vectors):  # grow by doubling
+                capacity = max(1024, 2 * n)
+                self._d_vectors = np.resize(self._d_vectors, (capacity, self.dim))
+                self._d_owners = np.resize(self._d_owners, capacity)
+            code = self._owner_codes.setdefault(owner, len(self._owner_codes))
+            self._d_vectors[n] = vec
+            self._d_owners[n] = code
+            self._d_ids.append(scan_id)
+            self._d_seen.add(scan_id)
+
+    def remove(self, *scan_ids: ObjectId) -> None:
+        with self._lock:
+            self._removed.update(scan_ids)
+
+    def sync(self, force: bool = False) -> None:
+        """Reopen a rebuilt snapshot, then add scans created (by any process) since the last sync."""
+        now = time.monotonic()
+        if not force and now - self._synced_at < self.sync_seconds:
+            return
+        self._synced_at = now
+        try:
+            stamp = os.stat(os.path.join(self.path, "meta.json")).st_mtime_ns
+        except OSError:
+            stamp = None
+        if stamp != self._snapshot_stamp:
+            with self._lock:
+                removed = self._removed
+                self._load_snapshot()
+                self._reset_delta()
+                self._removed = self._in_snapshot(removed)  # the rest are gone from Mongo as well
+
+        since = self._snap.last_id
+        if self._pulled_to is not None:
+            overlap = ObjectId.from_datetime(self._pulled_to.generation_time - _SYNC_OVERLAP)
+            since = max(since, overlap) if since is not None else overlap
+        # Bounded per call: a long backlog (no snapshot yet, or an old one)
+        # is pulled a slice at a time by successive queries, up to max_delta.
+        deadline = time.monotonic() + _SYNC_BUDGET
+        scans = get_db().scans
+        while True:
+            room = self.max_delta - len(self._d_ids)
+            if room <= 0:
+                if not self._full_logged:
+                    self._full_logged = True
+                    print(f"[similar] {self.version}: {self.max_delta} scans newer than the snapshot are "
+                          "indexed in memory, later ones are not; run `python similarity.py build`")
+                return
+            query: Dict[str, Any] = {"modelVersion": self.version, "embedding": {"$exists": True}}
+            if since is not None:
+                query["_id"] = {"$gt": since}
+            # ids first: the overlap window is mostly scans this index already has
+            ids = [d["_id"] for d in scans.find(query, {"_id": 1}).sort("_id", 1).limit(_SYNC_BATCH)]
+            if not ids:
+                return
+            fresh = [i for i in ids if i not in self._d_seen]
+            if len(fresh) > room:
+                fresh = fresh[:room]
+                ids = [i for i in ids if i <= fresh[-1]]
+            for start in range(0, len(fresh), 1000):
+                docs = scans.find({"_id": {"$in": fresh[start:start + 1000]}}, {"userId": 1, "embedding": 1})
+                for doc in sorted(docs, key=lambda d: d["_id"]):
+                    self.add(doc["_id"], doc["userId"], doc["embedding"])
+            since = ids[-1]
+            self._pulled_to = max(self._pulled_to, since) if self._pulled_to is not None else since
+            # re-reading the overlap window (all seen) does not use up the budget
+            if len(ids) < _SYNC_BATCH or (fresh and time.monotonic() > deadline):
+                return
+
+    def _in_snapshot(self, scan_ids: Set[ObjectId]) -> Set[ObjectId]:
+        """The ids among `scan_ids` that the current snapshot holds."""
+        if not scan_ids or not self._snap.count:
+            return set()
+        wanted = list(scan_ids)
+        keys = np.array([i.binary for i in wanted], dtype="S12")
+        rows = np.ascontiguousarray(self._snap.ids).view("S12").ravel()
+        return {i for i, hit in zip(wanted, np.isin(keys, rows)) if hit}
+
+    # ---------------- search ---------------- #
+    def search(
+        self,
+        embedding: Any,
+        k: int = 10,
+        owner: Optional[ObjectId] = None,
+        exclude: Optional[ObjectId] = None,
+    ) -> List[Hit]:
+        """
+        The k most similar indexed scans as (scan id, cosine similarity),
+        best first; only `owner`'s scans when given.
+        """
+        self.sync()
+        q = _vector(embedding).astype("float32")
+        with self._lock:
+            if self.dim is None or len(q) != self.dim:
+                return []
+            code = self._owner_codes.get(owner) if owner is not None else None
+            if owner is not None and code is None:
+                return []
+            snap = self._snap
+            n = len(self._d_ids)
+            d_vectors, d_owners, d_ids = self._d_vectors[:n], self._d_owners[:n], self._d_ids[:n]
+            removed = set(self._removed)
+            if exclude is not None:
+                removed.add(exclude)
+        want = k + len(removed)
+
+        hits: List[Hit] = []
+        if snap.count:
+            rows = self._candidate_rows(snap, q, code)
+            scores = _score(snap.vectors, rows, q)
+            for i in _top(scores, want):
+                hits.append((ObjectId(snap.ids[rows[i]].tobytes()), float(scores[i])))
+        if n:
+            rows = np.flatnonzero(d_owners == code) if code is not None else np.arange(n)
+            scores = d_vectors[rows].astype("float32") @ q
+            for i in _top(scores, want):
+                hits.append((d_ids[rows[i]], float(scores[i])))
+
+        hits = [h for h in hits if h[0] not in removed]
+        hits.sort(key=lambda h: h[1], reverse=True)
+        return hits[:k]
+
+    def _candidate_rows(self, snap: _Snapshot, q: "np.ndarray", code: Optional[int]) -> "np.ndarray":
+        """Snapshot rows to score: the owner's rows, narrowed to the nearest IVF lists when there are many."""
+        rows = np.flatnonzero(snap.owners == code) if code is not None else None
+        total = len(rows) if rows is not None else snap.count
+        if snap.centroids is None or total <= self.ivf_min_rows:
+            return rows if rows is not None else np.arange(snap.count)
+        probe = _top(snap.centroids @ q, self.nprobe)
+        if rows is None:
+            return np.concatenate([np.arange(snap.offsets[l], snap.offsets[l + 1]) for l in probe])
+        lists = np.searchsorted(snap.offsets, rows, side="right") - 1
+        return rows[np.isin(lists, probe)]
+
+
+def _score(vectors: "np.ndarray", rows: "np.ndarray", q: "np.ndarray") -> "np.ndarray":
+    """Dot products of q with vectors[rows], converting float16 -> float32 one chunk at a time."""
+    scores = np.empty(len(rows), dtype="float32")
+    for start in range(0, len(rows), _CHUNK):
+        chunk = rows[start:start + _CHUNK]
+        if chunk[-1] - chunk[0] + 1 == len(chunk):  # contiguous (an IVF list, or everything)
+            block = vectors[chunk[0]:chunk[-1] + 1]
+        else:
+            block = vectors[chunk]
+        scores[start:start + len(chunk)] = block.astype("float32") @ q
+    return scores
+
+
+_indexes: Dict[str, SimilarityIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_similarity_index(version: str) -> SimilarityIndex:
+    """This process's index for one modelVersion (the two most recently used are kept)."""
+    with _indexes_lock:
+        index = _indexes.pop(version, None) or SimilarityIndex(version)
+        _indexes[version] = index
+        while len(_indexes) > 2:
+            _indexes.pop(next(iter(_indexes)))
+        return index
+
+
+def forget(*scan_ids: ObjectId) -> None:
+    """Tombstone deleted scans in every open index."""
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.remove(*scan_ids)
+
+
+# ---------------- building ---------------- #
+def _kmeans(vectors: "np.ndarray", lists: int, iterations: int = 10, seed: int = 0) -> "np.ndarray":
+    """Spherical k-means centroids (lists, dim) from a sample of the rows."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_rows = np.sort(rng.choice(n, size=min(n, lists * 64), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype="float32")
+    centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for j in range(lists):
+            members = sample[assign == j]
+            c = members.sum(axis=0) if len(members) else sample[rng.integers(len(sample))]
+            norm = np.linalg.norm(c)
+            centroids[j] = c / norm if norm > 0 else c
+    return centroids
+
+
+def write_snapshot(
+    path: str,
+    rows: Iterable[Tuple[ObjectId, ObjectId, Any]],
+    count: int,
+    dim: int,
+    lists: int = 0,
+) -> int:
+    """
+    Write up to `count` (scan id, owner, embedding) rows, in _id order, as
+    a snapshot at `path`, replacing any previous one atomically (readers
+    keep their open maps). With lists > 0 the rows are grouped by IVF
+    list. Returns the number of rows written.
+    """
+    from numpy.lib.format import open_memmap
+
+    tmp = path + ".building"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    vectors = open_memmap(os.path.join(tmp, "vectors.npy"), mode="w+", dtype="<f2", shape=(count, dim))
+    ids = open_memmap(os.path.join(tmp, "ids.npy"), mode="w+", dtype="uint8", shape=(count, 12))
+    owners = open_memmap(os.path.join(tmp, "owners.npy"), mode="w+", dtype="int32", shape=(count,))
+    codes: Dict[ObjectId, int] = {}
+    written, last_id = 0, None
+    for scan_id, owner, embedding in rows:
+        if written == count:
+            break
+        vec = _vector(embedding)
+        if len(vec) != dim:
+            continue
+        vectors[written] = vec
+        ids[written] = np.frombuffer(scan_id.binary, dtype="uint8")
+        owners[written] = codes.setdefault(owner, len(codes))
+        written, last_id = written + 1, scan_id
+
+    meta = {"version": os.path.basename(path), "dim": dim, "count": written,
+            "lastId": str(last_id) if last_id else None, "lists": 0,
+            "owners": [str(o) for o in sorted(codes, key=codes.get)]}
+    if lists and written > lists:
+        centroids = _kmeans(vectors[:written], lists)
+        assign = np.concatenate([
+            np.argmax(np.asarray(vectors[s:s + _CHUNK], dtype="float32") @ centroids.T, axis=1)
+            for s in range(0, written, _CHUNK)
+        ])
+        order = np.argsort(assign, kind="stable")
+        for name, arr in (("vectors.npy", vectors), ("ids.npy", ids), ("owners.npy", owners)):
+            grouped = open_memmap(os.path.join(tmp, "grouped-" + name), mode="w+", dtype=arr.dtype,
+                                  shape=(written,) + arr.shape[1:])
+            for s in range(0, written, _CHUNK):
+                grouped[s:s + _CHUNK] = arr[order[s:s + _CHUNK]]
+            grouped.flush()
+            del grouped
+            os.replace(os.path.join(tmp, "grouped-" + name), os.path.join(tmp, name))
+        np.save(os.path.join(tmp, "centroids.npy"), centroids)
+        np.save(os.path.join(tmp, "offsets.npy"),
+                np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=lists))]).astype("int64"))
+        meta["lists"] = lists
+    else:
+        for arr in (vectors, ids, owners):
+            arr.flush()
+    del vectors, ids, owners
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    old = path + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return written
+
+
+def build(version: str, root: str = SIMILARITY_DIR, lists: Optional[int] = None) -> int:
+    """
+    Snapshot every scan of `version` that has an embedding. IVF lists
+    default to ~sqrt(N) once N passes SIMILARITY_IVF_MIN_ROWS (0 = never).
+    """
+    db = get_db()
+    query = {"modelVersion": version, "embedding": {"$exists": True}}
+    first = db.scans.find_one(query, {"embedding": 1})
+    if first is None:
+        print(f"[similar] no scans of {version} have embeddings")
+        return 0
+    count = db.scans.count_documents(query)
+    if lists is None:
+        lists = int(math.sqrt(count)) if count > SIMILARITY_IVF_MIN_ROWS else 0
+
+    def rows() -> Iterator[Tuple[ObjectId, ObjectId, Any]]:
+        for doc in db.scans.find(query, {"userId": 1, "embedding": 1}).sort("_id", 1).batch_size(5000):
+            yield doc["_id"], doc["userId"], doc["embedding"]
+
+    written = write_snapshot(_version_dir(root, version), rows(), count, len(_vector(first["embedding"])), lists)
+    print(f"[similar] {version}: indexed {written} scans" + (f" in {lists} IVF lists" if lists else ""))
+    return written
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the similar-scans index.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("build", help="snapshot scan embeddings for one model version")
+    p.add_argument("--version", help="modelVersion to index (default: the configured model)")
+    p.add_argument("--lists", type=int, help="IVF lists (default: sqrt(N) past SIMILARITY_IVF_MIN_ROWS, 0 = none)")
+    args = parser.parse_args(argv)
+
+    if args.version:
+        version = args.version
+    else:
+        from ml_service import get_model_version
+
+        version = get_model_version()
+    build(version, lists=args.lists)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
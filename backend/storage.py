@@ -1,12 +1,25 @@
 # Handles file uploads and saving them locally.
 
+import hashlib
 import os
-import uuid
-from datetime import datetime
+import tempfile
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
 from fastapi import UploadFile, HTTPException, status
+from db import get_db
+from image_check import ImageCheck, ImageRejected, as_http, rejection
 from settings import UPLOAD_DIR, MAX_UPLOAD_MB
 
 ALLOWED_MIME = {"image/jpeg": ".jpg", "image/png": ".png"}
+MAGIC_BYTES = ((b"\xff\xd8\xff", ".jpg"), (b"\x89PNG\r\n\x1a\n", ".png"))
+CHUNK_SIZE = 64 * 1024
+TEMP_PREFIX = ".upload-"  # in-progress writes; renamed away on success
+
+
+class StoredUpload(NamedTuple):
+    path: str     # relative path for static serving
+    sha256: str   # hex digest of the file bytes
+    size: int     # bytes
 
 
 def ensure_upload_dir() -> None:
@@ -14,36 +27,159 @@ def ensure_upload_dir() -> None:
     os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
-def save_upload(file: UploadFile) -> str:
-    """Save an uploaded image to /uploads and return its relative path."""
-    if file.content_type not in ALLOWED_MIME:
-        raise HTTPException(
-            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
-            detail="Only .jpg and .png images are allowed",
-        )
+def _lookup_blob(digest: str) -> Optional[str]:
+    """Return the stored path for identical bytes uploaded earlier, if still on disk."""
+    doc = get_db().blobs.find_one({"_id": digest}, {"path": 1})
+    if not doc:
+        return None
+    try:
+        os.utime(doc["path"])  # re-used now: restart the upload GC grace period
+    except FileNotFoundError:
+        return None
+    return doc["path"]
+
+
+def _register_blob(digest: str, path: str, size: int) -> None:
+    get_db().blobs.update_one(
+        {"_id": digest},
+        {"$set": {"path": path, "size": size, "updatedAt": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+
+def _sniff_ext(head: bytes) -> Optional[str]:
+    """Map leading magic bytes to a file extension, or None if not JPEG/PNG."""
+    for magic, ext in MAGIC_BYTES:
+        if head.startswith(magic):
+            return ext
+    return None
+
+
+def _reject_type() -> HTTPException:
+    return rejection("type", status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, "Only .jpg and .png images are allowed")
+
+
+class UploadBytes(NamedTuple):
+    data: bytes   # full file contents (at most MAX_UPLOAD_MB)
+    sha256: str   # hex digest of `data`
+    ext: str      # ".jpg" or ".png", from the magic bytes
+
+
+def _too_large() -> HTTPException:
+    return rejection("size", status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"Max file size is {MAX_UPLOAD_MB} MB")
 
-    # Read file bytes and check size
-    contents = file.file.read()
-    size_mb = len(contents) / (1024 * 1024)
-    if size_mb > MAX_UPLOAD_MB:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"Max file size is {MAX_UPLOAD_MB} MB",
-        )
 
+def _iter_file(file: UploadFile) -> Iterator[bytes]:
+    while True:
+        chunk = file.file.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _checked_chunks(chunks: Iterable[bytes]) -> Iterator[Tuple[bytes, str]]:
+    """
+    Yield (chunk, ext) while enforcing the type sniff on the first chunk,
+    MAX_UPLOAD_MB on the running total and the header-only image checks
+    (image_check.py), stopping as soon as any fails. The trailer is
+    checked after the last chunk has been yielded.
+    """
+    limit = MAX_UPLOAD_MB * 1024 * 1024
+    size = 0
+    ext: Optional[str] = None
+    check: Optional[ImageCheck] = None
+    try:
+        for chunk in chunks:
+            if ext is None:
+                ext = _sniff_ext(chunk)
+                if ext is None:
+                    raise _reject_type()
+                check = ImageCheck(ext)
+            size += len(chunk)
+            if size > limit:
+                raise _too_large()
+            check.feed(chunk)
+            yield chunk, ext
+        if check is None:  # empty body
+            raise _reject_type()
+        check.finish()
+    except ImageRejected as e:
+        raise as_http(e) from None
+
+
+def _store_chunks(chunks: Iterable[bytes], digest: Optional[str] = None) -> StoredUpload:
+    """
+    Copy chunks into a temp file inside the target uploads/YYYY/MM/ folder,
+    hashing on the way (unless the digest is already known), and rename it
+    into place once complete so readers never see a partial file.
+    """
     # Build folder path: /uploads/YYYY/MM/
     now = datetime.utcnow()
     subdir = os.path.join(UPLOAD_DIR, f"{now.year:04d}", f"{now.month:02d}")
     os.makedirs(subdir, exist_ok=True)
 
-    # Create unique filename
-    ext = ALLOWED_MIME[file.content_type]
-    filename = f"{uuid.uuid4().hex}{ext}"
-    path = os.path.join(subdir, filename)
+    fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=".part", dir=subdir)
+    hasher = hashlib.sha256() if digest is None else None
+    size = 0
+    ext = ""
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk, ext in _checked_chunks(chunks):
+                size += len(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                out.write(chunk)
+
+        if hasher is not None:
+            digest = hasher.hexdigest()
+        existing = _lookup_blob(digest)
+        if existing:
+            os.remove(tmp_path)
+            return StoredUpload(existing, digest, size)
 
-    # Write file to disk
-    with open(path, "wb") as f:
-        f.write(contents)
+        # Name the file after its content so duplicates collapse to one copy
+        path = os.path.join(subdir, f"{digest}{ext}")
+        os.chmod(tmp_path, 0o644)  # mkstemp creates 0600
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
     # Normalize path for static serving
-    return path.replace("\\", "/")
+    path = path.replace("\\", "/")
+    _register_blob(digest, path, size)
+    return StoredUpload(path, digest, size)
+
+
+def save_upload(file: UploadFile) -> StoredUpload:
+    """
+    Stream an uploaded image to /uploads and return its relative path and hash.
+
+    The body is copied in CHUNK_SIZE pieces, so memory use per upload is
+    constant. The type comes from the file's magic bytes, not the
+    client-supplied content_type. Identical bytes are stored once: a
+    re-upload returns the existing path.
+    """
+    return _store_chunks(_iter_file(file))
+
+
+def read_upload(file: UploadFile) -> UploadBytes:
+    """
+    Read an upload into memory with the same type and size checks as
+    save_upload, for callers that decode it before (or while) it is stored.
+    """
+    hasher = hashlib.sha256()
+    buf = bytearray()
+    ext = ""
+    for chunk, ext in _checked_chunks(_iter_file(file)):
+        hasher.update(chunk)
+        buf += chunk
+    return UploadBytes(bytes(buf), hasher.hexdigest(), ext)
+
+
+def save_upload_bytes(upload: UploadBytes) -> StoredUpload:
+    """Store bytes previously returned by read_upload."""
+    data = upload.data
+    chunks = (data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+    return _store_chunks(chunks, digest=upload.sha256)
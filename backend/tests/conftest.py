@@ -12,18 +12,27 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+# Keep uploads small & isolated for tests (set BEFORE settings/app import)
+os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="uploads_")
+os.environ["MAX_UPLOAD_MB"] = "2"  # 2MB limit for tests
+os.environ["SIMILARITY_DIR"] = tempfile.mkdtemp(prefix="similarity_")
+os.environ["INFERENCE_EXECUTOR"] = "thread"  # fake model must live in this process
+os.environ["MONGO_ASYNC_DRIVER"] = "threadpool"  # routes reach mongomock through get_db()
+
 from main import app          # now resolvable
 import db as dbmod
+import ml_service
+from benchmarks.harness import FakeModel, make_image_bytes  # shared with the benchmarks
 
-# Keep uploads small & isolated for tests (set BEFORE TestClient/app init)
-os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="uploads_")
-os.environ["MAX_UPLOAD_MB"] = "2"  # 2MB limit for tests
 
 @pytest.fixture(scope="session", autouse=True)
 def _mock_db():
     """Replace get_db() with an in-memory Mongo client BEFORE app lifespan runs."""
     client = mongomock.MongoClient()
-    testdb = client["test_db"]
+    testdb = client[dbmod.DB_NAME]
+    # Modules that did `from db import get_db` go through get_client(), so
+    # seed the cached client as well as patching the module attribute.
+    dbmod._client = client
     dbmod.get_db = lambda: testdb
     # Create indexes just like the app does
     import db as _db
@@ -31,11 +40,37 @@ def _mock_db():
     yield
     client.close()
 
+
 @pytest.fixture(scope="session")
 def client(_mock_db):  # depend on _mock_db to guarantee order
     return TestClient(app)
 
+
+@pytest.fixture()
+def fake_model():
+    labels = ml_service.get_labels()
+    model = FakeModel(len(labels))
+    registry = ml_service.get_registry()
+    registry.install(model, version="fake-1", labels=labels)
+    yield model
+    registry.reset()
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    client.post(
+        "/api/v1/auth/register",
+        json={"name": "Scanner", "email": "scanner@test.com", "password": "secret12"},
+    )
+    r = client.post(
+        "/api/v1/auth/login",
+        json={"email": "scanner@test.com", "password": "secret12"},
+    )
+    return {"Authorization": f"Bearer {r.json()['accessToken']}"}
+
+
 @pytest.fixture(scope="session", autouse=True)
 def _cleanup_uploads():
     yield
     shutil.rmtree(os.environ["UPLOAD_DIR"], ignore_errors=True)
+    shutil.rmtree(os.environ["SIMILARITY_DIR"], ignore_errors=True)
@@ -0,0 +1,43 @@
+# backend/tests/test_async_db.py
+import asyncio
+from types import SimpleNamespace
+
+from pymongo import MongoClient
+
+import metrics
+from async_db import get_async_db
+from db import client_options
+
+
+def test_threadpool_driver_is_awaitable_and_applies_concerns():
+    async def roundtrip():
+        adb = get_async_db()
+        await adb.gc_queue.insert_one({"_id": "probe"})
+        found = await adb.gc_queue.find({"_id": "probe"}).to_list(None)
+        await adb.gc_queue.delete_one({"_id": "probe"})
+        return adb, found
+
+    adb, found = asyncio.run(roundtrip())
+    assert found == [{"_id": "probe"}]
+    assert adb.gc_queue._collection.write_concern.document == {"w": 1}
+
+
+def test_pool_monitor_tracks_checkouts():
+    monitor = metrics.MongoPoolMonitor("test")
+    monitor.connection_created(SimpleNamespace())
+    monitor.connection_checked_out(SimpleNamespace(duration=0.002))
+    assert 'riceguard_mongo_pool_in_use{client="test"} 1.0' in metrics.MONGO_POOL_IN_USE.samples()
+    monitor.connection_checked_in(SimpleNamespace())
+    monitor.connection_check_out_failed(SimpleNamespace(duration=2.0, reason="timeout"))
+    assert 'riceguard_mongo_pool_in_use{client="test"} 0.0' in metrics.MONGO_POOL_IN_USE.samples()
+    assert any('reason="timeout"' in line for line in metrics.MONGO_POOL_CHECKOUT_FAILURES.samples())
+
+
+def test_client_options_are_accepted_by_pymongo():
+    options = client_options("sync")
+    client = MongoClient("mongodb://127.0.0.1:1", connect=False, **options)
+    try:
+        assert client.options.pool_options.max_pool_size == options["maxPoolSize"]
+        assert client.options.pool_options.min_pool_size == options["minPoolSize"]
+    finally:
+        client.close()
@@ -0,0 +1,112 @@
+# backend/tests/test_auth.py
+import time
+
+import security
+from security import VerifiedTokenCache, create_access_token, decode_token
+
+
+def test_repeat_token_skips_jwt_decode(monkeypatch):
+    token, _ = create_access_token("64b7f0c2a1b2c3d4e5f60718")
+    first = decode_token(token)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("jwt.decode should not run for a cached token")
+
+    monkeypatch.setattr(security.jwt, "decode", fail)
+    assert decode_token(token) is first
+
+
+def test_repeat_token_reuses_parsed_claims(monkeypatch):
+    import routers
+
+    token, _ = create_access_token("64b7f0c2a1b2c3d4e5f60718", {"email": "a@b.c"})
+    first = routers.claims_from_token(token)
+
+    def fail(**kwargs):
+        raise AssertionError("JWTClaims should not be rebuilt for a cached token")
+
+    monkeypatch.setattr(routers, "JWTClaims", fail)
+    assert routers.claims_from_token(token) is first
+    assert first.sub == "64b7f0c2a1b2c3d4e5f60718" and first.email == "a@b.c"
+
+
+def test_cache_is_bounded_and_expiry_aware():
+    cache = VerifiedTokenCache(max_entries=2)
+    now = time.time()
+    cache.put("expired", {"sub": "a", "exp": now - 1})
+    cache.put("t1", {"sub": "b", "exp": now + 60})
+    cache.put("t2", {"sub": "c", "exp": now + 60})
+    cache.put("t3", {"sub": "d", "exp": now + 60})
+
+    assert cache.get("expired") is None
+    assert cache.get("t1") is None  # evicted as least recently used
+    assert cache.get("t3")["sub"] == "d"
+
+
+def test_tampered_token_is_rejected(client):
+    token, _ = create_access_token("64b7f0c2a1b2c3d4e5f60718")
+    r = client.get("/api/v1/scans", headers={"Authorization": f"Bearer {token}x"})
+    assert r.status_code == 401
+
+
+def test_hashing_pool_rejects_when_saturated():
+    import asyncio
+    import threading
+
+    from security import HashingBusy, PasswordHasher
+
+    hasher = PasswordHasher(workers=1, max_queue=0)
+    gate = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(hasher._run(gate.wait))
+        await asyncio.sleep(0)
+        try:
+            await hasher.hash("secret12")
+        except HashingBusy:
+            return True
+        finally:
+            gate.set()
+            await running
+        return False
+
+    assert asyncio.run(scenario())
+    hasher.shutdown()
+
+
+def test_login_returns_503_with_retry_after_when_busy(client, monkeypatch):
+    import routers
+    from security import HashingBusy
+
+    class Busy:
+        async def verify_and_update(self, *args):
+            raise HashingBusy()
+
+    client.post(
+        "/api/v1/auth/register",
+        json={"name": "Storm", "email": "storm@test.com", "password": "secret12"},
+    )
+    monkeypatch.setattr(routers, "get_password_hasher", lambda: Busy())
+    r = client.post("/api/v1/auth/login", json={"email": "storm@test.com", "password": "secret12"})
+    assert r.status_code == 503
+    assert r.headers["retry-after"]
+
+
+def test_login_rehashes_when_cost_is_off_target(client, monkeypatch):
+    import db as dbmod
+    from passlib.context import CryptContext
+
+    old = CryptContext(schemes=["bcrypt_sha256"], bcrypt_sha256__default_rounds=4).hash("secret12")
+    dbmod.get_db().users.insert_one({"name": "Legacy", "email": "legacy@test.com", "passwordHash": old})
+
+    saved = security.pwd_context.to_dict()
+    monkeypatch.setattr(security, "BCRYPT_ROUNDS", 6)
+    try:
+        assert security.calibrate_password_hashing() == 6
+        r = client.post("/api/v1/auth/login", json={"email": "legacy@test.com", "password": "secret12"})
+        assert r.status_code == 200
+    finally:
+        security.pwd_context.load(saved)
+
+    stored = dbmod.get_db().users.find_one({"email": "legacy@test.com"})["passwordHash"]
+    assert stored != old and ",r=6$" in stored
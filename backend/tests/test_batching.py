@@ -0,0 +1,147 @@
+# backend/tests/test_batching.py
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import inference_pool
+import ml_service
+from batching import MicroBatcher
+from conftest import make_image_bytes
+
+
+def _fake_predict(calls):
+    def predict(batch):
+        calls.append(batch.shape[0])
+        # one "probability" row per image: its mean pixel value in slot 0
+        out = np.zeros((batch.shape[0], 2), dtype="float32")
+        out[:, 0] = batch.reshape(batch.shape[0], -1).mean(axis=1)
+        out[:, 1] = 1.0 - out[:, 0]
+        return out
+    return predict
+
+
+def test_concurrent_submits_are_batched_and_routed_back():
+    calls = []
+    batcher = MicroBatcher(_fake_predict(calls), max_batch_size=8, max_wait_ms=200)
+    results = {}
+    start = threading.Barrier(8)
+
+    def worker(i):
+        start.wait()
+        tensor = np.full((4, 4, 3), i / 10.0, dtype="float32")
+        results[i] = batcher.predict(tensor)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+
+    assert sum(calls) == 8
+    assert len(calls) < 8
+    for i, row in results.items():
+        assert np.isclose(row[0], i / 10.0)
+
+
+def test_batch_failure_propagates_to_every_caller():
+    calls = []
+
+    def boom(batch):
+        calls.append(batch.shape[0])
+        raise RuntimeError("model exploded")
+
+    batcher = MicroBatcher(boom, max_batch_size=4, max_wait_ms=500)
+    futures = [batcher.submit(np.zeros((2, 2, 3), dtype="float32")) for _ in range(2)]
+    try:
+        for fut in futures:
+            with pytest.raises(RuntimeError, match="model exploded"):
+                fut.result(timeout=5)
+    finally:
+        batcher.close()
+    assert calls == [2]  # both callers were in the one failed batch
+
+
+def test_submit_racing_close_never_hangs():
+    for _ in range(50):
+        batcher = MicroBatcher(lambda batch: batch.reshape(batch.shape[0], -1), max_batch_size=4, max_wait_ms=0)
+        batcher.submit(np.zeros((1, 1, 1), dtype="float32")).result(timeout=5)  # worker running
+        accepted = []
+
+        def worker():
+            try:
+                accepted.append(batcher.submit(np.ones((1, 1, 1), dtype="float32")))
+            except RuntimeError:
+                pass  # closed first
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        batcher.close()
+        thread.join()
+        for fut in accepted:
+            assert fut.result(timeout=5)[0] == 1.0
+
+
+def test_postprocess_keeps_threshold_and_margin_rules():
+    labels = ["a", "b", "c"]
+    label, conf = ml_service._postprocess(np.array([0.9, 0.05, 0.05]), labels)
+    assert label == "a" and abs(conf - 0.9) < 1e-6
+    label, conf = ml_service._postprocess(np.array([0.5, 0.45, 0.05]), labels)
+    assert label == "uncertain"
+
+
+def test_process_executor_batches_concurrent_uploads(monkeypatch, fake_model):
+    # "process" is the default executor; the pool itself stays a thread pool
+    # here because the fake model lives in this process.
+    monkeypatch.setattr(inference_pool, "INFERENCE_EXECUTOR", "process")
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(inference_pool, "_executor", pool)
+    sizes = []
+    real = ml_service.predict_batch_bytes
+
+    def spy(items):
+        sizes.append(len(items))
+        return real(items)
+
+    monkeypatch.setattr(ml_service, "predict_batch_bytes", spy)
+    images = [make_image_bytes((20 * i, 100, 40)) for i in range(8)] + [b"not an image"]
+
+    async def main():
+        return await asyncio.gather(*(inference_pool.score_upload(d) for d in images), return_exceptions=True)
+
+    results = asyncio.run(main())
+    pool.shutdown()
+
+    assert sizes == [9]
+    for data, (label, confidence, info) in zip(images, results[:-1]):
+        expected, expected_conf, expected_info = ml_service.predict_bytes_timed(data)
+        assert (label, info["modelVersion"]) == (expected, "fake-1")
+        assert abs(confidence - expected_conf) < 1e-6
+        assert info["uncertainReason"] == expected_info["uncertainReason"]
+    assert isinstance(results[-1], ValueError)
+
+
+def test_dead_worker_is_replaced(monkeypatch):
+    import os
+    import signal
+
+    monkeypatch.setattr(inference_pool, "INFERENCE_EXECUTOR", "process")
+    monkeypatch.setattr(inference_pool, "INFERENCE_WORKERS", 1)
+    monkeypatch.setattr(inference_pool, "_executor", None)
+
+    async def main():
+        pid = await inference_pool.run_inference(os.getpid)
+        broken = inference_pool.get_executor()
+        os.kill(pid, signal.SIGKILL)
+        replacement = await inference_pool.run_inference(os.getpid)
+        return pid, replacement, broken
+
+    try:
+        pid, replacement, broken = asyncio.run(main())
+        assert replacement != pid
+        assert inference_pool.get_executor() is not broken
+    finally:
+        inference_pool.shutdown_pool()
@@ -0,0 +1,23 @@
+# backend/tests/test_benchmarks.py
+import json
+
+from benchmarks import harness
+
+
+def test_summary_percentiles():
+    r = harness.summarize([float(i) for i in range(1, 101)], wall_seconds=2.0)
+    assert r["requests"] == 100 and r["rps"] == 50.0
+    assert r["p50_ms"] == 50.5
+    assert 95 < r["p95_ms"] < 96 and 99 < r["p99_ms"] < 100
+
+
+def test_baseline_comparison_flags_regressions(tmp_path):
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps({"scan": {"p95_ms": 100.0, "rps": 50.0}}))
+
+    ok = {"scan": {"p95_ms": 110.0, "rps": 45.0}}
+    assert harness.compare_to_baseline(path, ok, tolerance=0.2) == []
+
+    slow = {"scan": {"p95_ms": 150.0, "rps": 30.0}}
+    flagged = harness.compare_to_baseline(path, slow, tolerance=0.2)
+    assert [name for name, _ in flagged] == ["scan", "scan"]
@@ -0,0 +1,75 @@
+# backend/tests/test_fast_json.py
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import fast_json
+from models import ScanItem, ScanListOut
+
+DOCS = [
+    {
+        "_id": ObjectId("64b7f0c2a1b2c3d4e5f60718"),
+        "label": "leaf_blast",
+        "confidence": 0.912345678,
+        "modelVersion": "1.0",
+        "notes": "North paddy – row 3 \"edge\"\n",
+        "imageUrl": "/uploads/ab/cd.jpg",
+        "createdAt": datetime(2026, 5, 1, 8, 0, 0, 123000),
+    },
+    {  # legacy alias, integer confidence, missing notes
+        "_id": ObjectId("64b7f0c2a1b2c3d4e5f60719"),
+        "label": "blast",
+        "confidence": 1,
+        "modelVersion": "0.9",
+        "imageUrl": "/uploads/legacy.png",
+        "createdAt": datetime(2026, 5, 1, 8, 0, 0),
+    },
+    {
+        "_id": ObjectId("64b7f0c2a1b2c3d4e5f6071a"),
+        "label": "uncertain",
+        "confidence": None,
+        "modelVersion": "1.0",
+        "notes": None,
+        "imageUrl": "/uploads/ef.jpg",
+        "createdAt": datetime(2025, 12, 31, 23, 59, 59, 999000),
+    },
+]
+
+
+def _pydantic_body(docs, next_cursor):
+    out = ScanListOut(items=[ScanItem.from_dict(d) for d in docs], nextCursor=next_cursor)
+    return JSONResponse(jsonable_encoder(out)).body
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "orjson":
+        if fast_json.orjson is None:
+            pytest.skip("orjson not installed")
+    else:
+        monkeypatch.setattr(fast_json, "orjson", None)
+    return request.param
+
+
+@pytest.mark.parametrize("next_cursor", [None, "eyJ0IjoxfQ"])
+def test_bytes_match_pydantic_rendering(encoder, next_cursor):
+    assert fast_json.scan_list_body(DOCS, next_cursor) == _pydantic_body(DOCS, next_cursor)
+
+
+def test_empty_page(encoder):
+    assert fast_json.scan_list_body([]) == b'{"items":[],"nextCursor":null}' == _pydantic_body([], None)
+
+
+def test_unknown_label_still_rejected():
+    with pytest.raises(ValueError):
+        fast_json.scan_list_body([dict(DOCS[0], label="rust")])
+
+
+def test_list_endpoint_serves_fast_path(client, auth_headers):
+    r = client.get("/api/v1/scans", headers=auth_headers, params={"limit": 2})
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/json"
+    ScanListOut.parse_raw(r.content)  # still the documented schema
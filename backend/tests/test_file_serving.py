@@ -0,0 +1,78 @@
+# backend/tests/test_file_serving.py
+import os
+
+import pytest
+
+from conftest import make_image_bytes
+from file_serving import parse_range
+from settings import UPLOAD_DIR
+
+
+@pytest.fixture()
+def stored(client, auth_headers, fake_model):
+    r = client.post(
+        "/api/v1/scans",
+        headers=auth_headers,
+        files={"file": ("leaf.jpg", make_image_bytes((9, 99, 199), size=(320, 240)), "image/jpeg")},
+    )
+    path = r.json()["imageUrl"]
+    with open(path, "rb") as f:
+        data = f.read()
+    return "/uploads/" + os.path.relpath(path, UPLOAD_DIR).replace(os.sep, "/"), data
+
+
+def test_content_addressed_upload_is_immutable(client, stored):
+    url, data = stored
+    r = client.get(url)
+    assert r.status_code == 200 and r.content == data
+    sha = os.path.splitext(os.path.basename(url))[0]
+    assert r.headers["etag"] == f'"{sha}"'
+    assert "immutable" in r.headers["cache-control"]
+    assert r.headers["accept-ranges"] == "bytes"
+
+    again = client.get(url, headers={"If-None-Match": r.headers["etag"]})
+    assert again.status_code == 304 and again.content == b""
+
+
+def test_range_requests(client, stored):
+    url, data = stored
+    r = client.get(url, headers={"Range": "bytes=10-19"})
+    assert r.status_code == 206
+    assert r.content == data[10:20]
+    assert r.headers["content-range"] == f"bytes 10-19/{len(data)}"
+
+    assert client.get(url, headers={"Range": "bytes=-5"}).content == data[-5:]
+    assert client.get(url, headers={"Range": f"bytes={len(data)}-"}).status_code == 416
+    stale = client.get(url, headers={"Range": "bytes=0-0", "If-Range": '"other"'})
+    assert stale.status_code == 200 and stale.content == data
+
+
+def test_parse_range_edge_cases():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9,20-29", 100) is None  # multi-range: serve it all
+    assert parse_range("bytes=90-200", 100) == (90, 99)
+    assert parse_range("bytes=-500", 100) == (0, 99)
+    with pytest.raises(ValueError):
+        parse_range("bytes=5-1", 100)
+
+
+def test_zerocopy_send_when_server_supports_it(tmp_path):
+    import asyncio
+
+    from starlette.datastructures import Headers
+
+    from file_serving import ZEROCOPY, CachedFileResponse
+
+    path = tmp_path / ("a" * 64 + ".jpg")
+    path.write_bytes(b"0123456789")
+    response = CachedFileResponse(str(path), path.stat(), Headers({"range": "bytes=2-5"}))
+    messages = []
+
+    async def send(message):
+        if message["type"] == ZEROCOPY:
+            message = {**message, "file": message["file"].name}
+        messages.append(message)
+
+    asyncio.run(response({"type": "http", "extensions": {ZEROCOPY: {}}}, None, send))
+    assert messages[0]["status"] == 206
+    assert messages[1] == {"type": ZEROCOPY, "file": str(path), "offset": 2, "count": 4, "more_body": False}
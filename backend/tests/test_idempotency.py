@@ -0,0 +1,90 @@
+# backend/tests/test_idempotency.py
+import asyncio
+
+import pytest
+
+import db as dbmod
+from conftest import make_image_bytes
+from idempotency import IdempotencyStore, fingerprint
+from models import DiseaseKey, ScanItem
+
+
+def _post(client, headers, data, key=None, notes=None):
+    if key is not None:
+        headers = {**headers, "Idempotency-Key": key}
+    form = {"notes": notes} if notes else None
+    return client.post("/api/v1/scans", headers=headers, data=form, files={"file": ("leaf.jpg", data, "image/jpeg")})
+
+
+def test_retry_replays_the_first_scan(client, auth_headers, fake_model):
+    photo = make_image_bytes((31, 77, 12))
+    before = dbmod.get_db().scans.count_documents({})
+
+    first = _post(client, auth_headers, photo, key="retry-1")
+    again = _post(client, auth_headers, photo, key="retry-1")
+
+    assert first.status_code == again.status_code == 200
+    assert again.json() == first.json()
+    assert again.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert dbmod.get_db().scans.count_documents({}) == before + 1
+    assert fake_model.calls == 1
+
+
+def test_key_reused_for_another_request_is_422(client, auth_headers, fake_model):
+    assert _post(client, auth_headers, make_image_bytes((5, 6, 7)), key="reuse").status_code == 200
+    assert _post(client, auth_headers, make_image_bytes((8, 9, 10)), key="reuse").status_code == 422
+    assert _post(client, auth_headers, make_image_bytes((5, 6, 7)), key="reuse", notes="x").status_code == 422
+
+
+def test_bad_key_is_400(client, auth_headers):
+    assert _post(client, auth_headers, make_image_bytes(), key=" ").status_code == 400
+    assert _post(client, auth_headers, make_image_bytes(), key="k" * 300).status_code == 400
+
+
+def _item(n: int) -> ScanItem:
+    return ScanItem(
+        id=f"{n:024x}", label=DiseaseKey.HEALTHY, confidence=0.9, modelVersion="1.0",
+        imageUrl="/uploads/x.jpg", createdAt="2026-05-01T08:00:00",
+    )
+
+
+def test_concurrent_retry_waits_for_the_running_request():
+    store = IdempotencyStore()
+    calls = []
+
+    async def create():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return _item(len(calls))
+
+    async def both():
+        return await asyncio.gather(
+            store.run("u1", "k-concurrent", fingerprint("a"), create),
+            store.run("u1", "k-concurrent", fingerprint("a"), create),
+        )
+
+    (first, replayed_first), (second, replayed_second) = asyncio.run(both())
+    assert calls == [1]
+    assert first == second and first["id"] == _item(1).id
+    assert (replayed_first, replayed_second) == (False, True)
+
+    # later, from another worker's point of view: served from Mongo
+    response, replayed = asyncio.run(IdempotencyStore().run("u1", "k-concurrent", fingerprint("a"), create))
+    assert replayed and response == first and calls == [1]
+
+
+def test_failed_request_releases_the_key():
+    store = IdempotencyStore()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("model crashed")
+        return _item(7)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.run("u2", "k-flaky", fingerprint("b"), flaky))
+    response, replayed = asyncio.run(store.run("u2", "k-flaky", fingerprint("b"), flaky))
+    assert not replayed and response["id"] == _item(7).id and len(attempts) == 2
@@ -0,0 +1,109 @@
+# backend/tests/test_image_check.py
+import io
+import struct
+import zlib
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from starlette.datastructures import UploadFile
+
+import image_check
+import storage
+from conftest import make_image_bytes
+from image_check import ImageRejected, inspect_image
+
+
+def _png_declaring(width: int, height: int) -> bytes:
+    """A structurally valid PNG whose IHDR claims width x height (1 row of data)."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    idat = zlib.compress(b"\0" * (1 + 3 * min(width, 16)))
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", idat) + chunk(b"IEND", b"")
+
+
+def _exif_jpeg(size=(120, 80)) -> bytes:
+    buf = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x010F] = "PhoneCam"
+    Image.new("RGB", size, (10, 120, 30)).save(buf, format="JPEG", progressive=True, exif=exif)
+    return buf.getvalue()
+
+
+def _rejected_count(reason: str) -> float:
+    return image_check.UPLOADS_REJECTED._values.get((reason,), 0)
+
+
+def test_reads_dimensions_from_headers():
+    assert inspect_image(make_image_bytes(size=(64, 48)), ".jpg") == (64, 48)
+    assert inspect_image(_exif_jpeg((120, 80)), ".jpg") == (120, 80)
+    assert inspect_image(make_image_bytes(size=(30, 20), fmt="PNG"), ".png") == (30, 20)
+
+
+@pytest.mark.parametrize(
+    "data, ext, reason",
+    [
+        (_png_declaring(100_000, 100_000), ".png", "dimensions"),
+        (_png_declaring(10_000, 9_000), ".png", "pixels"),
+        (make_image_bytes(size=(64, 64))[:-200], ".jpg", "truncated"),
+        (make_image_bytes(size=(64, 64), fmt="PNG")[:-12], ".png", "truncated"),
+        (b"\xff\xd8\xff" + b"\x00" * 64, ".jpg", "malformed"),
+        (_png_declaring(10, 10).replace(b"IHDR", b"IHDX", 1), ".png", "malformed"),
+    ],
+)
+def test_rejects_before_decoding(data, ext, reason):
+    with pytest.raises(ImageRejected) as exc:
+        inspect_image(data, ext)
+    assert exc.value.reason == reason
+
+
+def test_bomb_upload_is_refused_without_reading_the_body():
+    before = _rejected_count("dimensions")
+    body = io.BytesIO(_png_declaring(60_000, 60_000) + b"\0" * (1024 * 1024))
+    with pytest.raises(HTTPException) as exc:
+        storage.save_upload(UploadFile(file=body, filename="bomb.png"))
+    assert exc.value.status_code == 413 and "60000x60000" in exc.value.detail
+    assert body.tell() <= storage.CHUNK_SIZE
+    assert _rejected_count("dimensions") == before + 1
+
+
+def test_scan_endpoint_returns_4xx_and_skips_the_model(client, auth_headers, fake_model):
+    truncated = make_image_bytes(size=(64, 64))[:-200]
+    r = client.post(
+        "/api/v1/scans",
+        headers=auth_headers,
+        files={"file": ("leaf.jpg", truncated, "image/jpeg")},
+    )
+    assert r.status_code == 422 and "truncated" in r.json()["detail"]
+
+    r = client.post(
+        "/api/v1/scans",
+        headers=auth_headers,
+        files={"file": ("leaf.png", _png_declaring(20_000, 20_000), "image/png")},
+    )
+    assert r.status_code == 413
+    assert fake_model.calls == 0
+
+
+def test_data_after_the_end_marker_is_accepted():
+    video = b"\x00\x00\x00\x18ftypmp42" + b"\x00" * 300_000  # motion-photo style trailer
+    assert inspect_image(make_image_bytes(size=(64, 48)) + video, ".jpg") == (64, 48)
+    assert inspect_image(make_image_bytes(size=(30, 20), fmt="PNG") + video, ".png") == (30, 20)
+
+    # streamed, with the EOI marker split across two chunks
+    jpeg = make_image_bytes(size=(64, 48))
+    split = len(jpeg) - 1
+    check = image_check.ImageCheck(".jpg")
+    for chunk in (jpeg[:1000], jpeg[1000:split], jpeg[split:] + video):
+        check.feed(chunk)
+    assert check.finish() == (64, 48)
+
+
+def test_end_marker_before_the_frame_header_does_not_count():
+    jpeg = make_image_bytes(size=(64, 64))
+    app1 = b"\xff\xe1" + struct.pack(">H", 2 + 8) + b"\xff\xd9" * 4  # e.g. an EXIF thumbnail's EOI
+    with pytest.raises(ImageRejected) as exc:
+        inspect_image(jpeg[:2] + app1 + jpeg[2:-200], ".jpg")
+    assert exc.value.reason == "truncated"
@@ -0,0 +1,54 @@
+# backend/tests/test_image_variants.py
+import io
+import os
+
+from PIL import Image
+
+import image_variants
+from conftest import make_image_bytes
+from settings import UPLOAD_DIR, THUMBNAIL_SIZE
+from upload_gc import UploadCollector
+
+
+def _scan(client, headers, photo):
+    r = client.post("/api/v1/scans", headers=headers, files={"file": ("leaf.jpg", photo, "image/jpeg")})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_scan_item_exposes_variant_urls(client, auth_headers, fake_model):
+    item = _scan(client, auth_headers, make_image_bytes((70, 120, 20), size=(800, 600)))
+    stem = os.path.splitext(item["imageUrl"])[0]
+    assert item["thumbnailUrl"] == f"{stem}.thumb.webp"
+    assert item["previewUrl"] == f"{stem}.preview.webp"
+
+    image_variants.render_variants(item["imageUrl"])
+    with Image.open(item["thumbnailUrl"]) as thumb:
+        assert thumb.format == "WEBP"
+        assert max(thumb.size) == THUMBNAIL_SIZE
+
+
+def test_missing_variant_is_rendered_on_first_request(client, auth_headers, fake_model):
+    item = _scan(client, auth_headers, make_image_bytes((71, 121, 21), size=(640, 480)))
+    image_variants.shutdown_variants()  # drop anything the background pool queued
+    for path in image_variants.existing_variants(item["imageUrl"]):
+        os.remove(path)
+
+    rel = os.path.relpath(item["previewUrl"], UPLOAD_DIR).replace(os.sep, "/")
+    r = client.get(f"/uploads/{rel}")
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(r.content)).size == (640, 480)  # never upscaled
+    assert client.get(f"/uploads/{rel.replace('.preview.', '.nope.')}").status_code == 404
+
+
+def test_variants_are_reclaimed_with_their_original(client, auth_headers, fake_model):
+    item = _scan(client, auth_headers, make_image_bytes((72, 122, 22)))
+    image_variants.render_variants(item["imageUrl"])
+    assert os.path.exists(item["thumbnailUrl"])
+
+    client.delete(f"/api/v1/scans/{item['id']}", headers=auth_headers)
+    UploadCollector(grace_seconds=0).drain_queue()
+    assert not os.path.exists(item["imageUrl"])
+    assert not os.path.exists(item["thumbnailUrl"])
+    assert not os.path.exists(item["previewUrl"])
@@ -0,0 +1,88 @@
+# backend/tests/test_metrics.py
+from types import SimpleNamespace
+
+import numpy as np
+
+import metrics
+import ml_service
+from conftest import make_image_bytes
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("t_seconds", "test", ["stage"], buckets=(0.1, 1.0))
+    h.observe(0.05, stage="a")
+    h.observe(0.5, stage="a")
+    h.observe(5.0, stage="a")
+    lines = h.samples()
+    assert 't_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="a",le="1.0"} 2' in lines
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 't_seconds_count{stage="a"} 3' in lines
+
+
+def test_classify_names_uncertain_reason():
+    labels = ["a", "b", "c"]
+    assert ml_service._classify(np.array([0.3, 0.3, 0.4]), labels)[2] == "low_confidence"
+    assert ml_service._classify(np.array([0.55, 0.45, 0.0]), labels)[2] == "small_margin"
+    assert ml_service._classify(np.array([0.9, 0.05, 0.05]), labels)[2] is None
+
+
+def test_mongo_listener_times_by_collection():
+    timer = metrics.MongoCommandTimer()
+    started = SimpleNamespace(command_name="find", command={"find": "scans"}, connection_id=("h", 1), request_id=7)
+    timer.started(started)
+    timer.succeeded(SimpleNamespace(command_name="find", connection_id=("h", 1), request_id=7, duration_micros=1500))
+    assert any(line.startswith('riceguard_mongo_seconds_count{collection="scans",command="find"}')
+               for line in metrics.MONGO_SECONDS.samples())
+
+
+def test_metrics_endpoint_reports_scan_stages(client, auth_headers, fake_model):
+    r = client.post(
+        "/api/v1/scans",
+        headers=auth_headers,
+        files={"file": ("leaf.jpg", make_image_bytes((12, 34, 56)), "image/jpeg")},
+    )
+    assert r.status_code == 200, r.text
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = r.text
+    for stage in ("read", "write", "decode", "predict", "insert"):
+        assert f'riceguard_scan_stage_seconds_count{{stage="{stage}"}}' in body
+    assert "riceguard_predictions_total{" in body
+    assert "riceguard_scans_in_flight 0.0" in body
+    assert "riceguard_model_loaded" in body
+
+
+def test_model_loaded_gauge_follows_process_workers(client, monkeypatch):
+    import os
+    import signal
+    import time
+
+    import inference_pool
+
+    monkeypatch.setattr(inference_pool, "INFERENCE_EXECUTOR", "process")
+    monkeypatch.setattr(inference_pool, "INFERENCE_WORKERS", 1)
+    monkeypatch.setattr(inference_pool, "_executor", None)
+    monkeypatch.setattr(inference_pool, "_probe", None)
+
+    def scrape_until(value):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if f"riceguard_model_loaded {value}" in client.get("/metrics").text:
+                return True
+            time.sleep(0.05)
+        return False
+
+    try:
+        pid = inference_pool.get_executor().submit(os.getpid).result()
+        # startup reported ready, but these workers have no model file to load
+        inference_pool._workers_ready = True
+        assert scrape_until("0.0")
+
+        inference_pool._workers_ready = True  # as if the model had loaded lazily
+        os.kill(pid, signal.SIGKILL)
+        assert scrape_until("0.0")
+    finally:
+        inference_pool.shutdown_pool()
@@ -0,0 +1,39 @@
+# backend/tests/test_ml_backends.py
+import pytest
+
+import ml_backends
+import ml_service
+
+
+def test_unknown_backend_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ml_backends.load_backend("caffe2", tmp_path / "model.bin")
+
+
+def test_get_model_checks_output_size_against_labels(tmp_path, monkeypatch):
+    model_file = tmp_path / "model.onnx"
+    model_file.write_bytes(b"stub")
+
+    class WrongHead:
+        num_classes = 3
+
+        def predict(self, batch):
+            raise AssertionError("not called")
+
+    monkeypatch.setattr(ml_service, "MODEL_BACKEND", "onnx")
+    monkeypatch.setattr(ml_service, "MODEL_PATH", str(model_file))
+    monkeypatch.setattr(ml_service, "load_backend", lambda kind, path, num_threads=None: WrongHead())
+    ml_service.get_registry().reset()
+    with pytest.raises(RuntimeError, match="does not match labels"):
+        ml_service.get_model()
+    assert ml_service.get_registry().current() is None
+
+
+@pytest.mark.parametrize("fmt", ["tflite", "onnx"])
+def test_int8_without_calibration_fails_before_export(fmt, tmp_path):
+    import convert_model
+
+    out = tmp_path / f"model.int8.{fmt}"
+    with pytest.raises(SystemExit, match="--calib-dir"):
+        convert_model.main(["--src", str(tmp_path / "missing.h5"), fmt, "--int8", "--out", str(out)])
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,152 @@
+# backend/tests/test_model_registry.py
+import time
+
+import numpy as np
+import pytest
+
+import db as dbmod
+from benchmarks.harness import FakeModel
+from conftest import make_image_bytes
+from model_registry import LoadedModel, ModelRegistry
+
+LABELS = ["a", "b", "c"]
+
+
+class Backend(FakeModel):
+    def __init__(self, n_classes=3):
+        super().__init__(n_classes)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _registry(path, **kw):
+    def load(p):
+        return LoadedModel(Backend(), f"v{p.stat().st_size}", LABELS, path=p, fingerprint=str(p.stat().st_size))
+
+    return ModelRegistry(load, lambda: path, lambda p: str(p.stat().st_size), **kw)
+
+
+def test_swap_releases_the_old_model_after_its_last_lease(tmp_path):
+    path = tmp_path / "model.onnx"
+    path.write_bytes(b"1")
+    registry = _registry(path)
+
+    with registry.lease() as old:
+        assert old.version == "v1"
+        path.write_bytes(b"22")
+        registry.reload()
+        with registry.lease() as new:
+            assert new.version == "v2"
+        assert not old.backend.closed  # still scoring the in-flight request
+    assert old.backend.closed and not new.backend.closed
+    assert registry.current() is new
+
+
+def test_failed_warm_up_keeps_serving_the_current_model(tmp_path):
+    path = tmp_path / "model.onnx"
+    path.write_bytes(b"1")
+
+    def warm_up(model):
+        out = model.backend.predict(np.zeros((1, 4, 4, 3), dtype="float32"))
+        if model.version == "v3":  # e.g. an export with the wrong output head
+            raise RuntimeError(f"bad head {out.shape}")
+
+    registry = _registry(path, warm_up=warm_up)
+    serving = registry.active()
+    path.write_bytes(b"333")
+    with pytest.raises(RuntimeError):
+        registry.reload()
+    assert registry.current() is serving
+
+
+def test_reload_waits_for_the_file_to_settle(tmp_path):
+    path = tmp_path / "model.onnx"
+    path.write_bytes(b"1")
+    registry = _registry(path)
+    registry.active()
+
+    assert not registry.reload_if_changed()
+    path.write_bytes(b"22")
+    assert not registry.reload_if_changed()  # first sighting: may still be copying
+    path.write_bytes(b"333")
+    assert not registry.reload_if_changed()  # changed again
+    assert registry.reload_if_changed()
+    assert registry.current().version == "v3" and registry.swaps == 2
+
+
+def test_file_that_fails_to_load_is_not_retried_until_it_changes(tmp_path):
+    path = tmp_path / "model.onnx"
+    path.write_bytes(b"1")
+    loads = []
+
+    def warm_up(model):
+        loads.append(model.version)
+        if model.version == "v2":
+            raise RuntimeError("corrupt export")
+
+    registry = _registry(path, warm_up=warm_up)
+    registry.active()
+    path.write_bytes(b"22")
+    assert not registry.reload_if_changed()
+    with pytest.raises(RuntimeError):
+        registry.reload_if_changed()
+    for _ in range(3):
+        assert not registry.reload_if_changed()
+    assert loads == ["v1", "v2"]
+
+    path.write_bytes(b"333")  # a fixed file is picked up as usual
+    assert not registry.reload_if_changed()
+    assert registry.reload_if_changed() and registry.current().version == "v3"
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_watcher_restarts_after_an_unexpected_exit(tmp_path, monkeypatch):
+    path = tmp_path / "model.onnx"
+    path.write_bytes(b"1")
+    registry = _registry(path)
+    registry.active()
+    polls = []
+
+    def poll():
+        polls.append(1)
+        if len(polls) == 1:
+            raise SystemExit  # not an Exception: escapes the loop's handler
+        return False
+
+    monkeypatch.setattr(registry, "reload_if_changed", poll)
+    registry.start_watcher(0.01)
+    deadline = time.time() + 5
+    while len(polls) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    registry.stop_watcher()
+    assert len(polls) >= 3
+
+
+def test_shadow_model_never_serves(tmp_path):
+    path = tmp_path / "model.onnx"
+    candidate = tmp_path / "candidate.onnx"
+    path.write_bytes(b"1")
+    candidate.write_bytes(b"4444")
+    registry = _registry(path)
+
+    with pytest.raises(RuntimeError):
+        with registry.lease(shadow=True):
+            pass
+    registry.load_shadow(candidate)
+    with registry.lease(shadow=True) as shadow, registry.lease() as active:
+        assert (shadow.version, active.version) == ("v4", "v1")
+
+
+def test_scans_record_the_model_that_scored_them(client, auth_headers, fake_model):
+    r = client.post(
+        "/api/v1/scans",
+        headers=auth_headers,
+        data={"modelVersion": "9.9"},
+        files={"file": ("leaf.jpg", make_image_bytes((90, 12, 200)), "image/jpeg")},
+    )
+    assert r.status_code == 200
+    assert r.json()["modelVersion"] == "fake-1"
+    doc = dbmod.get_db().scans.find_one({"_id": dbmod.as_object_id(r.json()["id"])})
+    assert doc["modelVersion"] == "fake-1"
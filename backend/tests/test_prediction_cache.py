@@ -0,0 +1,46 @@
+# backend/tests/test_prediction_cache.py
+import os
+
+from conftest import make_image_bytes
+from prediction_cache import PredictionCache, get_prediction_cache
+
+
+def _upload(client, headers, data):
+    r = client.post(
+        "/api/v1/scans",
+        headers=headers,
+        files={"file": ("leaf.jpg", data, "image/jpeg")},
+    )
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_duplicate_upload_skips_inference_and_disk_write(client, auth_headers, fake_model):
+    data = make_image_bytes(color=(11, 22, 33))
+    first = _upload(client, auth_headers, data)
+    calls_after_first = fake_model.calls
+    before = get_prediction_cache().stats()
+
+    second = _upload(client, auth_headers, data)
+
+    assert fake_model.calls == calls_after_first
+    assert second["id"] != first["id"]
+    assert second["label"] == first["label"]
+    assert second["imageUrl"] == first["imageUrl"]
+    assert os.path.exists(first["imageUrl"])
+    after = get_prediction_cache().stats()
+    assert after["memoryHits"] == before["memoryHits"] + 1
+
+
+def test_lru_tier_is_bounded_and_falls_back_to_mongo():
+    cache = PredictionCache(max_entries=2)
+    for i in range(3):
+        cache.put(f"hash{i}", "v1", "healthy", 0.9, 5.0)
+    assert cache.stats()["entries"] == 2
+
+    # evicted from memory, still served by the persistent tier
+    assert cache.get("hash0", "v1") == ("healthy", 0.9)
+    assert cache.get("hash0", "v2") is None
+    stats = cache.stats()
+    assert stats["mongoHits"] == 1 and stats["misses"] == 1
+    assert stats["savedInferenceMs"] == 5.0
@@ -0,0 +1,26 @@
+# backend/tests/test_preprocess.py
+import numpy as np
+
+import ml_service
+from conftest import make_image_bytes
+
+
+def test_bytes_and_path_decode_to_the_same_tensor(tmp_path):
+    data = make_image_bytes(color=(200, 30, 90), size=(1600, 1200))
+    path = tmp_path / "leaf.jpg"
+    path.write_bytes(data)
+
+    from_path = ml_service._preprocess(str(path))
+    from_bytes = ml_service._preprocess(data)
+
+    size = ml_service.IMG_SIZE
+    assert from_bytes.shape == (1, size, size, 3)
+    assert from_bytes.dtype == np.float32
+    assert np.allclose(from_path, from_bytes)
+
+
+def test_decode_into_reused_thread_buffer():
+    buf = ml_service._tensor_buffer()
+    out = ml_service._preprocess(make_image_bytes(fmt="PNG"), out=buf)
+    assert out is buf
+    assert ml_service._tensor_buffer() is buf
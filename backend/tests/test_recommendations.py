@@ -0,0 +1,43 @@
+# backend/tests/test_recommendations.py
+from datetime import datetime, timezone
+
+import pytest
+
+import db as dbmod
+from recommendations import RecommendationCache, get_recommendation_cache
+from seed import seed_recommendations
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _seeded():
+    seed_recommendations()
+    get_recommendation_cache().load()
+
+
+def test_conditional_get_returns_304(client):
+    r = client.get("/api/v1/recommendations/brown_spot")
+    assert r.status_code == 200
+    assert r.json()["diseaseKey"] == "brown_spot"
+    etag = r.headers["etag"]
+    assert "max-age" in r.headers["cache-control"]
+
+    again = client.get("/api/v1/recommendations/brown_spot", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+
+
+def test_unknown_recommendation_is_404(client):
+    assert client.get("/api/v1/recommendations/uncertain").status_code == 404
+
+
+def test_new_version_is_picked_up_after_ttl():
+    cache = RecommendationCache(ttl_seconds=0)
+    before = cache.get("leaf_scald")
+
+    dbmod.get_db().recommendations.update_one(
+        {"diseaseKey": "leaf_scald"},
+        {"$set": {"version": "9.9", "updatedAt": datetime.now(timezone.utc)}},
+    )
+    after = cache.get("leaf_scald")
+    assert after.item.version == "9.9"
+    assert after.etag != before.etag
@@ -0,0 +1,147 @@
+# backend/tests/test_rescore.py
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+import db as dbmod
+import ml_service
+import rescore
+import scan_stats
+from conftest import make_image_bytes
+
+
+class _Collection:
+    """mongomock's bulk_write predates pymongo 4.11's UpdateOne; apply the ops one at a time."""
+
+    def __init__(self, coll):
+        self._coll = coll
+
+    def bulk_write(self, ops, ordered=True):
+        matched = sum(self._coll.update_one(op._filter, op._doc, upsert=op._upsert).matched_count for op in ops)
+        return SimpleNamespace(matched_count=matched)
+
+    def __getattr__(self, name):
+        return getattr(self._coll, name)
+
+
+class _Database:
+    def __init__(self, db):
+        self._db = db
+
+    def __getattr__(self, name):
+        return _Collection(getattr(self._db, name))
+
+
+@pytest.fixture(autouse=True)
+def _bulk_writes(monkeypatch):
+    monkeypatch.setattr(rescore, "get_db", lambda: _Database(dbmod.get_db()))
+
+
+def _nested(inc):
+    doc = {}
+    for path, n in inc.items():
+        node = doc
+        *parents, leaf = path.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = n
+    return doc
+
+
+def _expected(path):
+    (label, confidence, _, _), = ml_service.predict_tensors(ml_service._preprocess(path))[0]
+    return rescore.DiseaseKey.parse(label).value, confidence
+
+
+def test_rescore_updates_history_stats_and_resumes(tmp_path, fake_model):
+    db = dbmod.get_db()
+    user = ObjectId()
+    docs = []
+    for i, color in enumerate([(10, 10, 10), (200, 40, 40), (40, 200, 40), (1, 2, 3), (90, 90, 250)]):
+        path = tmp_path / f"{i}.jpg"
+        if i != 3:  # one scan whose image is gone
+            path.write_bytes(make_image_bytes(color))
+        docs.append({
+            "userId": user, "label": "healthy", "confidence": 0.5, "modelVersion": "old",
+            "imageUrl": str(path), "createdAt": datetime(2026, 4, 1 + i, 9, 0),
+        })
+    db.scans.insert_many(docs)
+    db.scan_stats.insert_one({"_id": user, "total": 5, "labels": {"healthy": 5}})
+
+    report = rescore.Rescorer(batch_size=2, workers=2, write_chunk=3, log_every=0).run(user)
+    assert (report.scanned, report.updated, report.failed) == (5, 4, 1)
+
+    stored = {d["imageUrl"]: d for d in db.scans.find({"userId": user})}
+    for i in (0, 1, 2, 4):
+        label, confidence = _expected(str(tmp_path / f"{i}.jpg"))
+        doc = stored[str(tmp_path / f"{i}.jpg")]
+        assert (doc["label"], doc["modelVersion"]) == (label, "fake-1")
+        assert abs(doc["confidence"] - confidence) < 1e-6
+    assert stored[str(tmp_path / "3.jpg")]["modelVersion"] == "old"
+
+    stats = db.scan_stats.find_one({"_id": user})
+    assert stats["total"] == 5 and sum(stats["labels"].values()) == 5
+    assert stats["labels"]["healthy"] == 5 - report.changed
+
+    # the checkpoint skips everything already scored; the failure is retried
+    again = rescore.Rescorer(log_every=0).run(user)
+    assert (again.scanned, again.failed) == (1, 1)
+    (tmp_path / "3.jpg").write_bytes(make_image_bytes((1, 2, 3)))
+    again = rescore.Rescorer(log_every=0).run(user)
+    assert (again.scanned, again.updated) == (1, 1)
+    assert rescore.Rescorer(log_every=0).run(user).scanned == 0
+
+
+def test_dry_run_writes_nothing(tmp_path, fake_model):
+    db = dbmod.get_db()
+    user = ObjectId()
+    path = tmp_path / "leaf.jpg"
+    path.write_bytes(make_image_bytes())
+    db.scans.insert_one({
+        "userId": user, "label": "healthy", "confidence": 0.5, "modelVersion": "old",
+        "imageUrl": str(path), "createdAt": datetime(2026, 4, 1),
+    })
+
+    report = rescore.Rescorer(dry_run=True, log_every=0).run(user)
+    assert report.updated == 1
+    assert db.scans.find_one({"userId": user})["modelVersion"] == "old"
+    assert db.rescore_state.find_one({"_id": f"fake-1:{user}"}) is None
+
+
+def test_scan_deleted_mid_run_keeps_stats(tmp_path, fake_model, monkeypatch):
+    db = dbmod.get_db()
+    user = ObjectId()
+    docs = []
+    for i in range(3):
+        path = tmp_path / f"{i}.jpg"
+        path.write_bytes(make_image_bytes((200, 40 * i, 40)))
+        docs.append({
+            "userId": user, "label": "leaf_scald", "confidence": 0.5, "modelVersion": "old",
+            "imageUrl": str(path), "createdAt": datetime(2026, 4, 1 + i, 9, 0),
+        })
+    db.scans.insert_many(docs)
+    for user_id, inc in scan_stats.stats_updates(docs).items():
+        db.scan_stats.insert_one({"_id": user_id, **_nested(inc)})
+
+    real = rescore.predict_tensors
+
+    def delete_then_predict(batch):
+        # the user deletes a scan between the read and the write
+        gone = db.scans.find_one_and_delete({"_id": docs[0]["_id"]})
+        for user_id, inc in scan_stats.stats_updates([gone], -1).items():
+            db.scan_stats.update_one({"_id": user_id}, {"$inc": inc})
+        return real(batch)
+
+    monkeypatch.setattr(rescore, "predict_tensors", delete_then_predict)
+    report = rescore.Rescorer(batch_size=8, log_every=0).run(user)
+    assert (report.scanned, report.updated) == (3, 2)
+
+    before = db.scan_stats.find_one({"_id": user})
+    scan_stats.rebuild(user)
+    after = db.scan_stats.find_one({"_id": user})
+    for doc in (before, after):
+        doc.pop("updatedAt", None)
+    assert {k: v for k, v in before["labels"].items() if v} == after["labels"]
+    assert before["total"] == after["total"] == 2
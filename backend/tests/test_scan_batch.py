@@ -0,0 +1,94 @@
+# backend/tests/test_scan_batch.py
+import threading
+import time
+
+import routers
+from conftest import make_image_bytes
+from metrics import SCANS_IN_FLIGHT
+
+
+def _files(*payloads):
+    return [("files", (name, data, mime)) for name, data, mime in payloads]
+
+
+def test_batch_scores_all_images_in_one_model_call(client, auth_headers, fake_model):
+    photos = [make_image_bytes((200 - i, 30 + i, 90)) for i in range(5)]
+    r = client.post(
+        "/api/v1/scans/batch",
+        headers=auth_headers,
+        files=_files(*[(f"leaf{i}.jpg", p, "image/jpeg") for i, p in enumerate(photos)]),
+        data={"notes": "plot 3"},
+    )
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["succeeded"] == 5 and body["failed"] == 0
+    assert fake_model.calls == 1
+    assert [res["filename"] for res in body["items"]] == [f"leaf{i}.jpg" for i in range(5)]
+    ids = {res["item"]["id"] for res in body["items"]}
+    assert len(ids) == 5
+    assert all(res["item"]["notes"] == "plot 3" for res in body["items"])
+
+    listed = client.get("/api/v1/scans", headers=auth_headers, params={"limit": 200}).json()["items"]
+    assert ids <= {s["id"] for s in listed}
+
+
+def test_batch_reports_per_file_errors(client, auth_headers, fake_model):
+    r = client.post(
+        "/api/v1/scans/batch",
+        headers=auth_headers,
+        files=_files(
+            ("good.jpg", make_image_bytes((1, 2, 3)), "image/jpeg"),
+            ("notes.txt", b"not an image", "text/plain"),
+            ("broken.jpg", b"\xff\xd8\xff" + b"\x00" * 64, "image/jpeg"),
+        ),
+    )
+    assert r.status_code == 200, r.text
+    items = r.json()["items"]
+    assert items[0]["status"] == 200 and items[0]["item"]["label"]
+    assert items[1]["status"] == 415 and items[1]["item"] is None
+    assert items[2]["status"] == 422 and "decode" in items[2]["error"]
+    assert r.json()["succeeded"] == 1
+
+
+def test_batch_rejects_too_many_files(client, auth_headers, monkeypatch):
+    import routers
+
+    monkeypatch.setattr(routers, "SCAN_BATCH_MAX_FILES", 1)
+    photo = make_image_bytes()
+    r = client.post(
+        "/api/v1/scans/batch",
+        headers=auth_headers,
+        files=_files(("a.jpg", photo, "image/jpeg"), ("b.jpg", photo, "image/jpeg")),
+    )
+    assert r.status_code == 400
+
+
+def test_batch_reads_are_bounded_and_counted_in_flight(client, auth_headers, fake_model, monkeypatch):
+    monkeypatch.setattr(routers, "SCAN_BATCH_READ_CONCURRENCY", 2)
+    lock = threading.Lock()
+    active, peak, in_flight = [0], [0], []
+    real_read = routers.read_upload
+
+    def read(f):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            in_flight.append(SCANS_IN_FLIGHT._values.get((), 0))
+        time.sleep(0.02)
+        try:
+            return real_read(f)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    monkeypatch.setattr(routers, "read_upload", read)
+    before = SCANS_IN_FLIGHT._values.get((), 0)
+    r = client.post(
+        "/api/v1/scans/batch",
+        headers=auth_headers,
+        files=_files(*[(f"leaf{i}.jpg", make_image_bytes((10 * i, 90, 40)), "image/jpeg") for i in range(6)]),
+    )
+    assert r.status_code == 200 and r.json()["succeeded"] == 6
+    assert peak[0] == 2
+    assert set(in_flight) == {before + 6}
+    assert SCANS_IN_FLIGHT._values.get((), 0) == before
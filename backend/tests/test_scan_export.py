@@ -0,0 +1,105 @@
+# backend/tests/test_scan_export.py
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import db as dbmod
+import scan_export
+from security import decode_token
+
+
+@pytest.fixture(scope="module")
+def export_user(client):
+    client.post(
+        "/api/v1/auth/register",
+        json={"name": "Coop", "email": "coop@test.com", "password": "secret12"},
+    )
+    token = client.post(
+        "/api/v1/auth/login",
+        json={"email": "coop@test.com", "password": "secret12"},
+    ).json()["accessToken"]
+    user_id = dbmod.as_object_id(decode_token(token)["sub"])
+
+    base = datetime(2026, 3, 1, 6, 0, 0)
+    labels = ["healthy", "brown_spot", "blast"]
+    dbmod.get_db().scans.insert_many([
+        {
+            "userId": user_id,
+            "label": labels[i % 3],
+            "confidence": 0.8,
+            "modelVersion": "1.0",
+            "notes": "=HYPERLINK(\"x\")" if i == 0 else f"plot {i}",
+            "imageUrl": f"uploads/2026/03/{i}.jpg",
+            "createdAt": base + timedelta(hours=i),
+        }
+        for i in range(12)
+    ])
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_ndjson_matches_the_list_endpoint(client, export_user):
+    r = client.get("/api/v1/scans/export", headers=export_user)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert "content-length" not in r.headers  # chunked
+    assert r.headers["content-disposition"].startswith("attachment;")
+
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    listed = client.get("/api/v1/scans", headers=export_user).json()["items"]
+    assert rows == listed and len(rows) == 12
+
+
+def test_csv_with_filters(client, export_user):
+    r = client.get(
+        "/api/v1/scans/export",
+        headers=export_user,
+        params={"format": "csv", "label": "leaf_blast", "from": "2026-03-01T07:00:00Z"},
+    )
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert tuple(rows[0]) == scan_export.CSV_COLUMNS
+    assert [row["label"] for row in rows] == ["leaf_blast"] * 4  # stored as legacy "blast": i = 2, 5, 8, 11
+    assert rows[0]["createdAt"] > rows[-1]["createdAt"]
+
+    everything = client.get("/api/v1/scans/export", headers=export_user, params={"format": "csv"}).text
+    first_scan = list(csv.DictReader(io.StringIO(everything)))[-1]
+    assert first_scan["notes"].startswith("'=")  # not evaluated by spreadsheets
+
+
+def test_chunks_follow_batches_and_close_the_cursor():
+    class Cursor:
+        def __init__(self, docs):
+            self.docs, self.closed = docs, False
+
+        async def to_list(self, n):
+            out, self.docs = self.docs[:n], self.docs[n:]
+            return out
+
+        async def close(self):
+            self.closed = True
+
+    docs = [
+        {"_id": f"{i:024x}", "label": "healthy", "confidence": 0.5, "modelVersion": "1",
+         "imageUrl": f"/u/{i}.jpg", "createdAt": datetime(2026, 1, 1)}
+        for i in range(7)
+    ]
+
+    async def collect(fmt):
+        cursor = Cursor(list(docs))
+        chunks = [c async for c in scan_export.export_chunks(cursor, fmt, batch_size=3)]
+        return chunks, cursor.closed
+
+    chunks, closed = asyncio.run(collect("ndjson"))
+    assert [c.count(b"\n") for c in chunks] == [3, 3, 1] and closed
+    chunks, closed = asyncio.run(collect("csv"))
+    assert chunks[0] == b",".join(c.encode() for c in scan_export.CSV_COLUMNS) + b"\r\n"
+    assert len(chunks) == 4 and closed
+
+
+def test_export_requires_auth_and_valid_format(client, export_user):
+    assert client.get("/api/v1/scans/export").status_code == 401
+    assert client.get("/api/v1/scans/export", headers=export_user, params={"format": "xlsx"}).status_code == 422
@@ -0,0 +1,80 @@
+# backend/tests/test_scan_history.py
+from datetime import datetime, timedelta
+
+import pytest
+
+import db as dbmod
+from security import decode_token
+
+
+@pytest.fixture(scope="module")
+def history_user(client):
+    client.post(
+        "/api/v1/auth/register",
+        json={"name": "Agronomist", "email": "agro@test.com", "password": "secret12"},
+    )
+    token = client.post(
+        "/api/v1/auth/login",
+        json={"email": "agro@test.com", "password": "secret12"},
+    ).json()["accessToken"]
+    user_id = dbmod.as_object_id(decode_token(token)["sub"])
+
+    base = datetime(2026, 5, 1, 8, 0, 0)
+    labels = ["healthy", "leaf_blast", "blast", "brown_spot"]
+    docs = [
+        {
+            "userId": user_id,
+            "label": labels[i % 4],
+            "confidence": 0.9,
+            "modelVersion": "1.0",
+            "notes": None,
+            "imageUrl": f"uploads/2026/05/{i}.jpg",
+            # pairs share a timestamp to exercise the _id tie-breaker
+            "createdAt": base + timedelta(minutes=i // 2),
+        }
+        for i in range(25)
+    ]
+    dbmod.get_db().scans.insert_many(docs)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _all_pages(client, headers, **params):
+    seen, cursor = [], None
+    while True:
+        q = dict(params, limit=7)
+        if cursor:
+            q["cursor"] = cursor
+        body = client.get("/api/v1/scans", headers=headers, params=q).json()
+        assert len(body["items"]) <= 7
+        seen.extend(body["items"])
+        cursor = body["nextCursor"]
+        if not cursor:
+            return seen
+
+
+def test_pages_cover_full_history_in_order(client, history_user):
+    full = client.get("/api/v1/scans", headers=history_user).json()
+    assert full["nextCursor"] is None and len(full["items"]) == 25
+
+    paged = _all_pages(client, history_user)
+    assert [s["id"] for s in paged] == [s["id"] for s in full["items"]]
+
+
+def test_label_filter_includes_legacy_aliases(client, history_user):
+    blast = _all_pages(client, history_user, label="leaf_blast")
+    assert len(blast) == 12
+    assert {s["label"] for s in blast} == {"leaf_blast"}
+
+
+def test_date_range_filter(client, history_user):
+    r = client.get(
+        "/api/v1/scans",
+        headers=history_user,
+        params={"from": "2026-05-01T08:02:00Z", "to": "2026-05-01T08:04:00Z"},
+    )
+    assert len(r.json()["items"]) == 4
+
+
+def test_bad_cursor_is_400(client, history_user):
+    r = client.get("/api/v1/scans", headers=history_user, params={"cursor": "!!nope", "limit": 5})
+    assert r.status_code == 400
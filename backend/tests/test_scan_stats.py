@@ -0,0 +1,101 @@
+# backend/tests/test_scan_stats.py
+import asyncio
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import db as dbmod
+import scan_stats
+from async_db import get_async_db
+from conftest import make_image_bytes
+
+
+@pytest.fixture(scope="module")
+def stats_user(client):
+    creds = {"name": "Stats", "email": "stats@test.com", "password": "secret12"}
+    client.post("/api/v1/auth/register", json=creds)
+    login = client.post("/api/v1/auth/login", json=creds).json()
+    return {"Authorization": f"Bearer {login['accessToken']}"}, login["user"]["id"]
+
+
+def _expected(client, headers):
+    items = client.get("/api/v1/scans", headers=headers).json()["items"]
+    return len(items), dict(Counter(i["label"] for i in items))
+
+
+def test_counters_follow_creates_and_deletes(client, stats_user, fake_model):
+    stats_user, _ = stats_user
+    ids = []
+    for shade in (10, 90, 170):
+        r = client.post("/api/v1/scans", headers=stats_user,
+                        files={"file": ("leaf.jpg", make_image_bytes((shade, shade, shade)), "image/jpeg")})
+        ids.append(r.json()["id"])
+    r = client.post("/api/v1/scans/batch", headers=stats_user, files=[
+        ("files", ("a.jpg", make_image_bytes((40, 40, 40)), "image/jpeg")),
+        ("files", ("b.jpg", make_image_bytes((220, 220, 220)), "image/jpeg")),
+    ])
+    ids += [res["item"]["id"] for res in r.json()["items"]]
+
+    client.delete(f"/api/v1/scans/{ids[0]}", headers=stats_user)
+    client.post("/api/v1/scans/bulk-delete", headers=stats_user, json={"ids": ids[1:3]})
+
+    stats = client.get("/api/v1/scans/stats", headers=stats_user).json()
+    total, by_label = _expected(client, stats_user)
+    assert (stats["total"], stats["byLabel"]) == (total, by_label) == (2, by_label)
+    (month, bucket), = stats["byMonth"].items()
+    assert bucket == {"total": 2, "byLabel": by_label}
+    assert sum(b["total"] for b in stats["byDay"].values()) == 2
+
+
+def test_rebuild_repairs_drift(client, stats_user):
+    stats_user, user_id = stats_user
+    before = client.get("/api/v1/scans/stats", headers=stats_user).json()
+    dbmod.get_db().scan_stats.update_one({"_id": ObjectId(user_id)}, {"$inc": {"total": 40, "labels.healthy": 7}})
+
+    scan_stats.rebuild(ObjectId(user_id))
+    after = client.get("/api/v1/scans/stats", headers=stats_user).json()
+    assert (after["total"], after["byLabel"], after["byMonth"]) == (before["total"], before["byLabel"], before["byMonth"])
+
+
+def test_stats_for_user_without_scans(client):
+    creds = {"name": "Empty", "email": "empty-stats@test.com", "password": "secret12"}
+    client.post("/api/v1/auth/register", json=creds)
+    token = client.post("/api/v1/auth/login", json=creds).json()["accessToken"]
+    stats = client.get("/api/v1/scans/stats", headers={"Authorization": f"Bearer {token}"}).json()
+    assert stats["total"] == 0 and stats["byLabel"] == {} and stats["byMonth"] == {}
+
+
+def test_summary_windows_count_non_empty_buckets():
+    doc = {"days": {
+        "2026-05-03": {"total": 1, "labels": {"healthy": 1}},
+        "2026-05-02": {"total": 0, "labels": {"healthy": 0}},
+        "2026-05-01": {"total": 2, "labels": {"brown_spot": 2}},
+    }}
+    assert list(scan_stats.summarize(doc, 0, 2)["byDay"]) == ["2026-05-03", "2026-05-01"]
+
+
+def test_new_day_prunes_old_and_empty_buckets(monkeypatch):
+    monkeypatch.setattr(scan_stats, "MAX_DAYS", 5)
+    user = ObjectId()
+    start = date(2026, 1, 1)
+    days = {(start + timedelta(days=i)).isoformat(): {"total": 1, "labels": {"healthy": 1}} for i in range(8)}
+    days["2026-01-07"] = {"total": 0, "labels": {"healthy": 0}}
+    dbmod.get_db().scan_stats.insert_one({"_id": user, "total": 7, "days": days})
+
+    scan = {"userId": user, "label": "healthy", "createdAt": datetime(2026, 1, 10, 8, 0)}
+    asyncio.run(scan_stats.record(get_async_db(), [scan]))
+
+    kept = dbmod.get_db().scan_stats.find_one({"_id": user})["days"]
+    assert sorted(kept) == ["2026-01-04", "2026-01-05", "2026-01-06", "2026-01-08", "2026-01-10"]
+
+
+def test_full_rebuild_drops_users_without_scans(client, stats_user):
+    _, user_id = stats_user
+    ghost = ObjectId()
+    dbmod.get_db().scan_stats.insert_one({"_id": ghost, "total": 3})
+
+    assert scan_stats.rebuild() >= 1
+    assert dbmod.get_db().scan_stats.find_one({"_id": ghost}) is None
+    assert dbmod.get_db().scan_stats.find_one({"_id": ObjectId(user_id)})["total"] == 2
@@ -0,0 +1,34 @@
+# backend/tests/test_scans.py
+import asyncio
+
+from conftest import make_image_bytes
+from routers import create_scan
+
+
+def test_create_scan_is_async_route():
+    assert asyncio.iscoroutinefunction(create_scan)
+
+
+def test_create_scan_runs_inference_and_persists(client, auth_headers, fake_model):
+    r = client.post(
+        "/api/v1/scans",
+        headers=auth_headers,
+        files={"file": ("leaf.jpg", make_image_bytes(), "image/jpeg")},
+        data={"notes": "plot 7"},
+    )
+    assert r.status_code == 200, r.text
+    item = r.json()
+    assert item["label"] in {"bacterial_leaf_blight", "brown_spot", "healthy",
+                             "leaf_blast", "leaf_scald", "narrow_brown_spot", "uncertain"}
+    assert item["notes"] == "plot 7"
+
+    listed = client.get("/api/v1/scans", headers=auth_headers).json()["items"]
+    assert item["id"] in {s["id"] for s in listed}
+
+
+def test_create_scan_requires_auth(client):
+    r = client.post(
+        "/api/v1/scans",
+        files={"file": ("leaf.jpg", make_image_bytes(), "image/jpeg")},
+    )
+    assert r.status_code == 401
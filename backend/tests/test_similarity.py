@@ -0,0 +1,148 @@
+# backend/tests/test_similarity.py
+import numpy as np
+from bson import ObjectId
+
+import db as dbmod
+import ml_service
+import similarity
+from conftest import make_image_bytes
+
+
+def _random_rows(n, dim, owners, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = sorted(ObjectId() for _ in range(n))
+    return [(ids[i], owners[i % len(owners)], ml_service.embedding_bytes(vectors[i])) for i in range(n)], vectors
+
+
+def _exact(vectors, rows, query, k, owner=None):
+    keep = [i for i, r in enumerate(rows) if owner is None or r[1] == owner]
+    scores = vectors[keep] @ query
+    return [rows[keep[i]][0] for i in np.argsort(-scores)[:k]]
+
+
+def test_snapshot_search_matches_brute_force(tmp_path):
+    owners = [ObjectId(), ObjectId()]
+    rows, vectors = _random_rows(3000, 32, owners)
+    similarity.write_snapshot(str(tmp_path / "v1"), iter(rows), len(rows), 32)
+    index = similarity.SimilarityIndex("v1", root=str(tmp_path), sync_seconds=3600)
+    index._synced_at = float("inf")  # snapshot only
+
+    query = rows[7][2]
+    q = np.frombuffer(query, "<f2").astype("float32")
+    hits = index.search(query, k=5, owner=owners[1], exclude=rows[7][0])
+    assert [h[0] for h in hits] == [i for i in _exact(vectors, rows, q, 6, owners[1]) if i != rows[7][0]][:5]
+    assert all(a[1] >= b[1] for a, b in zip(hits, hits[1:]))
+    assert index.search(query, k=3, owner=ObjectId()) == []
+
+
+def test_ivf_finds_near_duplicates(tmp_path):
+    owners = [ObjectId()]
+    rows, vectors = _random_rows(4000, 16, owners, seed=1)
+    similarity.write_snapshot(str(tmp_path / "v2"), iter(rows), len(rows), 16, lists=40)
+    index = similarity.SimilarityIndex("v2", root=str(tmp_path), nprobe=4, ivf_min_rows=100)
+    index._synced_at = float("inf")
+
+    assert index._snap.centroids is not None and int(index._snap.offsets[-1]) == len(rows)
+    found = 0
+    for i in range(0, 4000, 200):
+        hits = index.search(rows[i][2], k=1, owner=owners[0])
+        found += bool(hits) and hits[0][0] == rows[i][0]
+    assert found >= 18  # a vector's own list is nearly always among the probed ones
+
+
+def test_delta_add_remove_and_rebuild(tmp_path):
+    owner = ObjectId()
+    rows, _ = _random_rows(50, 8, [owner], seed=2)
+    index = similarity.SimilarityIndex("v3", root=str(tmp_path))
+    index._synced_at = float("inf")
+    for scan_id, user, emb in rows[:40]:
+        index.add(scan_id, user, emb)
+    assert index.search(rows[3][2], k=1, owner=owner)[0][0] == rows[3][0]
+    index.remove(rows[3][0])
+    assert rows[3][0] not in [h[0] for h in index.search(rows[3][2], k=5, owner=owner)]
+
+    # a new snapshot replaces the delta; later scans still come from the delta
+    similarity.write_snapshot(str(tmp_path / "v3"), iter(rows[:45]), 45, 8)
+    index.sync(force=True)
+    index.add(*rows[45])
+    assert len(index) == 46 - 1
+    assert index.search(rows[45][2], k=1, owner=owner)[0][0] == rows[45][0]
+    assert index.search(rows[44][2], k=1, owner=owner)[0][0] == rows[44][0]
+
+
+def test_sync_pulls_a_backlog_in_bounded_slices(tmp_path, monkeypatch):
+    owner = ObjectId()
+    rows, _ = _random_rows(30, 8, [owner], seed=3)
+    dbmod.get_db().scans.insert_many([
+        {"_id": scan_id, "userId": user, "modelVersion": "v5", "embedding": emb} for scan_id, user, emb in rows
+    ])
+    monkeypatch.setattr(similarity, "_SYNC_BATCH", 8)
+    monkeypatch.setattr(similarity, "_SYNC_BUDGET", 0)  # one slice per sync
+    index = similarity.SimilarityIndex("v5", root=str(tmp_path), max_delta=20)
+
+    sizes = []
+    for _ in range(4):
+        index.sync(force=True)
+        sizes.append(len(index))
+    assert sizes == [8, 16, 20, 20]
+    assert index.search(rows[0][2], k=1, owner=owner)[0][0] == rows[0][0]
+
+
+def test_rebuild_drops_tombstones_for_scans_it_no_longer_has(tmp_path):
+    owner = ObjectId()
+    rows, _ = _random_rows(20, 8, [owner], seed=4)
+    similarity.write_snapshot(str(tmp_path / "v6"), iter(rows[:10]), 10, 8)
+    index = similarity.SimilarityIndex("v6", root=str(tmp_path))
+    index._synced_at = float("inf")
+    index.remove(rows[2][0], rows[5][0])
+
+    # the next build still has rows[2] (deleted elsewhere after it was read) but not rows[5]
+    kept = [r for r in rows[:12] if r[0] != rows[5][0]]
+    similarity.write_snapshot(str(tmp_path / "v6"), iter(kept), len(kept), 8)
+    index.sync(force=True)
+    assert index._removed == {rows[2][0]}
+    assert rows[2][0] not in [h[0] for h in index.search(rows[2][2], k=3, owner=owner)]
+
+
+def _scan(client, headers, color):
+    r = client.post(
+        "/api/v1/scans", headers=headers,
+        files={"file": ("leaf.png", make_image_bytes(color, fmt="PNG"), "image/png")},
+    )
+    assert r.status_code == 200
+    return r.json()["id"]
+
+
+def test_similar_endpoint(client, auth_headers, fake_model):
+    reds = [_scan(client, auth_headers, (200 + i, 30, 30)) for i in range(3)]
+    green = _scan(client, auth_headers, (20, 220, 40))
+
+    stored = dbmod.get_db().scans.find_one({"_id": ObjectId(reds[0])})
+    assert len(stored["embedding"]) == 2 * fake_model.embedding_dim  # float16
+
+    r = client.get(f"/api/v1/scans/{reds[0]}/similar", headers=auth_headers, params={"limit": 3})
+    assert r.status_code == 200
+    items = r.json()["items"]
+    ids = [item["id"] for item in items]
+    assert reds[0] not in ids and set(reds[1:]) <= set(ids[:2])
+    assert items[0]["similarity"] >= items[-1]["similarity"]
+    if green in ids:
+        assert ids.index(green) > 1
+
+    assert client.delete(f"/api/v1/scans/{reds[1]}", headers=auth_headers).status_code == 200
+    ids = [i["id"] for i in client.get(f"/api/v1/scans/{reds[0]}/similar", headers=auth_headers).json()["items"]]
+    assert reds[1] not in ids
+
+
+def test_similar_needs_an_embedding(client, auth_headers):
+    user = dbmod.get_db().users.find_one({"email": "scanner@test.com"})["_id"]
+    res = dbmod.get_db().scans.insert_one({
+        "userId": user, "label": "healthy", "confidence": 0.9, "modelVersion": "1.0",
+        "imageUrl": "uploads/x.jpg", "createdAt": ObjectId().generation_time,
+    })
+    r = client.get(f"/api/v1/scans/{res.inserted_id}/similar", headers=auth_headers)
+    assert r.status_code == 409
+    assert client.get(f"/api/v1/scans/{ObjectId()}/similar", headers=auth_headers).status_code == 404
+    assert client.get("/api/v1/scans/not-an-id/similar", headers=auth_headers).status_code == 404
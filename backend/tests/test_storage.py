@@ -0,0 +1,51 @@
+# backend/tests/test_storage.py
+import io
+import os
+
+import pytest
+from fastapi import HTTPException
+from starlette.datastructures import Headers, UploadFile
+
+import storage
+from conftest import make_image_bytes
+
+
+def _upload(data: bytes, content_type: str = "image/jpeg") -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(data),
+        filename="leaf",
+        headers=Headers({"content-type": content_type}),
+    )
+
+
+def _leftover_parts():
+    return [
+        name
+        for _, _, files in os.walk(os.environ["UPLOAD_DIR"])
+        for name in files
+        if name.startswith(storage.TEMP_PREFIX)
+    ]
+
+
+def test_type_comes_from_magic_bytes_not_content_type():
+    png = make_image_bytes(color=(1, 2, 3), fmt="PNG")
+    stored = storage.save_upload(_upload(png, content_type="application/octet-stream"))
+    assert stored.path.endswith(".png")
+    with open(stored.path, "rb") as f:
+        assert f.read() == png
+
+    with pytest.raises(HTTPException) as exc:
+        storage.save_upload(_upload(b"GIF89a not really a jpeg"))
+    assert exc.value.status_code == 415
+    assert _leftover_parts() == []
+
+
+def test_oversize_upload_stops_early_and_cleans_up(monkeypatch):
+    monkeypatch.setattr(storage, "MAX_UPLOAD_MB", 1)
+    body = io.BytesIO(make_image_bytes() + b"\0" * (3 * 1024 * 1024))
+    with pytest.raises(HTTPException) as exc:
+        storage.save_upload(UploadFile(file=body, filename="big.jpg"))
+    assert exc.value.status_code == 413
+    # stopped just past the limit instead of reading the whole body
+    assert body.tell() <= 1024 * 1024 + storage.CHUNK_SIZE
+    assert _leftover_parts() == []
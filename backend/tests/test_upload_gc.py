@@ -0,0 +1,148 @@
+# backend/tests/test_upload_gc.py
+import os
+import time
+
+import db as dbmod
+from conftest import make_image_bytes
+from upload_gc import UploadCollector
+
+
+def _scan(client, headers, photo):
+    r = client.post("/api/v1/scans", headers=headers, files={"file": ("leaf.jpg", photo, "image/jpeg")})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_deleted_scan_image_is_reclaimed(client, auth_headers, fake_model):
+    item = _scan(client, auth_headers, make_image_bytes((3, 141, 59)))
+    path = item["imageUrl"]
+    assert client.delete(f"/api/v1/scans/{item['id']}", headers=auth_headers).status_code == 200
+    assert dbmod.get_db().gc_queue.find_one({"_id": path})
+
+    report = UploadCollector(grace_seconds=0).run_once()
+    assert not os.path.exists(path)
+    assert report.reclaimed_bytes > 0
+    assert dbmod.get_db().gc_queue.find_one({"_id": path}) is None
+    assert dbmod.get_db().blobs.find_one({"path": path}) is None
+
+
+def test_shared_image_survives_until_last_scan_is_deleted(client, auth_headers, fake_model):
+    photo = make_image_bytes((27, 182, 81))
+    first, second = _scan(client, auth_headers, photo), _scan(client, auth_headers, photo)
+    assert first["imageUrl"] == second["imageUrl"]
+
+    client.post("/api/v1/scans/bulk-delete", headers=auth_headers, json={"ids": [first["id"]]})
+    UploadCollector(grace_seconds=0).drain_queue()
+    assert os.path.exists(first["imageUrl"])
+
+    client.delete(f"/api/v1/scans/{second['id']}", headers=auth_headers)
+    UploadCollector(grace_seconds=0).drain_queue()
+    assert not os.path.exists(first["imageUrl"])
+
+
+def test_sweep_removes_stale_orphans_incrementally(tmp_path):
+    root = tmp_path / "uploads"
+    (root / "2024" / "01").mkdir(parents=True)
+    old = time.time() - 7200
+    orphans = []
+    for name in ("a.jpg", "b.jpg", ".upload-x.part"):
+        p = root / "2024" / "01" / name
+        p.write_bytes(b"x" * 100)
+        os.utime(p, (old, old))
+        orphans.append(p)
+    fresh = root / "2024" / "01" / "c.jpg"
+    fresh.write_bytes(b"y" * 100)
+    dbmod.get_db().gc_state.delete_many({})
+
+    collector = UploadCollector(root=str(root), grace_seconds=3600, max_files_per_run=2)
+    first = collector.sweep_tree()
+    assert first[0] == 2 and not first[3]  # stopped early, cursor saved
+    second = collector.sweep_tree()
+    assert second[3]
+    assert first[1] + second[1] == 3
+    assert not any(p.exists() for p in orphans)
+    assert fresh.exists()  # inside the grace period
+
+
+def test_resumed_sweep_skips_directories_before_the_cursor(tmp_path, monkeypatch):
+    root = tmp_path / "uploads"
+    for month in ("2024/01", "2024/02", "2025/01"):
+        (root / month).mkdir(parents=True)
+        for name in ("a.jpg", "b.jpg"):
+            (root / month / name).write_bytes(b"x")
+    db = dbmod.get_db()
+    db.gc_state.delete_many({})
+    db.gc_state.insert_one({"_id": "tree", "cursor": str(root / "2025" / "01" / "a.jpg").replace("\\", "/")})
+
+    listed = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: listed.append(os.path.relpath(path, root)) or real_scandir(path))
+    scanned, _, _, complete = UploadCollector(root=str(root), grace_seconds=3600).sweep_tree()
+
+    assert (scanned, complete) == (1, True)  # only 2025/01/b.jpg
+    assert sorted(listed) == [".", "2025", os.path.join("2025", "01")]
+
+
+def test_queued_file_in_grace_period_is_deferred(tmp_path, monkeypatch):
+    path = tmp_path / "young.jpg"
+    path.write_bytes(b"x" * 10)
+    db = dbmod.get_db()
+    db.gc_queue.delete_many({})
+    collector = UploadCollector(grace_seconds=3600)
+    collector.queue([str(path)])
+
+    assert collector.drain_queue()[0] == 0
+    assert db.gc_queue.find_one({"_id": str(path)})["retryAt"] is not None
+
+    looked_at = []
+    real_collect = UploadCollector._collect
+
+    def spy(self, paths, reason):
+        looked_at.extend(paths)
+        return real_collect(self, paths, reason)
+
+    monkeypatch.setattr(UploadCollector, "_collect", spy)
+    collector.drain_queue()
+    assert looked_at == [] and path.exists()
+
+
+def test_image_reused_while_being_collected_survives(client, auth_headers, fake_model, monkeypatch):
+    import storage
+
+    photo = make_image_bytes((99, 14, 201))
+    item = _scan(client, auth_headers, photo)
+    path = item["imageUrl"]
+    digest = os.path.splitext(os.path.basename(path))[0]
+    client.delete(f"/api/v1/scans/{item['id']}", headers=auth_headers)
+    old = time.time() - 7200
+    os.utime(path, (old, old))
+
+    real_rename = os.rename
+
+    def reupload_first(src, dst):
+        # identical bytes arrive after the stat/reference checks, before the rename
+        monkeypatch.setattr(os, "rename", real_rename)
+        assert storage._lookup_blob(digest) == path
+        dbmod.get_db().scans.insert_one({"imageUrl": path})
+        real_rename(src, dst)
+
+    monkeypatch.setattr(os, "rename", reupload_first)
+    UploadCollector(grace_seconds=3600).drain_queue()
+    assert os.path.exists(path)
+    assert dbmod.get_db().blobs.find_one({"_id": digest})["path"] == path
+    assert dbmod.get_db().gc_queue.find_one({"_id": path}) is None  # settled: referenced again
+
+    dbmod.get_db().scans.delete_many({"imageUrl": path})
+    os.utime(path, (old, old))
+    UploadCollector(grace_seconds=3600).queue([path])
+    seen = []
+    real_bury = UploadCollector._bury
+
+    def reupload_after(self, p, cutoff):
+        result = real_bury(self, p, cutoff)
+        seen.append(storage._lookup_blob(digest))  # tombstoned: the upload must write a fresh copy
+        return result
+
+    monkeypatch.setattr(UploadCollector, "_bury", reupload_after)
+    UploadCollector(grace_seconds=3600).drain_queue()
+    assert seen == [None] and not os.path.exists(path)
@@ -0,0 +1,355 @@
+# backend/upload_gc.py
+# Reclaims image files that no scan references any more.
+#
+# Two sources of garbage:
+#   - queued removals: delete_scan / bulk_delete_scans, and scans that failed
+#     after their image was stored, put the image path on the gc_queue
+#     collection;
+#   - orphans: anything else in the upload tree (crashes, old bugs, stale
+#     .upload-*.part temp files, thumbnails whose original is gone), found
+#     by an incremental sweep.
+#
+# A file is only unlinked when no scan has it as imageUrl (dedupe means
+# several scans can share one file) and it has not been written or
+# re-used for GC_GRACE_SECONDS; queue entries still inside it get a
+# retryAt and are left alone until then. Files are renamed to a tombstone
+# and checked again before the unlink, so an upload that re-uses the same
+# bytes meanwhile either keeps the file or writes a fresh copy. All Mongo reads are indexed $in
+# lookups in batches of GC_BATCH_SIZE, so nothing scans or locks the
+# collection, and the sweep stops after GC_MAX_FILES_PER_RUN files and
+# resumes from a saved cursor next run, without listing the directories
+# it already went through.
+#
+#   python upload_gc.py [--dry-run] [--full]
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from db import get_db
+from image_variants import existing_variants, is_variant, source_for
+from metrics import counter
+from settings import (
+    GC_BATCH_SIZE,
+    GC_GRACE_SECONDS,
+    GC_INTERVAL_SECONDS,
+    GC_MAX_FILES_PER_RUN,
+    UPLOAD_DIR,
+)
+from storage import TEMP_PREFIX
+
+GC_FILES_REMOVED = counter(
+    "riceguard_gc_files_removed_total",
+    "Upload files deleted by the garbage collector, by reason (queued, orphan, temp).",
+    ["reason"],
+)
+GC_BYTES_RECLAIMED = counter("riceguard_gc_reclaimed_bytes_total", "Bytes freed by the upload garbage collector.")
+
+_STATE_ID = "tree"
+
+
+class GCReport(NamedTuple):
+    queued: int          # queue entries settled this run
+    scanned: int         # files looked at by the tree sweep
+    removed: int         # files unlinked (queued + orphans + temp)
+    reclaimed_bytes: int
+    sweep_complete: bool  # the sweep reached the end of the tree
+
+
+def _norm(path: str) -> str:
+    return path.replace("\\", "/")
+
+
+def _order(path: str) -> List[str]:
+    """Sort key matching _walk's order ("a/x" before "a-b", unlike plain strings)."""
+    return path.split("/")
+
+
+class UploadCollector:
+    def __init__(
+        self,
+        root: str = UPLOAD_DIR,
+        batch_size: int = GC_BATCH_SIZE,
+        grace_seconds: float = GC_GRACE_SECONDS,
+        max_files_per_run: int = GC_MAX_FILES_PER_RUN,
+        dry_run: bool = False,
+    ) -> None:
+        self.root = root
+        self.batch_size = max(1, batch_size)
+        self.grace_seconds = grace_seconds
+        self.max_files_per_run = max_files_per_run
+        self.dry_run = dry_run
+        self._lock = threading.Lock()  # one run at a time
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------- queueing ---------------- #
+    def queue(self, paths: Iterable[Optional[str]]) -> None:
+        """Mark image paths for removal once no scan references them."""
+        now = datetime.now(timezone.utc)
+        db = get_db()
+        for path in {p for p in paths if p}:
+            db.gc_queue.update_one({"_id": path}, {"$setOnInsert": {"queuedAt": now}}, upsert=True)
+
+    # ---------------- removal ---------------- #
+    def _referenced(self, paths: List[str]) -> set:
+        cursor = get_db().scans.find({"imageUrl": {"$in": paths}}, {"imageUrl": 1, "_id": 0})
+        return {doc["imageUrl"] for doc in cursor}
+
+    def _unlink_if_stale(self, path: str, cutoff: float) -> Tuple[bool, int]:
+        """Returns (settled, bytes freed). Not settled = too recent, try again later."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return True, 0
+        if st.st_mtime > cutoff:
+            return False, 0
+        if not self.dry_run:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                return True, 0
+        return True, st.st_size
+
+    def _bury(self, path: str, cutoff: float) -> Tuple[bool, Optional[str], int]:
+        """
+        Rename a stale file to a tombstone, so storage._lookup_blob can no
+        longer hand it to a new upload (its utime fails and the upload writes
+        a fresh copy). Returns (settled, tombstone, size); not settled = too
+        recent, try again later. A dry run leaves the file where it is.
+        """
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return True, None, 0
+        if st.st_mtime > cutoff:
+            return False, None, 0
+        if self.dry_run:
+            return True, path, st.st_size
+        # TEMP_PREFIX: a tombstone left behind by a crash is swept as a stale temp file
+        tombstone = os.path.join(os.path.dirname(path), f"{TEMP_PREFIX}gc-{os.path.basename(path)}")
+        try:
+            os.rename(path, tombstone)
+        except FileNotFoundError:
+            return True, None, 0
+        return True, tombstone, st.st_size
+
+    def _collect(self, paths: List[str], reason: str) -> Tuple[List[str], int, int]:
+        """Remove unreferenced, stale files among `paths`; returns (settled, removed, bytes)."""
+        referenced = self._referenced(paths)
+        cutoff = time.time() - self.grace_seconds
+        settled, buried = [], []
+        for path in paths:
+            if path in referenced:
+                settled.append(path)
+                continue
+            ok, tombstone, size = self._bury(path, cutoff)
+            if ok:
+                settled.append(path)
+            if tombstone:
+                buried.append((path, tombstone, size))
+        # An upload may have re-used a file between the checks above and its
+        # rename: it then bumped the mtime and may already reference it.
+        revived = self._referenced([path for path, _, _ in buried]) if buried and not self.dry_run else set()
+        removed, freed, gone = 0, 0, []
+        for path, tombstone, size in buried:
+            if not self.dry_run:
+                try:
+                    reused = path in revived or os.stat(tombstone).st_mtime > cutoff
+                    if reused:
+                        os.replace(tombstone, path)  # same bytes if a fresh copy landed meanwhile
+                    else:
+                        os.remove(tombstone)
+                except FileNotFoundError:
+                    continue
+                if reused:
+                    if path not in revived:
+                        settled.remove(path)  # stale again after the grace period
+                    continue
+            removed += 1
+            freed += size
+            gone.append(path)
+            for variant in existing_variants(path):  # thumbs/previews go with it
+                _, variant_size = self._unlink_if_stale(variant, float("inf"))
+                freed += variant_size
+        if gone and not self.dry_run:
+            # Forget the dedupe entries, but only where they still point at a
+            # removed file (a concurrent upload may have re-registered it).
+            digests = [os.path.splitext(os.path.basename(p))[0] for p in gone]
+            get_db().blobs.delete_many({"_id": {"$in": digests}, "path": {"$in": gone}})
+            GC_FILES_REMOVED.inc(removed, reason=reason)
+            GC_BYTES_RECLAIMED.inc(freed)
+        return settled, removed, freed
+
+    def drain_queue(self) -> Tuple[int, int, int]:
+        """Process queued removals in batches; returns (settled, removed, bytes)."""
+        db = get_db()
+        now = datetime.now(timezone.utc)
+        retry_at = now + timedelta(seconds=max(self.grace_seconds, 1))
+        settled_total = removed_total = freed_total = looked = 0
+        last = None
+        while not self.max_files_per_run or looked < self.max_files_per_run:
+            # entries still inside the grace period carry retryAt; walk the rest in _id order
+            query: dict = {"retryAt": {"$not": {"$gt": now}}}
+            if last is not None:
+                query["_id"] = {"$gt": last}
+            batch = [doc["_id"] for doc in db.gc_queue.find(query, {"_id": 1}).sort("_id", 1).limit(self.batch_size)]
+            if not batch:
+                break
+            last = batch[-1]
+            looked += len(batch)
+            settled, removed, freed = self._collect(batch, "queued")
+            if not self.dry_run:
+                if settled:
+                    db.gc_queue.delete_many({"_id": {"$in": settled}})
+                done = set(settled)
+                deferred = [p for p in batch if p not in done]
+                if deferred:
+                    db.gc_queue.update_many({"_id": {"$in": deferred}}, {"$set": {"retryAt": retry_at}})
+            settled_total += len(settled)
+            removed_total += removed
+            freed_total += freed
+        return settled_total, removed_total, freed_total
+
+    # ---------------- tree sweep ---------------- #
+    def _walk(self, directory: str, after: Optional[List[str]] = None) -> Iterator[str]:
+        """
+        Every file under `directory`, in a stable (sorted) order. With
+        `after` (an _order key), directories that sort wholly before it
+        are skipped without being listed, so resuming costs O(depth).
+        """
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            key = _order(_norm(entry.path))
+            if after is not None and key < after[:len(key)]:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                on_cursor_path = after is not None and key == after[:len(key)]
+                yield from self._walk(entry.path, after if on_cursor_path else None)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry.path
+
+    def sweep_tree(self, full: bool = False) -> Tuple[int, int, int, bool]:
+        """
+        Reconcile up to max_files_per_run files of the upload tree against
+        scans.imageUrl, resuming after the last run's cursor. Returns
+        (scanned, removed, bytes, reached_end).
+        """
+        db = get_db()
+        state = db.gc_state.find_one({"_id": _STATE_ID}) or {}
+        after = "" if full else state.get("cursor", "")
+        limit = 0 if full else self.max_files_per_run
+        scanned = removed = freed = 0
+        batch: List[str] = []
+        last = after
+        reached_end = True
+
+        def flush() -> None:
+            nonlocal removed, freed
+            if batch:
+                _, r, f = self._collect(batch, "orphan")
+                removed, freed = removed + r, freed + f
+                batch.clear()
+
+        cutoff = time.time() - self.grace_seconds
+        for path in self._walk(self.root, _order(after) if after else None):
+            path = _norm(path)
+            if after and _order(path) <= _order(after):
+                continue
+            if limit and scanned >= limit:
+                reached_end = False
+                break
+            scanned += 1
+            last = path
+            if os.path.basename(path).startswith(TEMP_PREFIX):
+                _, size = self._unlink_if_stale(path, cutoff)  # never referenced by a scan
+                if size:
+                    removed, freed = removed + 1, freed + size
+                    if not self.dry_run:
+                        GC_FILES_REMOVED.inc(reason="temp")
+                        GC_BYTES_RECLAIMED.inc(size)
+                continue
+            if os.path.basename(path).startswith("."):
+                continue
+            if is_variant(path) and source_for(path):
+                continue  # a thumb/preview lives as long as its original
+            batch.append(path)
+            if len(batch) >= self.batch_size:
+                flush()
+        flush()
+
+        if not self.dry_run:
+            db.gc_state.update_one(
+                {"_id": _STATE_ID},
+                {"$set": {"cursor": "" if reached_end else last, "updatedAt": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+        return scanned, removed, freed, reached_end
+
+    def run_once(self, full: bool = False) -> GCReport:
+        with self._lock:
+            settled, q_removed, q_freed = self.drain_queue()
+            scanned, t_removed, t_freed, complete = self.sweep_tree(full=full)
+        report = GCReport(settled, scanned, q_removed + t_removed, q_freed + t_freed, complete)
+        if report.removed or report.queued:
+            verb = "would reclaim" if self.dry_run else "reclaimed"
+            print(f"[gc] {verb} {report.removed} files, {report.reclaimed_bytes / 1e6:.1f} MB "
+                  f"(queue {report.queued}, swept {report.scanned})")
+        return report
+
+    # ---------------- background loop ---------------- #
+    def start(self, interval: float = GC_INTERVAL_SECONDS) -> None:
+        if self._thread is not None or interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="upload-gc", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def _loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.run_once()
+            except Exception as e:  # keep sweeping on transient Mongo/disk errors
+                print(f"[gc] run failed: {e}")
+
+
+@lru_cache(maxsize=1)
+def get_upload_gc() -> UploadCollector:
+    return UploadCollector()
+
+
+def queue_removal(*paths: Optional[str]) -> None:
+    """Best-effort: a failed enqueue leaves the file to the tree sweep."""
+    try:
+        get_upload_gc().queue(paths)
+    except Exception as e:
+        print(f"[gc] could not queue {paths}: {e}")
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Reclaim upload files no scan references.")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be removed")
+    parser.add_argument("--full", action="store_true", help="sweep the whole tree, ignoring the saved cursor")
+    args = parser.parse_args(argv)
+    collector = UploadCollector(dry_run=args.dry_run, max_files_per_run=0 if args.full else GC_MAX_FILES_PER_RUN)
+    report = collector.run_once(full=args.full)
+    print(f"[gc] {report._asdict()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
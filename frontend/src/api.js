@@ -59,6 +59,43 @@ export async function listScans(token) {
   return res.json(); // { items: ScanItem[] }
 }
 
+// Keyset-paginated history: pass the returned nextCursor back as `cursor`.
+export async function listScansPage(token, { limit = 50, cursor, label, from, to } = {}) {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) params.set("cursor", cursor);
+  if (label) params.set("label", label);
+  if (from) params.set("from", from);
+  if (to) params.set("to", to);
+  const res = await fetch(`${BASE_URL}/scans?${params}`, {
+    headers: { ...authHeader(token) },
+  });
+  if (!res.ok) throw new Error((await res.json()).detail || "Fetch scans failed");
+  return res.json(); // { items: ScanItem[], nextCursor: string | null }
+}
+
+// Per-user counts (total, byLabel, byMonth, byDay) without downloading the history.
+export async function getScanStats(token, { months = 12, days = 31 } = {}) {
+  const params = new URLSearchParams({ months: String(months), days: String(days) });
+  const res = await fetch(`${BASE_URL}/scans/stats?${params}`, {
+    headers: { ...authHeader(token) },
+  });
+  if (!res.ok) throw new Error((await res.json()).detail || "Fetch stats failed");
+  return res.json();
+}
+
+// Full history as a file download ("ndjson" or "csv"), streamed by the server.
+export async function exportScans(token, { format = "csv", label, from, to } = {}) {
+  const params = new URLSearchParams({ format });
+  if (label) params.set("label", label);
+  if (from) params.set("from", from);
+  if (to) params.set("to", to);
+  const res = await fetch(`${BASE_URL}/scans/export?${params}`, {
+    headers: { ...authHeader(token) },
+  });
+  if (!res.ok) throw new Error((await res.json()).detail || "Export failed");
+  return res.blob();
+}
+
 // ✅ Original delete endpoints (kept for compatibility)
 export async function deleteScan(token, id) {
   const res = await fetch(`${BASE_URL}/scans/${id}`, {
@@ -169,9 +169,15 @@ function HistoryPage() {
                 </div>
                 {item.imageUrl && (
                   <img
-                    src={buildImageUrl(item.imageUrl)}
+                    src={buildImageUrl(item.thumbnailUrl || item.imageUrl)}
                     alt="Leaf"
                     className="history-image"
+                    loading="lazy"
+                    onError={(e) => {
+                      // fall back to the original if the thumbnail is unavailable
+                      const original = buildImageUrl(item.imageUrl);
+                      if (e.currentTarget.src !== original) e.currentTarget.src = original;
+                    }}
                   />
                 )}
                 <div className="history-info">
@@ -74,7 +74,13 @@ export async function loginUser({ email, password }) {
   });
 }
 
-export async function createScan({ uri, token, notes, modelVersion = '1.0' }) {
+// One key per photo: sending the same scan again (e.g. after a timeout)
+// returns the first result instead of creating a duplicate history entry.
+export function newIdempotencyKey() {
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+}
+
+export async function createScan({ uri, token, notes, modelVersion = '1.0', idempotencyKey }) {
   if (!token) throw new Error('Missing auth token');
 
   const fileName = uri.split('/').pop() || 'photo.jpg';
@@ -92,6 +98,7 @@ export async function createScan({ uri, token, notes, modelVersion = '1.0' }) {
     headers: {
       Accept: 'application/json',
       Authorization: `Bearer ${token}`,
+      ...(idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}),
     },
     body: data,
   });
@@ -108,6 +115,33 @@ export async function listScans(token) {
   return json?.items ?? [];
 }
 
+export async function listScansPage(token, { limit = 50, cursor, label, from, to } = {}) {
+  if (!token) throw new Error('Missing auth token');
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) params.set('cursor', cursor);
+  if (label) params.set('label', label);
+  if (from) params.set('from', from);
+  if (to) params.set('to', to);
+  const json = await request(`${API_BASE_URL}/scans?${params.toString()}`, {
+    headers: {
+      Accept: 'application/json',
+      Authorization: `Bearer ${token}`,
+    },
+  });
+  return { items: json?.items ?? [], nextCursor: json?.nextCursor ?? null };
+}
+
+export async function getScanStats(token, { months = 12, days = 31 } = {}) {
+  if (!token) throw new Error('Missing auth token');
+  const params = new URLSearchParams({ months: String(months), days: String(days) });
+  return request(`${API_BASE_URL}/scans/stats?${params.toString()}`, {
+    headers: {
+      Accept: 'application/json',
+      Authorization: `Bearer ${token}`,
+    },
+  });
+}
+
 export async function deleteScans(token, ids) {
   if (!token) throw new Error('Missing auth token');
   if (!Array.isArray(ids) || ids.length === 0) return { deletedCount: 0 };
@@ -3,12 +3,13 @@ import { View, Text, StyleSheet, Image, TouchableOpacity, ActivityIndicator, Ale
 import { fonts } from '../theme/typography';
 import * as ImagePicker from 'expo-image-picker';
 import Button from '../components/Button';
-import { createScan, fetchRecommendation, resolveImageUrl } from '../api';
+import { createScan, fetchRecommendation, newIdempotencyKey, resolveImageUrl } from '../api';
 import { useAuth } from '../context/AuthContext';
 
 export default function ScanScreen({ navigation }) {
   const { token, logout } = useAuth();
   const [imageUri, setImageUri] = useState(null);
+  const [scanKey, setScanKey] = useState(null); // reused when retrying the same photo
   const [result, setResult] = useState(null);
   const [loading, setLoading] = useState(false);
 
@@ -43,6 +44,7 @@ export default function ScanScreen({ navigation }) {
     const uri = await pickImage();
     if (uri) {
       setImageUri(uri);
+      setScanKey(newIdempotencyKey());
       setResult(null);
     }
   };
@@ -54,16 +56,19 @@ export default function ScanScreen({ navigation }) {
       return;
     }
     let uri = imageUri;
+    let key = scanKey;
     if (!uri) {
       // If no image yet, open the picker first
       uri = await pickImage();
       if (!uri) return; // user cancelled or error
+      key = newIdempotencyKey();
       setImageUri(uri);
+      setScanKey(key);
     }
     try {
       setLoading(true);
       setResult(null);
-      const scan = await createScan({ uri, token });
+      const scan = await createScan({ uri, token, idempotencyKey: key });
 
       let recommendationText = 'No recommendation available.';
       if (scan?.label && scan.label !== 'uncertain') {